@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Per-page annotation processing benchmark.
+
+Runs `process_annotations_from_json` over a synthetic multi-page exam once
+sequentially (`ANNOTATION_WORKERS = 1`) and once with the page process pool,
+checks that the debug report pages and logical units are identical, and
+reports wall time next to the slowest single page (the lower bound for the
+parallel steps 1-6; cropping and grouping stay sequential).
+
+Pages are rendered from `stub_detector.make_exam_pdf`, and the canned stub
+layout (with every question block split in two) serves as detections.
+
+Usage:
+    python benchmarks/annotation_pages.py
+    python benchmarks/annotation_pages.py --pages 20 --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.stub_detector import LAYOUT, CONFIDENCE, make_exam_pdf  # noqa: E402
+from src.config import Config  # noqa: E402
+from src.annotation_processor import process_annotations_from_json, process_page  # noqa: E402
+
+
+def make_pages(work_dir: str, pages: int, dpi: int):
+    import fitz  # PyMuPDF
+    pdf_path = os.path.join(work_dir, "exam.pdf")
+    make_exam_pdf(pdf_path, pages=pages)
+    class_names = Config().CLASS_NAMES
+    records = []
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            image_path = os.path.join(work_dir, f"page_{i:03d}.png")
+            pix = page.get_pixmap(dpi=dpi)
+            pix.save(image_path)
+            w, h = pix.width, pix.height
+            annotations = []
+            for cls, x0, y0, x1, y1 in LAYOUT:
+                label = class_names[cls]
+                box = [x0 * w, y0 * h, x1 * w, y1 * h]
+                if label == "question_block":  # 병합 경로도 타도록 블록을 위아래로 나눔
+                    mid = (box[1] + box[3]) / 2
+                    annotations.append({"label": label, "bbox": [box[0], box[1], box[2], mid - 4], "confidence": CONFIDENCE})
+                    box = [box[0], mid + 4, box[2], box[3]]
+                annotations.append({"label": label, "bbox": box, "confidence": CONFIDENCE})
+            records.append({"image_path": image_path, "annotations": annotations})
+    json_path = os.path.join(work_dir, "annotations.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    return json_path, records
+
+
+def run(json_path: str, work_dir: str, tag: str, workers: int):
+    config = Config()
+    config.PROCESSED_DATA_DIR = os.path.join(work_dir, tag)
+    config.CROP_STORE_ENABLED = False
+    config.ANNOTATION_WORKERS = workers
+    config.ANNOTATION_PARALLEL_MIN_PAGES = 2
+    start = time.perf_counter()
+    units = process_annotations_from_json(json_path, os.path.join(work_dir, tag, "cropped"), config)
+    elapsed = time.perf_counter() - start
+    with open(os.path.join(config.PROCESSED_DATA_DIR, "debug", "annotation_debug_report.json"), encoding="utf-8") as f:
+        report = json.load(f)
+    shape = [[(c["label"], len(c.get("attachments", []))) for c in u] for u in units]
+    return elapsed, report["pages"], shape
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dpi", type=int, default=Config().DPI)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        json_path, records = make_pages(work_dir, args.pages, args.dpi)
+        config = Config()
+        debug_root = os.path.join(work_dir, "single", "debug")
+        os.makedirs(debug_root, exist_ok=True)
+        page_times = []
+        for i, record in enumerate(records):
+            start = time.perf_counter()
+            process_page(i, record, config, debug_root)
+            page_times.append(time.perf_counter() - start)
+
+        seq_time, seq_pages, seq_units = run(json_path, work_dir, "sequential", 1)
+        par_time, par_pages, par_units = run(json_path, work_dir, "parallel", args.workers)
+
+    identical = seq_pages == par_pages and seq_units == par_units
+    print(f"pages={args.pages} dpi={args.dpi} workers={args.workers} cpus={os.cpu_count()}")
+    print(f"  slowest page (steps 1-6 + overlay): {max(page_times) * 1000:8.1f} ms")
+    print(f"  sum of pages:                       {sum(page_times) * 1000:8.1f} ms")
+    print(f"  sequential total:                   {seq_time * 1000:8.1f} ms")
+    print(f"  process pool total:                 {par_time * 1000:8.1f} ms")
+    print(f"  identical report/units:             {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
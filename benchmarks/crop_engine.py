@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Component crop benchmark.
+
+Compares the legacy crop path (`Image.open` per crop, `Image.crop`,
+`ImageDraw` rectangles for question-number masks, default PNG encoder) with
+the array path used by `annotation_processor` (page decoded once, NumPy
+slicing, one vectorized mask assignment, the "crop" entry of
+`IMAGE_IO_POLICY`; `--levels` and PPM are tried as variants of that entry). Reports crops/sec, pages/sec and bytes written,
+and checks that both paths produce identical pixels.
+
+Pages are synthetic two-column exam pages rendered at the pipeline DPI.
+
+Usage:
+    python benchmarks/crop_engine.py
+    python benchmarks/crop_engine.py --pages 5 --levels 0 1 6
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from src.config import Config  # noqa: E402
+from src.image_cropper import load_page_array, crop_and_mask_array, save_array_image  # noqa: E402
+
+PAGE_W, PAGE_H = 1654, 2339  # A4 @ 200 DPI
+
+
+def make_page(path: str, seed: int):
+    """White page with two columns of text-like strokes; returns the crop jobs on it."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (PAGE_W, PAGE_H), "white")
+    draw = ImageDraw.Draw(img)
+    jobs = []
+    for col_x in (90, PAGE_W // 2 + 30):
+        y = 180
+        while y < PAGE_H - 400:
+            height = rng.randint(250, 450)
+            for line_y in range(y + 10, y + height - 20, 34):
+                x = col_x + 10
+                while x < col_x + 680:
+                    w = rng.randint(12, 40)
+                    draw.rectangle((x, line_y, x + w, line_y + 20), fill=(rng.randint(0, 60),) * 3)
+                    x += w + rng.randint(6, 14)
+            bbox = (col_x, y, col_x + 720, y + height)
+            number = (col_x + 4, y + 4, col_x + 50, y + 40)
+            jobs.append({"bbox": bbox, "masks": [number]})
+            jobs.append({"bbox": number, "masks": []})
+            y += height + rng.randint(40, 80)
+    img.save(path)
+    return jobs
+
+
+def relative(bbox, masks):
+    return [(m[0] - bbox[0], m[1] - bbox[1], m[2] - bbox[0], m[3] - bbox[1]) for m in masks]
+
+
+def legacy(page_path, jobs, out_dir):
+    paths = []
+    for i, job in enumerate(jobs):
+        crop = Image.open(page_path).crop(job["bbox"])
+        if job["masks"]:
+            draw = ImageDraw.Draw(crop)
+            for mb in relative(job["bbox"], job["masks"]):
+                draw.rectangle(mb, fill="white")
+        path = os.path.join(out_dir, f"legacy_{i}.png")
+        crop.save(path)
+        paths.append(path)
+    return paths
+
+
+def array_path(page_path, jobs, out_dir, policy):
+    page = load_page_array(page_path)
+    paths = []
+    for i, job in enumerate(jobs):
+        crop = crop_and_mask_array(page, job["bbox"], relative(job["bbox"], job["masks"]))
+        paths.append(save_array_image(crop, os.path.join(out_dir, f"array_{i}"), policy))
+    return paths
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Component crop benchmark")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 6])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pages = []
+        for p in range(args.pages):
+            page_path = os.path.join(tmp, f"page_{p}.png")
+            pages.append((page_path, make_page(page_path, seed=p)))
+        crops = sum(len(jobs) for _, jobs in pages)
+        print(f"{args.pages} pages ({PAGE_W}x{PAGE_H}), {crops} crops")
+        print(f"{'path':<18}{'crops/s':>10}{'pages/s':>10}{'MB written':>12}{'identical':>11}")
+
+        # 후보는 IMAGE_IO_POLICY["crop"]에서 형식/압축 수준만 바꾼 것 (* = 현재 설정)
+        current = Config().image_policy("crop")
+        candidates = [dict(current, format="png", compress_level=lv) for lv in args.levels] + [dict(current, format="ppm")]
+        variants = [("legacy", None)] + [
+            (f"array {p['format']}" + (f"-{p['compress_level']}" if p["format"] == "png" else "")
+             + (" *" if p == current else ""), p) for p in candidates]
+        reference = {}
+        for name, policy in variants:
+            out_dir = os.path.join(tmp, name.replace(" *", "").replace(" ", "_"))
+            os.makedirs(out_dir)
+            elapsed, written = 0.0, []
+            for page_path, jobs in pages:
+                if policy is None:
+                    t, paths = timed(legacy, page_path, jobs, out_dir)
+                else:
+                    t, paths = timed(array_path, page_path, jobs, out_dir, policy)
+                elapsed += t
+                written += paths
+            pixels = [np.asarray(Image.open(p).convert("RGB")) for p in written]
+            if policy is None:
+                reference = pixels
+            identical = all(np.array_equal(a, b) for a, b in zip(reference, pixels))
+            size_mb = sum(os.path.getsize(p) for p in written) / 1e6
+            print(f"{name:<18}{crops / elapsed:>10.1f}{len(pages) / elapsed:>10.2f}{size_mb:>12.2f}{str(identical):>11}")
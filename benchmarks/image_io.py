@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Image encoding policy benchmark.
+
+Encodes representative images of each artifact class ("page", "crop",
+"overlay") with a set of candidate policies through `src.image_io.save_image`
+and reports encode time per image, images/sec and size on disk, so the
+trade-off behind `Config.IMAGE_IO_POLICY` can be re-checked. The Markdown
+table is written to `benchmarks/results/image_io.md`.
+
+Pages are rendered with PyMuPDF from a synthetic two-column exam PDF at the
+pipeline DPI; crops are question-sized regions of those pages; overlays are
+pages with detection-style boxes drawn on them.
+
+Usage:
+    python benchmarks/image_io.py
+    python benchmarks/image_io.py --pages 4 --repeat 5
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import tempfile
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import fitz  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from src.config import Config  # noqa: E402
+from src.image_io import save_image  # noqa: E402
+
+CANDIDATES: List[Dict[str, Any]] = [
+    {"format": "png", "compress_level": 6, "optimize": False},  # PIL default (previous behavior)
+    {"format": "png", "compress_level": 9, "optimize": True},
+    {"format": "png", "compress_level": 1, "optimize": False},
+    {"format": "png", "compress_level": 0, "optimize": False},
+    {"format": "jpeg", "quality": 95, "optimize": False},
+    {"format": "jpeg", "quality": 80, "optimize": False},
+    {"format": "ppm"},
+]
+LOSSLESS_ONLY = {"page", "crop"}
+
+
+def policy_name(policy: Dict[str, Any]) -> str:
+    if policy["format"] == "png":
+        return f"png level={policy['compress_level']}" + (" optimize" if policy.get("optimize") else "")
+    if policy["format"] == "jpeg":
+        return f"jpeg q={policy['quality']}"
+    return "ppm"
+
+
+def make_pages(config: Config, num_pages: int, seed: int = 0) -> List[Image.Image]:
+    rng = random.Random(seed)
+    doc = fitz.open()
+    words = ["alpha", "beta", "gamma", "delta", "(1)", "(2)", "(3)", "(4)", "(5)", "x + y = 3"]
+    for _ in range(num_pages):
+        page = doc.new_page(width=595, height=842)
+        for col_x in (40, 310):
+            y = 60
+            while y < 800:
+                page.insert_text((col_x, y), f"{rng.randint(1, 30)}.", fontsize=11)
+                for line in range(rng.randint(3, 8)):
+                    text = " ".join(rng.choice(words) for _ in range(rng.randint(4, 8)))
+                    page.insert_text((col_x + 18, y + 14 * line), text, fontsize=9)
+                y += 14 * 8 + 30
+        page.draw_line((297, 40), (297, 810))
+    zoom = config.DPI / config.PDF_STANDARD_DPI
+    images = []
+    for page in doc:
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        images.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+    doc.close()
+    return images
+
+
+def make_artifacts(config: Config, num_pages: int) -> Dict[str, List[Image.Image]]:
+    pages = make_pages(config, num_pages)
+    crops, overlays = [], []
+    for page in pages:
+        w, h = page.size
+        for col in (0, 1):
+            for row in range(4):
+                x0, y0 = int(w * (0.05 + 0.47 * col)), int(h * (0.06 + 0.22 * row))
+                crops.append(page.crop((x0, y0, x0 + int(w * 0.43), y0 + int(h * 0.2))))
+        overlay = page.copy()
+        draw = ImageDraw.Draw(overlay)
+        for col in (0, 1):
+            for row in range(4):
+                x0, y0 = int(w * (0.05 + 0.47 * col)), int(h * (0.06 + 0.22 * row))
+                draw.rectangle((x0, y0, x0 + int(w * 0.43), y0 + int(h * 0.2)), outline=(0, 0, 255), width=2)
+                draw.rectangle((x0, y0 - 16, x0 + 120, y0), fill=(0, 0, 255))
+        overlays.append(overlay)
+    return {"page": pages, "crop": crops, "overlay": overlays}
+
+
+def measure(images: List[Image.Image], policy: Dict[str, Any], out_dir: str, repeat: int) -> Dict[str, float]:
+    times, size = [], 0
+    for r in range(repeat):
+        start = time.perf_counter()
+        paths = [save_image(img, os.path.join(out_dir, f"img_{i}"), policy) for i, img in enumerate(images)]
+        times.append((time.perf_counter() - start) / len(images))
+        if r == 0:
+            size = sum(os.path.getsize(p) for p in paths) / len(paths)
+    ms = statistics.median(times) * 1000
+    return {"ms_per_image": ms, "images_per_sec": 1000 / ms, "kb_per_image": size / 1024}
+
+
+def to_markdown(rows, config: Config) -> str:
+    lines = ["# Image encoding policy", "",
+             f"Python {sys.version.split()[0]}, pages rendered at {config.DPI} DPI, median of repeated encodes.",
+             "`*` marks the current `Config.IMAGE_IO_POLICY` entry.", "",
+             "| artifact | policy | ms/image | images/s | KB/image |", "|---|---|---:|---:|---:|"]
+    for artifact, name, r, current in rows:
+        mark = " *" if current else ""
+        lines.append(f"| {artifact} | {name}{mark} | {r['ms_per_image']:.1f} | {r['images_per_sec']:.1f} | {r['kb_per_image']:.0f} |")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image encoding policy benchmark")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=str, default=os.path.join(PROJECT_ROOT, "benchmarks", "results", "image_io.md"))
+    args = parser.parse_args()
+
+    config = Config()
+    artifacts = make_artifacts(config, args.pages)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for artifact, images in artifacts.items():
+            current = config.image_policy(artifact)
+            for policy in CANDIDATES:
+                if policy["format"] == "ppm" and artifact != "crop":
+                    continue
+                if policy["format"] == "jpeg" and artifact in LOSSLESS_ONLY:
+                    continue
+                out_dir = os.path.join(tmp, artifact, policy_name(policy).replace(" ", "_").replace("=", ""))
+                os.makedirs(out_dir)
+                r = measure(images, policy, out_dir, args.repeat)
+                is_current = all(current.get(k) == v for k, v in policy.items())
+                rows.append((artifact, policy_name(policy), r, is_current))
+
+    report = to_markdown(rows, config)
+    print(report)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(report)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time profile of the service entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each entry point (several repeats, median taken) and summarizes the total
+import time and the slowest top-level packages. The Markdown summary is
+written to `benchmarks/results/import_time.md`.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --modules src.main src.web_server --repeat 5
+"""
+
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_once(module: str) -> Tuple[float, Dict[str, float]]:
+    """Returns (total ms, {top-level package: cumulative ms}) for one cold import."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    packages: Dict[str, float] = defaultdict(float)
+    total = 0.0
+    subtree: List[Tuple[int, str, float]] = []
+    # -X importtime prints children before their parent, so the entry module's
+    # direct imports are the indent-3 lines since the previous top-level line.
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        cumulative_ms, indent, name = int(m.group(2)) / 1000.0, len(m.group(3)), m.group(4)
+        if indent == 1:
+            if name == module:
+                total = cumulative_ms
+                for child_indent, child, ms in subtree:
+                    if child_indent == 3:
+                        key = child if child.startswith('src.') else child.split('.')[0]
+                        packages[key] += ms
+            subtree = []
+        else:
+            subtree.append((indent, name, cumulative_ms))
+    return total, packages
+
+
+def profile(module: str, repeat: int) -> Dict[str, object]:
+    totals: List[float] = []
+    per_pkg: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(repeat):
+        total, packages = profile_once(module)
+        totals.append(total)
+        for name, ms in packages.items():
+            per_pkg[name].append(ms)
+    slowest = sorted(((statistics.median(v), k) for k, v in per_pkg.items()), reverse=True)[:8]
+    return {"module": module, "median_ms": statistics.median(totals), "min_ms": min(totals), "slowest": slowest}
+
+
+def to_markdown(results: List[Dict[str, object]]) -> str:
+    lines = ["# Import-time profile", "",
+             f"Python {sys.version.split()[0]}, `-X importtime`, median of repeated cold imports.", "",
+             "| entry point | median (ms) | min (ms) |", "|---|---:|---:|"]
+    for r in results:
+        lines.append(f"| `{r['module']}` | {r['median_ms']:.1f} | {r['min_ms']:.1f} |")
+    for r in results:
+        lines += ["", f"## `{r['module']}` — slowest direct imports", "", "| package | cumulative (ms) |", "|---|---:|"]
+        for ms, name in r["slowest"]:
+            lines.append(f"| `{name}` | {ms:.1f} |")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entry-point import time profile")
+    parser.add_argument("--modules", nargs="+", default=["src.main", "src.web_server"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=str, default=os.path.join(PROJECT_ROOT, "benchmarks", "results", "import_time.md"))
+    args = parser.parse_args()
+
+    results = [profile(m, args.repeat) for m in args.modules]
+    report = to_markdown(results)
+    print(report)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(report)
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Load test for the FastAPI service.
+
+Starts `src.web_server:app` under uvicorn in a child process with the
+deterministic stub detector (`benchmarks/stub_detector.py`) and an isolated
+temporary data directory, then fires concurrent `/shuffle` uploads of
+synthetic exam PDFs at increasing concurrency levels (closed loop: each
+client sends its next upload when the previous one returns). With
+`--endpoint jobs` uploads go through POST /jobs and are timed until the
+job's "done" event, which also surfaces pipeline failures as errors.
+
+For each level it reports throughput, p50/p95/p99 latency, error rate and
+the peak RSS of the server process tree (including pipeline workers).
+Every run is saved as JSON under `benchmarks/results/load_test/`; pass
+`--compare <saved.json>` to print the change against an earlier run.
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --levels 1 2 4 8 --requests-per-client 3 --serve-mode process --workers 4
+    python benchmarks/load_test.py --label after --compare benchmarks/results/load_test/<before>.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results", "load_test")
+
+
+# --- server side (runs in the child process) ---
+def serve(port: int, data_dir: str, serve_mode: str, workers: int, detection_cache: bool):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, PROJECT_ROOT)
+    os.chdir(PROJECT_ROOT)  # templates/ is resolved relative to the working directory
+    import uvicorn
+    import stub_detector
+    import src.config as config_module
+    from src.config import Config, PipelineContext
+
+    stub_detector.install()
+    config = Config()
+    config.DATA_DIR = data_dir
+    config.UPLOADS_DIR = os.path.join(data_dir, 'uploads')
+    config.RESULTS_DIR = os.path.join(data_dir, 'web', 'results')
+    config.HISTORY_DIR = os.path.join(data_dir, 'web', 'history')
+    config.DETECTION_CACHE_ENABLED = detection_cache
+    config.WARM_UP_ON_STARTUP = "blocking"
+    config.SERVE_MODE = serve_mode
+    config.SERVE_WORKERS = workers
+    context = PipelineContext.from_config(config)
+    config_module.get_pipeline_context = lambda: context  # picked up by src.web_server at import
+
+    from src.web_server import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# --- client side ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/workers", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def _tree_rss_bytes(pid: int) -> int:
+    """RSS of a process and all its descendants (Linux /proc)."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+        stack.extend(children.get(p, []))
+    return total
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.pid, self.interval = pid, interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, _tree_rss_bytes(self.pid))
+            self._done.wait(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def _multipart(pdf_path: str):
+    boundary = uuid.uuid4().hex
+    with open(pdf_path, "rb") as f:
+        payload = f.read()
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+            f"filename=\"{uuid.uuid4().hex[:8]}_{os.path.basename(pdf_path)}\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n").encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def upload(base_url: str, pdf_path: str, timeout: float, endpoint: str = "shuffle") -> str:
+    """
+    One upload; returns "ok" or an error tag (HTTP status / "job_error").
+    "shuffle": POST /shuffle, ok on its 303 redirect. The endpoint redirects
+    even when the pipeline fails, so only HTTP-level errors are visible.
+    "jobs": POST /jobs, then follow the event stream until done/error.
+    """
+    body, headers = _multipart(pdf_path)
+    opener = urllib.request.build_opener(_NoRedirect)
+    try:
+        req = urllib.request.Request(f"{base_url}/{endpoint}", data=body, method="POST", headers=headers)
+        with opener.open(req, timeout=timeout) as r:
+            job = json.load(r)
+        with opener.open(base_url + job["events_url"], timeout=timeout) as stream:
+            for raw in stream:
+                line = raw.decode("utf-8").strip()
+                if line == "event: done":
+                    return "ok"
+                if line == "event: error":
+                    return "job_error"
+        return "job_incomplete"
+    except urllib.error.HTTPError as e:  # the unfollowed 303 of /shuffle also lands here
+        return "ok" if endpoint == "shuffle" and e.code == 303 else str(e.code)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run_level(base_url: str, pdfs: List[str], concurrency: int, per_client: int, server_pid: int,
+              timeout: float, endpoint: str) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: List[Any] = []
+    lock = threading.Lock()
+
+    def client(idx: int):
+        for n in range(per_client):
+            pdf = pdfs[(idx + n) % len(pdfs)]
+            start = time.perf_counter()
+            try:
+                status = upload(base_url, pdf, timeout, endpoint)
+            except Exception as e:  # connection reset, timeout
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses.append(status)
+                if status == "ok":
+                    latencies.append(elapsed)
+
+    sampler = RssSampler(server_pid)
+    sampler.start()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    peak_rss = sampler.stop()
+
+    errors = [s for s in statuses if s != "ok"]
+    return {
+        "concurrency": concurrency,
+        "requests": len(statuses),
+        "ok": len(latencies),
+        "error_rate": len(errors) / len(statuses) if statuses else 0.0,
+        "errors": {str(s): errors.count(s) for s in set(errors)},
+        "throughput_rps": len(latencies) / wall if wall > 0 else 0.0,
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "p99_s": percentile(latencies, 0.99),
+        "mean_s": statistics.mean(latencies) if latencies else None,
+        "peak_rss_mb": peak_rss / 2**20,
+        "wall_s": wall,
+    }
+
+
+def _fmt(v: Optional[float], spec: str = ".2f") -> str:
+    return "-" if v is None else format(v, spec)
+
+
+def print_table(levels: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None):
+    base = {lv["concurrency"]: lv for lv in (baseline or {}).get("levels", [])}
+    print(f"{'conc':>5}{'req':>6}{'err%':>7}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'peak RSS MB':>13}"
+          + ("   vs baseline (req/s, p95)" if base else ""))
+    for lv in levels:
+        line = (f"{lv['concurrency']:>5}{lv['requests']:>6}{lv['error_rate'] * 100:>7.1f}{lv['throughput_rps']:>8.2f}"
+                f"{_fmt(lv['p50_s']):>8}{_fmt(lv['p95_s']):>8}{_fmt(lv['p99_s']):>8}{lv['peak_rss_mb']:>13.0f}")
+        b = base.get(lv["concurrency"])
+        if b and b["throughput_rps"] and lv["p95_s"] and b["p95_s"]:
+            line += (f"   {lv['throughput_rps'] / b['throughput_rps'] - 1:+.0%}, "
+                     f"{lv['p95_s'] / b['p95_s'] - 1:+.0%}")
+        print(line)
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for src.web_server with a stub detector")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 4, 6], help="page counts of the synthetic PDFs")
+    parser.add_argument("--endpoint", choices=["shuffle", "jobs"], default="shuffle")
+    parser.add_argument("--serve-mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--detection-cache", action="store_true", help="keep the page detection cache enabled")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--label", type=str, default="")
+    parser.add_argument("--compare", type=str, default=None, help="earlier result JSON to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", type=str, default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.data_dir, args.serve_mode, args.workers, args.detection_cache)
+        sys.exit(0)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from stub_detector import make_exam_pdf
+
+    with tempfile.TemporaryDirectory(prefix="load_test_") as tmp:
+        pdfs = []
+        for i, pages in enumerate(args.pages):
+            path = os.path.join(tmp, f"exam_{pages}p.pdf")
+            make_exam_pdf(path, pages=pages, seed=i)
+            pdfs.append(path)
+
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--data-dir", os.path.join(tmp, "data"), "--serve-mode", args.serve_mode,
+               "--workers", str(args.workers)] + (["--detection-cache"] if args.detection_cache else [])
+        log_path = os.path.join(tmp, "server.log")
+        with open(log_path, "w") as log:
+            server = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            _wait_ready(base_url, server)
+            upload(base_url, pdfs[0], args.timeout, args.endpoint)  # first request outside the measurement
+            levels = []
+            for concurrency in args.levels:
+                result = run_level(base_url, pdfs, concurrency, args.requests_per_client, server.pid,
+                                   args.timeout, args.endpoint)
+                levels.append(result)
+                print(f"  concurrency {concurrency}: {result['throughput_rps']:.2f} req/s, "
+                      f"p95 {_fmt(result['p95_s'])} s, errors {result['error_rate']:.0%}")
+        except Exception:
+            with open(log_path) as log:
+                print(log.read()[-4000:])
+            raise
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    run = {
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"endpoint": args.endpoint, "serve_mode": args.serve_mode, "workers": args.workers, "pages": args.pages,
+                     "requests_per_client": args.requests_per_client, "detection_cache": args.detection_cache},
+        "levels": levels,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print_table(levels, baseline)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    name = datetime.now().strftime("%Y%m%d-%H%M%S") + (f"_{args.label}" if args.label else "") + ".json"
+    out_path = os.path.join(RESULTS_DIR, name)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(run, f, ensure_ascii=False, indent=2)
+    print(f"\nsaved {os.path.relpath(out_path, PROJECT_ROOT)}")
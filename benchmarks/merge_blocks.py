@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+question_block merge benchmark.
+
+Compares the legacy merge (one global (y, x) sort, both columns interleaved)
+with the column-aware merge in `annotation_processor.merge_question_blocks`
+on two-column pages whose questions were detected as several vertically
+split fragments. Reports merges per page, how many pages end with exactly
+one block per question, and the time per page.
+
+Fixtures live in `benchmarks/fixtures/merge_pages.json`; regenerate them with
+`--write-fixtures`.
+
+Usage:
+    python benchmarks/merge_blocks.py
+    python benchmarks/merge_blocks.py --passes 3 --repeat 200
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+import statistics
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.annotation_processor import merge_question_blocks  # noqa: E402
+
+FIXTURE_PATH = os.path.join(PROJECT_ROOT, "benchmarks", "fixtures", "merge_pages.json")
+PAGE_W, PAGE_H = 709, 1001
+
+
+def make_fixtures(num_pages: int = 40, seed: int = 0):
+    """Two-column pages; each question is split into 1-3 fragments with small vertical gaps."""
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(num_pages):
+        blocks, questions = [], 0
+        for col_x in (40, 375):
+            y = 80 + rng.uniform(0, 40)
+            while True:
+                height = rng.uniform(120, 260)
+                if y + height > PAGE_H - 60:
+                    break
+                parts = rng.randint(1, 3)
+                cuts = sorted(rng.uniform(y + 20, y + height - 20) for _ in range(parts - 1))
+                edges = [y] + cuts + [y + height]
+                for top, bottom in zip(edges[:-1], edges[1:]):
+                    gap = rng.uniform(2, 12) if top != y else 0
+                    x0 = col_x + rng.uniform(-4, 4)
+                    blocks.append({"label": "question_block", "bbox": [x0, top + gap, x0 + 290 + rng.uniform(-6, 6), bottom]})
+                questions += 1
+                y += height + rng.uniform(50, 90)
+        rng.shuffle(blocks)
+        pages.append({"image_size": [PAGE_W, PAGE_H], "questions": questions, "blocks": blocks})
+    return pages
+
+
+def run(pages, column_aware: bool, passes: int, repeat: int):
+    merges, exact, times = [], 0, []
+    for page in pages:
+        img_w, img_h = page["image_size"]
+        kwargs = dict(x_overlap_ratio=0.6, max_vgap_px=int(img_h * 0.03),
+                      column_split_x=img_w / 2.0 if column_aware else None, max_passes=passes)
+        blocks = [dict(b, bbox=tuple(b["bbox"])) for b in page["blocks"]]
+        merged = merge_question_blocks(copy.deepcopy(blocks), merge_trace=[], **kwargs)
+        merges.append(len(blocks) - len(merged))
+        exact += int(len(merged) == page["questions"])
+        inputs = [copy.deepcopy(blocks) for _ in range(repeat)]
+        start = time.perf_counter()
+        for page_blocks in inputs:
+            merge_question_blocks(page_blocks, merge_trace=[], **kwargs)
+        times.append((time.perf_counter() - start) / repeat * 1e6)
+    return {"merges_total": sum(merges), "pages_exact": exact, "us_per_page_median": statistics.median(times)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="question_block merge benchmark")
+    parser.add_argument("--passes", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--write-fixtures", action="store_true")
+    args = parser.parse_args()
+
+    if args.write_fixtures or not os.path.exists(FIXTURE_PATH):
+        os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+        with open(FIXTURE_PATH, "w", encoding="utf-8") as f:
+            json.dump(make_fixtures(), f)
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        pages = json.load(f)
+
+    fragments = sum(len(p["blocks"]) for p in pages)
+    expected = fragments - sum(p["questions"] for p in pages)
+    print(f"{len(pages)} pages, {fragments} fragments, {expected} merges expected")
+    print(f"{'mode':<16}{'merges':>8}{'exact pages':>13}{'us/page':>10}")
+    for name, column_aware in (("legacy", False), ("column-aware", True)):
+        r = run(pages, column_aware, args.passes, args.repeat)
+        print(f"{name:<16}{r['merges_total']:>8}{r['pages_exact']:>9}/{len(pages):<3}{r['us_per_page_median']:>10.1f}")
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-detection page filter check.
+
+Runs `src.page_filter.PageFilter` over synthetic uploads and fails if a page
+is skipped that should be kept, or a repeated page is kept:
+
+-   template: `stub_detector.make_exam_pdf` pages, i.e. the same boxes with
+    different text on every page. All pages must be kept.
+-   text_copies: the template pages followed by copies of two of them. Only
+    the copies are skipped, as `duplicate_of` the page they repeat.
+-   scans: the same pages rasterized into an image-only PDF (no text layer),
+    plus a copy of one scan. Only the copy is skipped.
+
+Also reports the classify time per page.
+
+Usage:
+    python benchmarks/page_filter.py
+    python benchmarks/page_filter.py --pages 12 --dpi 200
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz  # noqa: E402  PyMuPDF
+
+from src.config import Config  # noqa: E402
+from src.page_filter import PageFilter  # noqa: E402
+from stub_detector import make_exam_pdf  # noqa: E402
+
+
+def with_copies(src: str, dst: str, copies: List[int]):
+    """Appends copies of the given (0-based) pages at the end of the document."""
+    doc = fitz.open(src)
+    for p in copies:
+        doc.fullcopy_page(p)
+    doc.save(dst)
+    doc.close()
+
+
+def as_scans(src: str, dst: str, dpi: int, copies: List[int]):
+    """Image-only version of the document, with the same scan inserted again for each page in `copies`."""
+    doc, out = fitz.open(src), fitz.open()
+    scans = [page.get_pixmap(dpi=dpi).tobytes("png") for page in doc]
+    for p in list(range(len(scans))) + copies:
+        rect = doc[p].rect
+        out.new_page(width=rect.width, height=rect.height).insert_image(rect, stream=scans[p])
+    out.save(dst)
+    out.close()
+    doc.close()
+
+
+def classify(path: str, config: Config) -> Dict[str, Any]:
+    page_filter = PageFilter(config)
+    doc = fitz.open(path)
+    skipped: Dict[int, Optional[int]] = {}
+    start = time.perf_counter()
+    for i, page in enumerate(doc):
+        reason, stats = page_filter.classify(page, {"page": i})
+        if reason is not None:
+            skipped[i] = stats.get("duplicate_of", {}).get("page") if reason == "duplicate" else reason
+    ms = (time.perf_counter() - start) * 1000.0 / max(1, len(doc))
+    doc.close()
+    return {"skipped": skipped, "ms_per_page": round(ms, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--dpi", type=int, default=150, help="scan resolution")
+    args = parser.parse_args()
+
+    config = Config()
+    n = args.pages
+    copies = [1, n - 1]
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.pdf")
+        make_exam_pdf(template, pages=n)
+        cases = {"template": (template, {})}
+        with_copies(template, os.path.join(tmp, "text_copies.pdf"), copies)
+        cases["text_copies"] = (os.path.join(tmp, "text_copies.pdf"), {n + k: p for k, p in enumerate(copies)})
+        as_scans(template, os.path.join(tmp, "scans.pdf"), args.dpi, copies[:1])
+        cases["scans"] = (os.path.join(tmp, "scans.pdf"), {n: copies[0]})
+
+        print(f"{'case':<12} {'pages':>5} {'ms/page':>8}  skipped (page: duplicate_of or reason)")
+        for name, (path, expected) in cases.items():
+            result = classify(path, config)
+            pages = n + len(expected)
+            print(f"{name:<12} {pages:>5} {result['ms_per_page']:>8}  {result['skipped']}")
+            if result["skipped"] != expected:
+                failures.append(f"{name}: expected {expected}, got {result['skipped']}")
+
+    if failures:
+        raise SystemExit("page filter check failed:\n  " + "\n  ".join(failures))
+    print("ok")
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Passage search index benchmark.
+
+Indexes a synthetic archive through `src.search_index.SearchIndex` (one
+`index_exam` call per exam, as `run_pipeline` does) and reports the time to
+index one exam, the index size, and query latency percentiles for common,
+rare, spacing-variant, one-character and year-filtered queries.
+
+Passages and question blocks are built from random Hangul words plus a few
+topic phrases ("정보 이론", "엔트로피", ...) planted at known rates, and exam
+file names carry a year (2014-2024). Results are saved to
+`benchmarks/results/search_index.json`.
+
+Usage:
+    python benchmarks/search_index.py
+    python benchmarks/search_index.py --exams 600 --units 50 --repeat 50
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.search_index import SearchIndex  # noqa: E402
+
+TOPICS = ["정보 이론", "엔트로피", "섀넌", "양자 역학", "사회 계약", "비트겐슈타인", "광합성", "채권 시장"]
+QUERIES = {
+    "common": ["정보", "이론", "시장"],
+    "rare": ["엔트로피", "비트겐슈타인", "광합성"],
+    "two_words": ["정보 이론", "사회 계약", "채권 시장"],
+    "no_spacing": ["정보이론", "양자역학", "사회계약"],
+    "with_year": ["정보 이론 2019", "광합성 2021", "섀넌 2016"],
+    "one_char": ["섀", "빛"],
+    "no_hit": ["블록체인", "qwerty"],
+}
+
+
+def make_words(rng: random.Random, count: int) -> List[str]:
+    return ["".join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.randint(1, 4))) for _ in range(count)]
+
+
+def make_text(rng: random.Random, words: List[str], length: int) -> str:
+    parts = []
+    while sum(len(p) + 1 for p in parts) < length:
+        parts.append(rng.choice(TOPICS) if rng.random() < 0.01 else rng.choice(words))
+    return " ".join(parts) + "."
+
+
+def make_exam(rng: random.Random, words: List[str], units: int) -> List[List[Dict[str, str]]]:
+    out = []
+    for i in range(units):
+        if i % 4 == 0:
+            out.append([{"label": "passage", "crop_id": f"{rng.getrandbits(128):032x}", "image_path": "",
+                         "text_content": make_text(rng, words, 900)}])
+        else:
+            out.append([{"label": "question_block", "crop_id": f"{rng.getrandbits(128):032x}", "image_path": "",
+                         "text_content": f"{i}. " + make_text(rng, words, 160)}])
+    return out
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exams", type=int, default=300)
+    parser.add_argument("--units", type=int, default=100, help="components per exam")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "benchmarks", "results", "search_index.json"))
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = make_words(rng, 5000) + ["정보", "이론", "시장", "빛"] * 20
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, "search.sqlite3"))
+        index_ms = []
+        for e in range(args.exams):
+            units = make_exam(rng, words, args.units)
+            start = time.perf_counter()
+            index.index_exam(f"exam{e:05d}", f"{2014 + e % 11}국어_{e}.pdf", units)
+            index_ms.append((time.perf_counter() - start) * 1000.0)
+        # 같은 시험지를 다시 처리한 경우 (기존 행 교체)
+        start = time.perf_counter()
+        index.index_exam("exam00000", "2014국어_0.pdf", make_exam(rng, words, args.units))
+        reindex_ms = (time.perf_counter() - start) * 1000.0
+        stats = index.stats()
+
+        rows = {}
+        for kind, queries in QUERIES.items():
+            latencies, hits = [], []
+            for q in queries:
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    found = index.search(q, limit=20)
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+                hits.append(len(found["results"]))
+            rows[kind] = {"p50_ms": round(statistics.median(latencies), 2),
+                          "p95_ms": round(percentile(latencies, 0.95), 2),
+                          "max_ms": round(max(latencies), 2), "hits": hits}
+
+    report = {"args": vars(args), "components": stats["components"], "index_mb": round(stats["bytes"] / 2 ** 20, 1),
+              "index_exam_ms": {"p50": round(statistics.median(index_ms), 1),
+                                "p95": round(percentile(index_ms, 0.95), 1)},
+              "reindex_exam_ms": round(reindex_ms, 1), "queries": rows}
+    print(f"{stats['components']} components, {report['index_mb']} MB; index_exam p50 "
+          f"{report['index_exam_ms']['p50']} ms, re-index {report['reindex_exam_ms']} ms")
+    print(f"{'query':<12} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  hits")
+    for kind, r in rows.items():
+        print(f"{kind:<12} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['max_ms']:>8}  {r['hits']}")
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"saved: {args.output}")
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic stand-in for the YOLO layout detector.
+
+Returns the same canned two-column exam layout for every page (boxes are
+given as fractions of the page size, so any DPI works) in the shape the
+pipeline reads from ultralytics results (`result.boxes.data`, `result.plot()`).
+It lets the render, group, shuffle and recombine paths run for real without
+GPU weights or network access.
+
+`install()` swaps it in for `src.inference.load_detector`, and `make_exam_pdf`
+writes a synthetic exam PDF whose drawn content matches the canned layout.
+"""
+
+import os
+import sys
+from typing import List, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# (class id, x0, y0, x1, y1) as fractions of the page; ids follow Config.CLASS_NAMES
+LAYOUT: List[Tuple[int, float, float, float, float]] = [
+    (0, 0.07, 0.07, 0.47, 0.095),   # header
+    (1, 0.07, 0.11, 0.47, 0.47),    # passage
+    (2, 0.52, 0.07, 0.94, 0.30),    # question_block
+    (3, 0.525, 0.075, 0.555, 0.095),  # question_number
+    (2, 0.52, 0.32, 0.94, 0.59),
+    (3, 0.525, 0.325, 0.555, 0.345),
+    (4, 0.54, 0.50, 0.67, 0.57),    # figure
+    (2, 0.07, 0.50, 0.47, 0.83),
+    (3, 0.075, 0.505, 0.105, 0.525),
+    (2, 0.52, 0.62, 0.94, 0.90),
+    (3, 0.525, 0.625, 0.555, 0.645),
+    (5, 0.42, 0.95, 0.58, 0.985),   # footer
+]
+CONFIDENCE = 0.9
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Result:
+    def __init__(self, data, shape):
+        self.boxes = _Boxes(data)
+        self._shape = shape
+
+    def plot(self):
+        import numpy as np
+        return np.full(self._shape + (3,), 255, dtype=np.uint8)
+
+
+class StubDetector:
+    """Callable like an ultralytics YOLO model: `model(image_path, conf=...)` -> [result]."""
+
+    def __call__(self, source, conf: float = 0.25, **kwargs):
+        from PIL import Image
+        sources = source if isinstance(source, list) else [source]
+        results = []
+        for src in sources:
+            if hasattr(src, "shape"):  # numpy page/tile (tiled detection)
+                h, w = src.shape[:2]
+            else:
+                with Image.open(src) as img:
+                    w, h = img.size
+            rows = [[x0 * w, y0 * h, x1 * w, y1 * h, CONFIDENCE, cls]
+                    for cls, x0, y0, x1, y1 in LAYOUT if CONFIDENCE >= conf]
+            results.append(_Result(rows, (h, w)))
+        return results
+
+
+def install():
+    """Makes every `get_detector`/`load_detector` call in this process return the stub."""
+    import src.inference as inference
+    inference.load_detector = lambda *args, **kwargs: StubDetector()
+    inference._detectors.clear()
+
+
+def make_exam_pdf(path: str, pages: int = 4, seed: int = 0):
+    """Writes a PDF whose pages carry filled boxes and text at the canned layout positions."""
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page(width=709, height=1001)  # B4 in points
+        w, h = page.rect.width, page.rect.height
+        for i, (cls, x0, y0, x1, y1) in enumerate(LAYOUT):
+            rect = fitz.Rect(x0 * w, y0 * h, x1 * w, y1 * h)
+            page.draw_rect(rect, color=(0, 0, 0), fill=(0.95, 0.95 - 0.05 * cls, 0.9), width=0.5)
+            page.insert_textbox(rect + (4, 4, -4, -4), f"seed {seed} page {p} box {i} " * 6, fontsize=7)
+    doc.save(path)
+    doc.close()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Tiled detection benchmark: latency vs. small-box recall.
+
+Compares whole-page detection (page letterboxed to `--page-imgsz`) with
+`inference.detect_tiled` (overlapping `DETECTION_TILE_SIZE` tiles, batched
+across pages, class-wise NMS) and reports per-page latency and per-class
+recall at IoU 0.5.
+
+Detectors:
+-   stub (default): synthetic manifest-sized pages (3509x4963) with solid
+    class-coloured boxes, and a stand-in detector that letterboxes its input
+    like YOLO, finds the coloured rectangles, and misses boxes smaller than
+    `--min-box-px` model-input pixels. Inference cost is simulated as
+    `--ms-per-mpix` per megapixel of model input (the stand-in's own
+    rectangle finding is subtracted), so latency numbers are a model of the
+    real cost, not a measurement of it.
+-   yolo: the configured weights on the labeled pages of `output.manifest`
+    found under `--images` (see `src/evaluate.py`).
+
+Usage:
+    python benchmarks/tiled_inference.py
+    python benchmarks/tiled_inference.py --pages 4 --tile-sizes 640 1024 1600 --overlap 0.1
+    python benchmarks/tiled_inference.py --detector yolo --images data/processed/images --limit 20
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from src.config import Config  # noqa: E402
+from src.evaluate import box_iou, load_ground_truth  # noqa: E402
+from src.inference import detect_tiled, results_to_annotations  # noqa: E402
+
+PAGE_W, PAGE_H = 3509, 4963  # manifest page size
+COLORS = {  # class id -> fill colour on the synthetic pages
+    0: (0, 0, 255), 1: (0, 160, 0), 2: (230, 0, 0), 3: (255, 200, 0), 4: (160, 0, 200), 5: (0, 200, 200),
+}
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+
+
+def make_page(path: str, seed: int, config: Config) -> List[Dict[str, Any]]:
+    """Two-column page: header, passage, question blocks with small number boxes, figures, footer."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (PAGE_W, PAGE_H), "white")
+    draw = ImageDraw.Draw(img)
+    gts = []
+
+    def box(cls, x0, y0, x1, y1):
+        draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=COLORS[cls])
+        gts.append({"label": config.CLASS_NAMES[cls], "bbox": (x0, y0, x1, y1)})
+
+    col_w = 1500
+    for col_x in (180, 1830):
+        y = 300
+        if col_x == 180:
+            box(0, col_x, y, col_x + col_w, y + 90); y += 140
+            box(1, col_x, y, col_x + col_w, y + 1500); y += 1600
+        while y < PAGE_H - 900:
+            h = rng.randint(500, 800)
+            box(2, col_x, y, col_x + col_w, y + h)
+            n = rng.randint(28, 48)  # 문항 번호: 300 DPI에서 2~4 mm
+            box(3, col_x + 20, y + 20, col_x + 20 + n, y + 20 + n)
+            if rng.random() < 0.3:
+                box(4, col_x + 400, y + h - 330, col_x + 900, y + h - 30)
+            y += h + rng.randint(60, 140)
+    box(5, 1500, PAGE_H - 250, 2000, PAGE_H - 150)
+    img.save(path)
+    return gts
+
+
+def _segments(v: np.ndarray):
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], v.astype(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def _xy_cut(mask: np.ndarray, x0: int, y0: int, out: List):
+    for r0, r1 in _segments(mask.any(axis=1)):
+        band = mask[r0:r1]
+        for c0, c1 in _segments(band.any(axis=0)):
+            block = band[:, c0:c1]
+            if block.any(axis=1).all() and block.any(axis=0).all():
+                out.append((x0 + c0, y0 + r0, x0 + c1, y0 + r1))
+            else:
+                _xy_cut(block, x0 + c0, y0 + r0, out)
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = _Boxes(data)
+
+
+class SimulatedDetector:
+    """YOLO-like call signature; sees the input only at model resolution."""
+
+    def __init__(self, default_imgsz: int, min_box_px: float, ms_per_mpix: float):
+        self.default_imgsz = default_imgsz
+        self.min_box_px = min_box_px
+        self.ms_per_mpix = ms_per_mpix
+        self.own_seconds = 0.0  # time spent finding rectangles (not part of the simulated cost)
+        self.images = 0
+
+    def __call__(self, sources, conf: float = 0.25, imgsz: int = None, **kwargs):
+        imgsz = imgsz or self.default_imgsz
+        sources = sources if isinstance(sources, list) else [sources]
+        time.sleep(self.ms_per_mpix * len(sources) * imgsz * imgsz / 1e6 / 1000.0)
+        self.images += len(sources)
+        start = time.perf_counter()
+        results = []
+        for src in sources:
+            bgr = src if hasattr(src, "shape") else np.asarray(Image.open(src).convert("RGB"))[..., ::-1]
+            h, w = bgr.shape[:2]
+            s = min(1.0, imgsz / float(max(w, h)))
+            small = np.asarray(Image.fromarray(np.ascontiguousarray(bgr[..., ::-1])).resize(
+                (max(1, round(w * s)), max(1, round(h * s))), Image.BOX), dtype=np.int16)
+            rows = []
+            for cls, color in COLORS.items():
+                mask = (np.abs(small - np.asarray(color, dtype=np.int16)).max(axis=2) < 40)
+                found: List = []
+                _xy_cut(mask, 0, 0, found)
+                for x0, y0, x1, y1 in found:
+                    if min(x1 - x0, y1 - y0) >= self.min_box_px:
+                        rows.append([x0 / s, y0 / s, x1 / s, y1 / s, 0.9, cls])
+            results.append(_Result(rows))
+        self.own_seconds += time.perf_counter() - start
+        return results
+
+
+def recall_by_class(preds: List[Dict[str, Any]], gts: List[Dict[str, Any]], labels) -> Dict[str, List[int]]:
+    out = {}
+    for label in labels:
+        g = np.asarray([a["bbox"] for a in gts if a["label"] == label], dtype=np.float64).reshape(-1, 4)
+        p = np.asarray([a["bbox"] for a in preds if a["label"] == label], dtype=np.float64).reshape(-1, 4)
+        hit = int((box_iou(g, p).max(axis=1) >= 0.5).sum()) if len(g) and len(p) else 0
+        out[label] = [hit, len(g)]
+    return out
+
+
+def run_mode(model, pages, config: Config, tile_size: int = None, page_imgsz: int = None) -> Dict[str, Any]:
+    paths = [p["image_path"] for p in pages]
+    own_before, images_before = getattr(model, "own_seconds", 0.0), getattr(model, "images", 0)
+    start = time.perf_counter()
+    if tile_size:
+        config.DETECTION_TILE_SIZE = tile_size
+        preds = detect_tiled(model, paths, config)
+    else:
+        preds = [[a for r in model(path, conf=config.DETECTION_CONF, imgsz=page_imgsz, verbose=False)
+                  for a in results_to_annotations(r, config)] for path in paths]
+    elapsed = time.perf_counter() - start - (getattr(model, "own_seconds", 0.0) - own_before)
+    totals: Dict[str, List[int]] = {}
+    for page, pred in zip(pages, preds):
+        for label, (hit, n) in recall_by_class(pred, page["annotations"], config.CLASSES).items():
+            t = totals.setdefault(label, [0, 0])
+            t[0] += hit
+            t[1] += n
+    images = getattr(model, "images", None)
+    return {"ms_per_page": elapsed * 1000.0 / len(pages),
+            "model_inputs_per_page": (images - images_before) / len(pages) if images is not None else None,
+            "recall": {label: (hit / n if n else None) for label, (hit, n) in totals.items()}}
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detector", choices=["stub", "yolo"], default="stub")
+    parser.add_argument("--pages", type=int, default=2, help="synthetic pages (stub)")
+    parser.add_argument("--images", type=str, default=config.IMAGE_DIR, help="labeled page images (yolo)")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--page-imgsz", type=int, default=1024, help="model input size of the whole-page mode")
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=[config.DETECTION_TILE_SIZE])
+    parser.add_argument("--overlap", type=float, default=config.DETECTION_TILE_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=config.DETECTION_BATCH_SIZE)
+    parser.add_argument("--no-full-page-pass", action="store_true")
+    parser.add_argument("--min-box-px", type=float, default=12.0, help="stub: smallest box side the model resolves")
+    parser.add_argument("--ms-per-mpix", type=float, default=250.0, help="stub: simulated inference cost")
+    args = parser.parse_args()
+
+    config.DETECTION_TILE_OVERLAP = args.overlap
+    config.DETECTION_BATCH_SIZE = args.batch_size
+    config.DETECTION_TILE_FULL_PAGE_PASS = not args.no_full_page_pass
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.detector == "stub":
+            model = SimulatedDetector(args.page_imgsz, args.min_box_px, args.ms_per_mpix)
+            pages = []
+            for i in range(args.pages):
+                path = os.path.join(work_dir, f"page_{i:03d}.png")
+                pages.append({"image_path": path, "annotations": make_page(path, i, config)})
+        else:
+            from src.inference import load_detector
+            model = load_detector(config)
+            pages = []
+            for p in load_ground_truth(config.GROUND_TRUTH_MANIFEST_PATH, args.images, config)[:args.limit]:
+                with Image.open(p["image_path"]) as img:
+                    sx, sy = img.size[0] / float(p["gt_size"][0]), img.size[1] / float(p["gt_size"][1])
+                pages.append({"image_path": p["image_path"], "annotations": [
+                    {"label": g["label"], "bbox": (g["bbox"][0] * sx, g["bbox"][1] * sy, g["bbox"][2] * sx, g["bbox"][3] * sy)}
+                    for g in p["annotations"]]})
+            if not pages:
+                raise SystemExit(f"no labeled pages found under {args.images}")
+
+        rows = [("whole page", args.page_imgsz, run_mode(model, pages, config, page_imgsz=args.page_imgsz))]
+        for tile_size in args.tile_sizes:
+            rows.append(("tiled", tile_size, run_mode(model, pages, config, tile_size=tile_size)))
+
+    labels = list(config.CLASSES)
+    print(f"detector={args.detector} pages={len(pages)} overlap={args.overlap} batch={args.batch_size} "
+          f"full_page_pass={config.DETECTION_TILE_FULL_PAGE_PASS}")
+    print(f"{'mode':<12}{'size':>6}{'ms/page':>10}{'inputs':>8}" + "".join(f"{l[:14]:>16}" for l in labels))
+    for mode, size, res in rows:
+        recalls = "".join(f"{'-' if res['recall'][l] is None else format(res['recall'][l], '.3f'):>16}" for l in labels)
+        inputs = res["model_inputs_per_page"]
+        print(f"{mode:<12}{size:>6}{res['ms_per_page']:>10.1f}{'-' if inputs is None else format(inputs, '.0f'):>8}{recalls}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"tiled_inference_{args.detector}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "rows": [{"mode": m, "size": s, **r} for m, s, r in rows]}, f, indent=2)
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Training input pipeline benchmark.
+
+Compares the images/sec a training loop can consume from
+
+-   decode: the previous path, which opens each page PNG, decodes it and
+    letterboxes it in every epoch (`src.training_dataset.load_page` per item)
+-   memmap: the prebuilt `images.npy` read through `LayoutDataset`
+
+and reports the one-off build time of the memmap. Batches go through the
+torch DataLoader (`--workers` processes) when torch is installed and through
+a plain in-process loop otherwise.
+
+Without `--images`, synthetic pages of the Ground Truth size (3509x4963) with
+text-like content are written to a temporary directory together with a
+matching manifest, so the numbers reflect real PNG decode cost. Results are
+saved to `benchmarks/results/training_dataset.json`.
+
+Usage:
+    python benchmarks/training_dataset.py
+    python benchmarks/training_dataset.py --pages 32 --imgsz 640 --epochs 3 --workers 4
+    python benchmarks/training_dataset.py --images data/processed/images
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from src.config import Config  # noqa: E402
+from src.evaluate import load_ground_truth  # noqa: E402
+from src.training_dataset import LayoutDataset, build_dataset, load_page, yolo_boxes, collate  # noqa: E402
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+PAGE_SIZE = (3509, 4963)
+
+
+class DecodeDataset:
+    """Same items as LayoutDataset, decoded from the page PNGs on every access."""
+
+    def __init__(self, pages: List[Dict[str, Any]], size: int, config: Config):
+        self.pages, self.size, self.config = pages, size, config
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __getitem__(self, index: int):
+        image, geometry = load_page(self.pages[index]["image_path"], self.size)
+        return image, yolo_boxes(self.pages[index], geometry, self.size, self.config)
+
+
+def make_pages(out_dir: str, num_pages: int, seed: int = 0) -> str:
+    """Writes synthetic two-column pages and a Ground Truth style manifest; returns the manifest path."""
+    rng = random.Random(seed)
+    width, height = PAGE_SIZE
+    lines = []
+    for i in range(num_pages):
+        img = Image.new("RGB", PAGE_SIZE, "white")
+        draw = ImageDraw.Draw(img)
+        annotations = []
+        for col in range(2):
+            x0 = 250 + col * (width // 2)
+            y = 700
+            while y < height - 600:
+                block_h = rng.randint(300, 900)
+                annotations.append({"class_id": rng.choice([1, 2]), "left": x0, "top": y,
+                                    "width": width // 2 - 400, "height": block_h})
+                for line_y in range(y, y + block_h, 60):  # 글자 줄처럼 보이는 짧은 막대들
+                    x = x0
+                    while x < x0 + width // 2 - 450:
+                        w = rng.randint(20, 70)
+                        draw.rectangle([x, line_y, x + w, line_y + 36], fill=(rng.randint(0, 60),) * 3)
+                        x += w + rng.randint(8, 30)
+                y += block_h + rng.randint(80, 200)
+        name = f"synthetic_page_{i:02d}.png"
+        img.save(os.path.join(out_dir, name.replace(f"_page_{i:02d}", f"_page_{i + 1}")), compress_level=1)
+        lines.append(json.dumps({
+            "source-ref": f"s3://bench/{name}",
+            "suneung-korean-layout-detection-v2": {
+                "image_size": [{"width": width, "height": height, "depth": 3}], "annotations": annotations},
+        }))
+    manifest_path = os.path.join(out_dir, "output.manifest")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return manifest_path
+
+
+def consume(dataset, batch_size: int, workers: int, epochs: int) -> Dict[str, float]:
+    """Iterates `epochs` epochs in batches and returns images/sec (first epoch included)."""
+    try:
+        import torch  # noqa: F401
+        from torch.utils.data import DataLoader
+        loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers, collate_fn=collate,
+                            persistent_workers=workers > 0)
+    except ImportError:
+        order = list(range(len(dataset)))
+        loader = None
+
+    seen, checksum = 0, 0
+    start = time.perf_counter()
+    for _ in range(epochs):
+        if loader is not None:
+            for images, targets in loader:
+                seen += len(images)
+                checksum += int(images[:, :, ::64, ::64].sum()) + len(targets)
+        else:
+            random.shuffle(order)
+            for i in range(0, len(order), batch_size):
+                batch = [dataset[j] for j in order[i:i + batch_size]]
+                images = np.stack([image for image, _ in batch])
+                seen += len(images)
+                checksum += int(images[:, ::64, ::64].sum()) + sum(len(b) for _, b in batch)
+    elapsed = time.perf_counter() - start
+    return {"images": seen, "seconds": round(elapsed, 3), "images_per_sec": round(seen / elapsed, 1),
+            "checksum": checksum}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="directory with real manifest pages (default: synthetic pages)")
+    parser.add_argument("--pages", type=int, default=16, help="synthetic page count")
+    parser.add_argument("--imgsz", type=int, default=None, help="default: TRAINING_IMAGE_SIZE")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=None, help="default: BATCH_SIZE")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader workers (torch only)")
+    parser.add_argument("--build-workers", type=int, default=None, help="default: TRAINING_BUILD_WORKERS")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "training_dataset.json"))
+    args = parser.parse_args()
+
+    config = Config()
+    size = args.imgsz or config.TRAINING_IMAGE_SIZE
+    batch_size = args.batch_size or config.BATCH_SIZE
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            image_dir, manifest_path = args.images, config.GROUND_TRUTH_MANIFEST_PATH
+        else:
+            image_dir, manifest_path = tmp, make_pages(tmp, args.pages)
+        pages = load_ground_truth(manifest_path, image_dir, config)
+        print(f"{len(pages)} pages, {size}px letterbox, batch {batch_size}, {args.epochs} epochs, workers {args.workers}")
+
+        start = time.perf_counter()
+        root = build_dataset(config, image_dir, os.path.join(tmp, "mmap"), size, args.build_workers,
+                             force=True, manifest_path=manifest_path)
+        build_s = time.perf_counter() - start
+
+        decode = consume(DecodeDataset(pages, size, config), batch_size, args.workers, args.epochs)
+        memmap = consume(LayoutDataset(root), batch_size, args.workers, args.epochs)
+        assert decode["checksum"] == memmap["checksum"], "memmap items differ from decoded pages"
+        dataset_mb = os.path.getsize(os.path.join(root, "images.npy")) / 2 ** 20
+
+    report = {
+        "args": vars(args), "pages": len(pages), "image_size": size, "dataset_mb": round(dataset_mb, 1),
+        "build_seconds": round(build_s, 2), "decode": decode, "memmap": memmap,
+        "speedup": round(memmap["images_per_sec"] / decode["images_per_sec"], 1),
+    }
+    print(f"build   : {build_s:.2f}s ({dataset_mb:.0f} MB)")
+    print(f"decode  : {decode['images_per_sec']:.1f} img/s")
+    print(f"memmap  : {memmap['images_per_sec']:.1f} img/s ({report['speedup']}x)")
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved: {args.output}")
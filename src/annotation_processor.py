@@ -1,10 +1,15 @@
 import os
 import json
 from typing import List, Dict, Tuple, Any, Optional
-from PIL import Image, ImageDraw
-from collections import defaultdict
-
-from .image_cropper import crop_and_mask_image, Bbox
+from collections import defaultdict, OrderedDict
+
+from .image_io import save_image
+from .image_cropper import load_page_array, crop_and_mask_array, save_array_image
+from .spatial_index import GridIndex
+from .crop_store import get_crop_store
+from .pdf_text_layer import attach_text, merge_text_layer
+from .profiling import span
+from .cpu_pool import get_cpu_pool, run_tasks
 from .config import Config
 
 # --- Type Aliases ---
@@ -54,16 +59,9 @@ def _kmeans_two_columns(x_centers: List[float]):
         mid = xs[len(xs)//2]
         return mid, xs[0], False
 
-def _point_in_bbox(pt, bbox):
-    x,y = pt
-    return (bbox[0] <= x <= bbox[2]) and (bbox[1] <= y <= bbox[3])
-
 def _center(b):
     return ((b[0]+b[2])/2.0, (b[1]+b[3])/2.0)
 
-def _distance(p, q):
-    return ((p[0]-q[0])**2 + (p[1]-q[1])**2) ** 0.5
-
 def _merge_adjacent_blocks(blocks: List[Dict[str, Any]], x_overlap_ratio=0.6, max_vgap_px=80,
                            merge_trace: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     merged = []
@@ -99,7 +97,42 @@ def _merge_adjacent_blocks(blocks: List[Dict[str, Any]], x_overlap_ratio=0.6, ma
             merged.append(b)
     return merged
 
-def _draw_boxes(image_path: str, annos: List[Dict[str, Any]], outfile: str, title: Optional[str] = None):
+def merge_question_blocks(blocks: List[Dict[str, Any]], x_overlap_ratio=0.6, max_vgap_px=80,
+                          column_split_x: Optional[float] = None, max_passes: int = 1,
+                          merge_trace: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    분할된 question_block 병합. 컬럼(column_split_x 기준)별로 (y, x) 정렬 후 선형 스윕 한 번으로
+    인접 블록을 합치므로 두 컬럼의 블록이 섞여 병합을 놓치는 일이 없습니다.
+    max_passes > 1이면 더 이상 병합이 없을 때까지(고정점) 스윕을 반복합니다.
+    merge_trace 항목에는 column과 pass가 추가로 기록됩니다.
+    """
+    sort_key = lambda x: (x["bbox"][1], x["bbox"][0])
+    columns: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for b in blocks:
+        col = 0 if column_split_x is None or (b["bbox"][0]+b["bbox"][2])/2.0 < column_split_x else 1
+        columns[col].append(b)
+
+    merged_all = []
+    for col in sorted(columns):
+        current = sorted(columns[col], key=sort_key)
+        for pass_idx in range(max(1, max_passes)):
+            pass_trace: List[Dict[str, Any]] = []
+            merged = _merge_adjacent_blocks(current, x_overlap_ratio=x_overlap_ratio, max_vgap_px=max_vgap_px,
+                                            merge_trace=pass_trace)
+            if merge_trace is not None:
+                for t in pass_trace:
+                    t.update({"column": col, "pass": pass_idx})
+                merge_trace.extend(pass_trace)
+            fixed_point = len(merged) == len(current)
+            current = sorted(merged, key=sort_key)
+            if fixed_point:
+                break
+        merged_all.extend(current)
+    return sorted(merged_all, key=sort_key)
+
+def _draw_boxes(image_path: str, annos: List[Dict[str, Any]], out_path_base: str, policy: Dict[str, Any],
+                title: Optional[str] = None):
+    from PIL import Image, ImageDraw
     try:
         im = Image.open(image_path).convert("RGB")
     except Exception:
@@ -115,11 +148,264 @@ def _draw_boxes(image_path: str, annos: List[Dict[str, Any]], outfile: str, titl
         draw.rectangle((bbox[0], max(0, bbox[1]-tag_h), bbox[0]+8*len(txt), bbox[1]), fill=color)
     if title:
         draw.text((10, 10), title, fill=(255,255,255))
-    im.save(outfile)
+    save_image(im, out_path_base, policy)
+
+def filter_page_annotations(annotations: List[Dict[str, Any]], img_w: int, img_h: int, config: Config,
+                            page_index: int = 0, image_path: str = "",
+                            page_report: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    한 페이지의 원시 검출 결과에 1) 신뢰도(DETECTION_CONF와 라벨별 최소값 중 큰 값)/면적/종횡비 필터, 2) 클래스별 NMS,
+    3) 분할된 question_block 병합을 적용합니다. 임계값은 모두 Config에서 읽습니다.
+    """
+    if page_report is None:
+        page_report = {"label_counts": {}, "merge_trace": [], "merged_qb_count": 0}
+
+    # 1) filter
+    raw = []
+    for a in annotations:
+        bbox = tuple(map(float, a["bbox"]))
+        w = max(0.0, bbox[2]-bbox[0]); h = max(0.0, bbox[3]-bbox[1])
+        area_ratio = (w*h) / max(1.0, img_w*img_h)
+        conf = float(a.get("confidence", 0.5))
+        label = a["label"]
+        if a.get("source") != "text_layer":  # PDF 텍스트에서 읽은 박스는 정확하므로 필터하지 않음
+            # 검출은 낮은 하한(DETECTION_FLOOR_CONF)으로 저장되므로 DETECTION_CONF도 여기서 적용
+            min_conf = max(config.DETECTION_CONF, config.MIN_CONF_BY_LABEL.get(label, config.DEFAULT_MIN_CONF))
+            if conf < min_conf:
+                continue
+            if area_ratio < config.MIN_AREA_RATIO:
+                continue
+            if label == "question_number":
+                ar = (max(w,h)/max(1.0, min(w,h)))
+                if ar > config.QUESTION_NUMBER_MAX_ASPECT:
+                    continue
+        a = dict(a)
+        a.update({"bbox": bbox, "page_index": page_index, "original_image_path": image_path})
+        raw.append(a)
+
+    # 2) NMS per class
+    by_cls = defaultdict(list)
+    for a in raw:
+        by_cls[a["label"]].append(a)
+    filtered = []
+    for lbl, arr in by_cls.items():
+        keep = _nms(arr, iou_thr=config.NMS_IOU_THRESHOLD)
+        filtered.extend(keep)
+        page_report["label_counts"][lbl] = len(keep)
+
+    # 3) merge split qbs with trace
+    qbs = [a for a in filtered if a["label"]=="question_block"]
+    others = [a for a in filtered if a["label"]!="question_block"]
+    before = len(qbs)
+    qbs = merge_question_blocks(qbs, x_overlap_ratio=config.QB_MERGE_X_OVERLAP_RATIO,
+                                max_vgap_px=int(img_h*config.QB_MERGE_MAX_VGAP_RATIO),
+                                column_split_x=img_w/2.0 if config.QB_MERGE_COLUMN_AWARE else None,
+                                max_passes=config.QB_MERGE_MAX_PASSES,
+                                merge_trace=page_report["merge_trace"])
+    page_report["merged_qb_count"] = before - len(qbs)
+    return qbs + others
+
+def process_page(page_index: int, page_data: Dict[str, Any], config: Config,
+                 debug_root: Optional[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    한 페이지의 후처리 1)~7) (필터, NMS, 병합, 컬럼, 번호/그림 연결, 텍스트 레이어) + 정렬 + 디버그 오버레이.
+    입력 외의 상태를 건드리지 않으므로 페이지마다 다른 프로세스에서 돌려도 결과가 같습니다.
+    debug_root가 None이면 오버레이를 그리지 않고, page_data["image_size"]가 있으면 이미지를 열지 않습니다.
+    반환: (컬럼/y/x 순으로 정렬된 어노테이션, 이 페이지의 report 조각)
+    """
+    from PIL import Image
+
+    image_path = page_data["image_path"]
+    if page_data.get("image_size"):
+        img_w, img_h = page_data["image_size"]
+    else:
+        try:
+            with Image.open(image_path) as img:
+                img_w, img_h = img.size
+        except Exception:
+            img_w = 2000; img_h = 3000
+
+    page_report = {
+        "page_index": page_index,
+        "image_path": image_path,
+        "input_count": len(page_data["annotations"]),
+        "after_filter_count": 0,
+        "kmeans_used": False,
+        "column_threshold": None,
+        "merged_qb_count": 0,
+        "numbers_attached": 0,
+        "numbers_orphan": 0,
+        "figures_attached": 0,
+        "label_counts": {},
+        "column_assignment": [],
+        "number_mapping_trace": [],
+        "merge_trace": [],
+        "detection_cache": page_data.get("detection_cache"),
+        "text_layer": page_data.get("text_layer")
+    }
+
+    # 0) PDF text layer: question_number/header/footer boxes replace the YOLO ones
+    annotations = page_data["annotations"]
+    if page_data.get("text_layer_annotations"):
+        min_passage_conf = max(config.DETECTION_CONF, config.MIN_CONF_BY_LABEL.get("passage", config.DEFAULT_MIN_CONF))
+        annotations = merge_text_layer(annotations, {"annotations": page_data["text_layer_annotations"]},
+                                       min_passage_conf=min_passage_conf)
+
+    # 1) filter → 2) NMS per class → 3) merge split qbs with trace
+    filtered = filter_page_annotations(annotations, img_w, img_h, config,
+                                       page_index=page_index, image_path=image_path,
+                                       page_report=page_report)
+
+    # 4) columns
+    x_centers = [ (a["bbox"][0]+a["bbox"][2])/2.0 for a in filtered if a["label"]!="footer" ]
+    res = _kmeans_two_columns(x_centers) if x_centers else None
+    if res:
+        threshold_x, _, used = res
+        page_report["kmeans_used"] = used
+        page_report["column_threshold"] = threshold_x
+    else:
+        threshold_x = img_w/2.0
+        page_report["kmeans_used"] = False
+        page_report["column_threshold"] = threshold_x
+
+    for idx, a in enumerate(filtered):
+        xc = (a["bbox"][0]+a["bbox"][2])/2.0
+        a["column"] = 0 if xc < threshold_x else 1
+        page_report["column_assignment"].append({"idx": idx, "label": a["label"], "xc": xc, "column": a["column"]})
+
+    # 5) number→block with trace (grid index: containment, then nearest center in the same column)
+    blocks = [a for a in filtered if a["label"]=="question_block"]
+    numbers = [a for a in filtered if a["label"]=="question_number"]
+    for i, b in enumerate(blocks):
+        b["children"] = []
+        b["attachments"] = []
+        b["_tmp_block_id"] = i
+    cell_size = max(img_w, img_h) / 16.0
+    block_index = GridIndex([b["bbox"] for b in blocks], cell_size)
+    blocks_by_col: Dict[int, List[Dict[str, Any]]] = {}
+    for b in blocks:
+        blocks_by_col.setdefault(b["column"], []).append(b)
+    col_index = {col: GridIndex([b["bbox"] for b in bs], cell_size) for col, bs in blocks_by_col.items()}
+    max_dist = max(img_h*0.1, 120)
+    attached = 0
+    for qn in numbers:
+        qn_center = _center(qn["bbox"])
+        method = "none"
+        candidate = None
+        hit = block_index.first_containing(qn_center)
+        if hit is not None:
+            candidate = blocks[hit]; method = "containment"
+        dist_val = None
+        if candidate is None and blocks:
+            col = qn["column"]
+            cands, index = (blocks_by_col[col], col_index[col]) if col in blocks_by_col else (blocks, block_index)
+            found = index.nearest_center(qn_center, max_dist=max_dist)
+            if found is not None:
+                candidate = cands[found[0]]
+                method = "nearest"
+                dist_val = found[1]
+        if candidate:
+            candidate["children"].append(qn)
+            attached += 1
+            page_report["number_mapping_trace"].append({
+                "qn_bbox": list(map(float, qn["bbox"])),
+                "mapped_block_id": candidate["_tmp_block_id"],
+                "method": method,
+                "distance": dist_val
+            })
+        else:
+            page_report["number_mapping_trace"].append({
+                "qn_bbox": list(map(float, qn["bbox"])),
+                "mapped_block_id": None,
+                "method": "orphan",
+                "distance": None
+            })
+    page_report["numbers_attached"] = attached
+    page_report["numbers_orphan"] = max(0, len(numbers) - attached)
+
+    # 6) figures attach (nearest block/passage center)
+    figures = [a for a in filtered if a["label"]=="figure"]
+    passages = [a for a in filtered if a["label"]=="passage"]
+    hosts = blocks + passages
+    host_index = GridIndex([c["bbox"] for c in hosts], cell_size)
+    f_attached = 0
+    for fig in figures:
+        found = host_index.nearest_center(_center(fig["bbox"]))
+        if found is None:
+            continue
+        host = hosts[found[0]]
+        host.setdefault("attachments", []).append(fig)
+        f_attached += 1
+    page_report["figures_attached"] = f_attached
+
+    # 7) text_content from the PDF text layer (pages without text keep "")
+    if page_data.get("text_lines"):
+        attach_text(filtered, page_data["text_lines"])
+
+    # sort + save overlay
+    filtered_sorted = sorted(filtered, key=lambda x: (x["column"], x["bbox"][1], x["bbox"][0]))
+    page_report["after_filter_count"] = len(filtered_sorted)
+
+    if debug_root is not None:
+        overlay_base = os.path.join(debug_root, f"page_{page_index:03d}_filtered")
+        _draw_boxes(image_path, filtered_sorted, overlay_base, config.image_policy("overlay"), title=f"page {page_index}")
+    return filtered_sorted, page_report
+
+
+def _process_pages(pages: List[Dict[str, Any]], config: Config,
+                   debug_root: Optional[str]) -> List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    페이지별 process_page 결과를 페이지 순서대로 반환. 페이지가 충분히 많으면 공유 CPU 풀(src/cpu_pool.py)에서
+    이 요청당 최대 ANNOTATION_WORKERS 페이지씩 병렬로 돌립니다.
+    """
+    workers = min(int(getattr(config, "ANNOTATION_WORKERS", 1)), len(pages))
+    if workers <= 1 or len(pages) < getattr(config, "ANNOTATION_PARALLEL_MIN_PAGES", 4):
+        return [process_page(i, page, config, debug_root) for i, page in enumerate(pages)]
+
+    pool = get_cpu_pool(getattr(config, "CPU_POOL_WORKERS", workers))
+    # run_tasks는 페이지 순서대로 결과를 돌려주므로 report 조각도 페이지 순서 그대로 합쳐집니다.
+    return run_tasks(pool, process_page, [(i, page, config, debug_root) for i, page in enumerate(pages)], workers)
+
+def group_logical_units(annotations: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    페이지 순서로 이어 붙인 정렬된 어노테이션을 논리적 단위(어노테이션 묶음)로 나눕니다.
+    header는 항상 새 단위, passage는 문항 뒤에서 새 단위, question_block은 passage/문항 뒤가 아니면 새 단위.
+    figure/question_number/footer는 단위 구성에서 빠집니다 (figure는 attachments로 따라감).
+    """
+    units: List[List[Dict[str, Any]]] = []
+    current_unit: List[Dict[str, Any]] = []
+    for anno in annotations:
+        label = anno["label"]
+        if label in ("figure", "question_number", "footer"):
+            continue
+
+        start_new = False
+        if label == "header":
+            start_new = True
+        elif label == "passage":
+            if not current_unit or (current_unit and current_unit[-1]['label'] == "question_block"):
+                start_new = True
+        elif label == "question_block":
+            if not current_unit or (current_unit and current_unit[-1]['label'] not in ["passage", "question_block"]):
+                start_new = True
 
-def process_annotations_from_json(json_file_path: str, base_output_dir: str, config: Config) -> List[LogicalUnit]:
+        if start_new and current_unit:
+            units.append(current_unit)
+            current_unit = []
+        current_unit.append(anno)
+
+    if current_unit:
+        units.append(current_unit)
+    return units
+
+def process_annotations_from_json(json_file_path: str, base_output_dir: str, config: Config,
+                                  exam_id: Optional[str] = None,
+                                  skipped_pages: Optional[List[Dict[str, Any]]] = None) -> List[LogicalUnit]:
     """
     디버그 산출물 + 의사결정 근거를 JSON으로 남깁니다.
+    skipped_pages(검출 전에 걸러낸 페이지와 사유)는 리포트에 그대로 기록됩니다.
+    crop store가 켜져 있으면 잘라낸 이미지는 base_output_dir 대신 store에 한 번만 저장되고,
+    각 컴포넌트에 crop_id가 붙습니다. exam_id를 넘기면 출처와 논리 단위도 카탈로그에 기록합니다.
     """
     with open(json_file_path, 'r', encoding='utf-8') as f:
         pages = json.load(f)
@@ -135,240 +421,81 @@ def process_annotations_from_json(json_file_path: str, base_output_dir: str, con
 
     global_report = {
         "pages": [],
+        "skipped_pages": list(skipped_pages or []),
         "totals": {"input_boxes": 0, "after_filter": 0, "question_numbers_attached": 0, "question_numbers_orphan": 0,
-                   "figures_attached": 0, "logical_units": 0},
-        "paths": {"debug_dir": os.path.abspath(debug_root), "cropped_dir": os.path.abspath(base_output_dir)}
+                   "figures_attached": 0, "logical_units": 0,
+                   "detection_cache_hits": 0, "detection_cache_misses": 0, "detection_cache_hit_rate": None,
+                   "text_layer_pages": 0, "pages_skipped": 0, "skip_reasons": {}},
+        "paths": {"debug_dir": os.path.abspath(debug_root), "cropped_dir": os.path.abspath(base_output_dir),
+                  "crop_store": os.path.abspath(config.CROP_STORE_DIR) if config.CROP_STORE_ENABLED else None,
+                  "exam_id": exam_id}
     }
 
     processed_pages: List[List[Dict[str, Any]]] = []
+    with span("process_pages"):
+        for filtered_sorted, page_report in _process_pages(pages, config, debug_root):
+            processed_pages.append(filtered_sorted)
+            global_report["pages"].append(page_report)
 
-    for page_index, page_data in enumerate(pages):
-        image_path = page_data["image_path"]
-        try:
-            with Image.open(image_path) as img:
-                img_w, img_h = img.size
-        except Exception:
-            img_w = 2000; img_h = 3000
-
-        page_report = {
-            "page_index": page_index,
-            "image_path": image_path,
-            "input_count": len(page_data["annotations"]),
-            "after_filter_count": 0,
-            "kmeans_used": False,
-            "column_threshold": None,
-            "merged_qb_count": 0,
-            "numbers_attached": 0,
-            "numbers_orphan": 0,
-            "figures_attached": 0,
-            "label_counts": {},
-            "column_assignment": [],
-            "number_mapping_trace": [],
-            "merge_trace": []
-        }
-
-        # 1) filter
-        raw = []
-        for a in page_data["annotations"]:
-            bbox = tuple(map(float, a["bbox"]))
-            w = max(0.0, bbox[2]-bbox[0]); h = max(0.0, bbox[3]-bbox[1])
-            area_ratio = (w*h) / max(1.0, img_w*img_h)
-            conf = float(a.get("confidence", 0.5))
-            label = a["label"]
-            min_conf = {"question_number":0.40, "figure":0.50}.get(label, 0.35)
-            if conf < min_conf: 
-                continue
-            if area_ratio < 0.002:
-                continue
-            if label == "question_number":
-                ar = (max(w,h)/max(1.0, min(w,h)))
-                if ar > 5.0:
-                    continue
-            a = dict(a)
-            a.update({"bbox": bbox, "page_index": page_index, "original_image_path": image_path})
-            raw.append(a)
-
-        # 2) NMS per class
-        by_cls = defaultdict(list)
-        for a in raw:
-            by_cls[a["label"]].append(a)
-        filtered = []
-        for lbl, arr in by_cls.items():
-            keep = _nms(arr, iou_thr=0.5)
-            filtered.extend(keep)
-            page_report["label_counts"][lbl] = len(keep)
-
-        # 3) merge split qbs with trace
-        qbs = [a for a in filtered if a["label"]=="question_block"]
-        others = [a for a in filtered if a["label"]!="question_block"]
-        before = len(qbs)
-        qbs = sorted(qbs, key=lambda x: (x["bbox"][1], x["bbox"][0]))
-        qbs = _merge_adjacent_blocks(qbs, x_overlap_ratio=0.6, max_vgap_px=int(img_h*0.03), merge_trace=page_report["merge_trace"])
-        page_report["merged_qb_count"] = before - len(qbs)
-        filtered = qbs + others
-
-        # 4) columns
-        x_centers = [ (a["bbox"][0]+a["bbox"][2])/2.0 for a in filtered if a["label"]!="footer" ]
-        res = _kmeans_two_columns(x_centers) if x_centers else None
-        if res:
-            threshold_x, _, used = res
-            page_report["kmeans_used"] = used
-            page_report["column_threshold"] = threshold_x
+    # crop + logical units
+    page_arrays: "OrderedDict[str, Any]" = OrderedDict()  # 최근 페이지 2장만 디코딩 상태로 유지
+    label_counters: Dict[str, int] = {}
+    crop_policy = config.image_policy("crop")
+    store = get_crop_store(config)
+
+    def _page_array(image_path: str):
+        if image_path in page_arrays:
+            page_arrays.move_to_end(image_path)
         else:
-            threshold_x = img_w/2.0
-            page_report["kmeans_used"] = False
-            page_report["column_threshold"] = threshold_x
-
-        for idx, a in enumerate(filtered):
-            xc = (a["bbox"][0]+a["bbox"][2])/2.0
-            a["column"] = 0 if xc < threshold_x else 1
-            page_report["column_assignment"].append({"idx": idx, "label": a["label"], "xc": xc, "column": a["column"]})
-
-        # 5) number→block with trace
-        blocks = [a for a in filtered if a["label"]=="question_block"]
-        numbers = [a for a in filtered if a["label"]=="question_number"]
-        for i, b in enumerate(blocks):
-            b["children"] = []
-            b["attachments"] = []
-            b["_tmp_block_id"] = i
-        attached = 0
-        for qn in numbers:
-            qn_center = _center(qn["bbox"])
-            method = "none"
-            candidate = None
-            for b in blocks:
-                if _point_in_bbox(qn_center, b["bbox"]):
-                    candidate = b; method = "containment"; break
-            dist_val = None
-            if candidate is None:
-                same_col = [b for b in blocks if b["column"]==qn["column"]]
-                cands = same_col if same_col else blocks
-                if cands:
-                    scored = [(b, _distance(_center(b["bbox"]), qn_center)) for b in cands]
-                    scored.sort(key=lambda x: x[1])
-                    if scored and scored[0][1] <= max(img_h*0.1, 120):
-                        candidate = scored[0][0]
-                        method = "nearest"
-                        dist_val = scored[0][1]
-            if candidate:
-                candidate["children"].append(qn)
-                attached += 1
-                page_report["number_mapping_trace"].append({
-                    "qn_bbox": list(map(float, qn["bbox"])),
-                    "mapped_block_id": candidate["_tmp_block_id"],
-                    "method": method,
-                    "distance": dist_val
-                })
-            else:
-                page_report["number_mapping_trace"].append({
-                    "qn_bbox": list(map(float, qn["bbox"])),
-                    "mapped_block_id": None,
-                    "method": "orphan",
-                    "distance": None
-                })
-        page_report["numbers_attached"] = attached
-        page_report["numbers_orphan"] = max(0, len(numbers) - attached)
-
-        # 6) figures attach
-        figures = [a for a in filtered if a["label"]=="figure"]
-        passages = [a for a in filtered if a["label"]=="passage"]
-        f_attached = 0
-        for fig in figures:
-            fig_center = _center(fig["bbox"])
-            cands = blocks + passages
-            if not cands: 
-                continue
-            dists = [(c, _distance(_center(c["bbox"]), fig_center)) for c in cands]
-            dists.sort(key=lambda x: x[1])
-            host = dists[0][0]
-            host.setdefault("attachments", []).append(fig)
-            f_attached += 1
-        page_report["figures_attached"] = f_attached
-
-        # sort + save overlay
-        filtered_sorted = sorted(filtered, key=lambda x: (x["column"], x["bbox"][1], x["bbox"][0]))
-        processed_pages.append(filtered_sorted)
-        page_report["after_filter_count"] = len(filtered_sorted)
-        global_report["pages"].append(page_report)
-
-        overlay_path = os.path.join(debug_root, f"page_{page_index:03d}_filtered.png")
-        _draw_boxes(image_path, filtered_sorted, overlay_path, title=f"page {page_index}")
+            page_arrays[image_path] = load_page_array(image_path)
+            if len(page_arrays) > 2:
+                page_arrays.popitem(last=False)
+        return page_arrays[image_path]
 
-    # crop + logical units
-    def _crop_component(anno: Dict[str, Any], mask_children: Optional[List[Dict[str, Any]]] = None) -> str:
+    def _crop_component(anno: Dict[str, Any], mask_children: Optional[List[Dict[str, Any]]] = None) -> Component:
         label = anno['label']
         bbox = tuple(int(round(c)) for c in anno['bbox'])
         image_path = anno['original_image_path']
 
-        original_image = Image.open(image_path)
-        cropped_image = crop_and_mask_image(original_image, bbox)
-
+        rel_masks = []
         if label == "question_block" and mask_children:
-            rel_masks = []
             for child in mask_children:
                 cb = child['bbox']
-                rel = (int(round(cb[0]-bbox[0])), int(round(cb[1]-bbox[1])),
-                       int(round(cb[2]-bbox[0])), int(round(cb[3]-bbox[1])))
-                rel_masks.append(rel)
-            if rel_masks:
-                draw = ImageDraw.Draw(cropped_image)
-                for mb in rel_masks:
-                    draw.rectangle(mb, fill="white")
+                rel_masks.append((int(round(cb[0]-bbox[0])), int(round(cb[1]-bbox[1])),
+                                  int(round(cb[2]-bbox[0])), int(round(cb[3]-bbox[1]))))
+        cropped = crop_and_mask_array(_page_array(image_path), bbox, rel_masks)
+        if store is not None:
+            crop_id, path = store.put(cropped, label, crop_policy, exam_id=exam_id,
+                                      page=anno.get("page_index"), bbox=bbox)
+            return {"image_path": path, "crop_id": crop_id}
 
         label_dir = os.path.join(base_output_dir, label)
-        os.makedirs(label_dir, exist_ok=True)
+        if label not in label_counters:
+            os.makedirs(label_dir, exist_ok=True)
+            label_counters[label] = len(os.listdir(label_dir))
+        idx = label_counters[label]
+        label_counters[label] += 1
         base = os.path.splitext(os.path.basename(image_path))[0]
-        idx = len(os.listdir(label_dir))
-        out_path = os.path.join(label_dir, f"{base}_{label}_{idx}.png")
-        cropped_image.save(out_path)
-        return out_path
+        return {"image_path": save_array_image(cropped, os.path.join(label_dir, f"{base}_{label}_{idx}"), crop_policy)}
 
     logical_units: List[LogicalUnit] = []
-    current_unit: LogicalUnit = []
-    all_annos = [a for page in processed_pages for a in page]
-
-    for anno in all_annos:
-        label = anno["label"]
-        if label in ("figure", "question_number", "footer"):
-            continue
-
-        start_new = False
-        if label == "header":
-            start_new = True
-        elif label == "passage":
-            if not current_unit or (current_unit and current_unit[-1]['label'] == "question_block"):
-                start_new = True
-        elif label == "question_block":
-            if not current_unit or (current_unit and current_unit[-1]['label'] not in ["passage", "question_block"]):
-                start_new = True
-
-        if start_new and current_unit:
-            logical_units.append(current_unit)
-            current_unit = []
-
-        if label == "question_block":
-            img_path = _crop_component(anno, mask_children=anno.get("children", []))
-            comp: Component = {"label": "question_block", "image_path": img_path, "text_content": ""}
-            atts = []
-            for fig in anno.get("attachments", []):
-                att_path = _crop_component(fig, mask_children=None)
-                atts.append({"label": "figure", "image_path": att_path})
-            if atts:
-                comp["attachments"] = atts
-            current_unit.append(comp)
-        else:
-            img_path = _crop_component(anno)
-            comp = {"label": label, "image_path": img_path, "text_content": ""}
-            atts = []
-            for fig in anno.get("attachments", []):
-                att_path = _crop_component(fig, mask_children=None)
-                atts.append({"label": "figure", "image_path": att_path})
+    for anno_unit in group_logical_units([a for page in processed_pages for a in page]):
+        unit: LogicalUnit = []
+        for anno in anno_unit:
+            label = anno["label"]
+            if label == "question_block":
+                comp: Component = {"label": "question_block", **_crop_component(anno, mask_children=anno.get("children", [])),
+                                   "text_content": anno.get("text_content", "")}
+            else:
+                comp = {"label": label, **_crop_component(anno), "text_content": anno.get("text_content", "")}
+            atts = [{"label": "figure", **_crop_component(fig, mask_children=None)} for fig in anno.get("attachments", [])]
             if atts:
                 comp["attachments"] = atts
-            current_unit.append(comp)
+            unit.append(comp)
+        logical_units.append(unit)
 
-    if current_unit:
-        logical_units.append(current_unit)
+    if store is not None and exam_id is not None:
+        store.save_units(exam_id, logical_units)
 
     # finalize report
     global_report["totals"]["input_boxes"] = sum(p["input_count"] for p in global_report["pages"])
@@ -377,6 +504,16 @@ def process_annotations_from_json(json_file_path: str, base_output_dir: str, con
     global_report["totals"]["question_numbers_orphan"] = sum(p["numbers_orphan"] for p in global_report["pages"])
     global_report["totals"]["figures_attached"] = sum(p["figures_attached"] for p in global_report["pages"])
     global_report["totals"]["logical_units"] = len(logical_units)
+    hits = sum(1 for p in global_report["pages"] if p["detection_cache"] == "hit")
+    misses = sum(1 for p in global_report["pages"] if p["detection_cache"] == "miss")
+    global_report["totals"]["detection_cache_hits"] = hits
+    global_report["totals"]["detection_cache_misses"] = misses
+    global_report["totals"]["detection_cache_hit_rate"] = hits / (hits + misses) if (hits + misses) else None
+    global_report["totals"]["text_layer_pages"] = sum(1 for p in global_report["pages"] if p["text_layer"])
+    global_report["totals"]["pages_skipped"] = len(global_report["skipped_pages"])
+    for p in global_report["skipped_pages"]:
+        reasons = global_report["totals"]["skip_reasons"]
+        reasons[p["reason"]] = reasons.get(p["reason"], 0) + 1
 
     with open(os.path.join(debug_root, "annotation_debug_report.json"), "w", encoding="utf-8") as f:
         json.dump(global_report, f, ensure_ascii=False, indent=2)
@@ -385,9 +522,11 @@ def process_annotations_from_json(json_file_path: str, base_output_dir: str, con
     for u in logical_units:
         light_u = []
         for c in u:
-            item = {"label": c["label"], "image_path": c["image_path"]}
+            item = {"label": c["label"], "image_path": c["image_path"], "crop_id": c.get("crop_id"),
+                    "text_content": c.get("text_content", "")}
             if "attachments" in c:
-                item["attachments"] = [{"label": a["label"], "image_path": a["image_path"]} for a in c["attachments"]]
+                item["attachments"] = [{"label": a["label"], "image_path": a["image_path"], "crop_id": a.get("crop_id")}
+                                       for a in c["attachments"]]
             light_u.append(item)
         light_units.append(light_u)
     with open(os.path.join(debug_root, "logical_units.json"), "w", encoding="utf-8") as f:
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Resumable Stage Checkpoints
+
+`run_pipeline` runs its stages (render → detect → group → shuffle →
+recombine) through a `StageCheckpoints` executor. After a stage completes it
+writes `<workspace>/checkpoints/<n>_<stage>.json` with
+
+-   fingerprint: hash of the previous stage's fingerprint and this stage's inputs
+    (source PDF digest, the settings the stage reads, the seed, ...)
+-   outputs:     the files the stage produced and their sizes
+-   result:      the small values later stages need (skipped pages, seed, ...)
+
+Running the same request id again skips every leading stage whose checkpoint
+has the same fingerprint and whose outputs are still on disk, so a retry
+after a recombination failure, or a run where only the seed or the
+recombine settings changed, starts at the first stage that actually has to
+run. Once a stage runs, all later stages run as well.
+"""
+
+import os
+import json
+import time
+import hashlib
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+StageResult = Tuple[Dict[str, Any], List[str]]  # (result values, output files)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def config_params(config, names: Iterable[str]) -> Dict[str, Any]:
+    """Settings a stage depends on; a name ending in "*" selects every setting with that prefix."""
+    attrs = sorted(a for a in dir(config) if a.isupper())
+    out: Dict[str, Any] = {}
+    for name in names:
+        if name.endswith("*"):
+            out.update({a: getattr(config, a) for a in attrs if a.startswith(name[:-1])})
+        else:
+            out[name] = getattr(config, name)
+    return out
+
+
+class StageCheckpoints:
+    """Runs pipeline stages in order and skips the ones whose checkpoint is still valid."""
+
+    def __init__(self, workspace_dir: str, enabled: bool = True,
+                 on_resume: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.dir = os.path.join(workspace_dir, "checkpoints")
+        self.enabled = enabled
+        self.on_resume = on_resume
+        self.reused: List[str] = []
+        self._fingerprint = ""
+        self._index = 0
+        self._rerun = not enabled  # 한 단계를 다시 돌리면 이후 단계도 모두 다시 실행
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, f"{self._index}_{name}.json")
+
+    def _load_valid(self, path: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get("fingerprint") != fingerprint:
+            return None
+        for output, size in checkpoint["outputs"].items():
+            if not os.path.isfile(output) or os.path.getsize(output) != size:
+                print(f"[checkpoint] {checkpoint['stage']}: 산출물 없음/변경됨 ({output}), 다시 실행")
+                return None
+        return checkpoint
+
+    def run(self, name: str, params: Dict[str, Any], fn: Callable[[], StageResult]) -> Dict[str, Any]:
+        """
+        fn() -> (result, outputs). result는 JSON으로 저장 가능한 작은 dict여야 하며,
+        체크포인트가 유효하면 fn을 호출하지 않고 저장된 result를 돌려줍니다.
+        """
+        payload = json.dumps({"previous": self._fingerprint, "stage": name, "params": params},
+                             sort_keys=True, ensure_ascii=False, default=_jsonable)
+        fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+        path = self._path(name)
+        self._index += 1
+        self._fingerprint = fingerprint
+
+        if not self._rerun:
+            checkpoint = self._load_valid(path, fingerprint)
+            if checkpoint is not None:
+                print(f"[checkpoint] {name}: 입력이 같아 건너뜀 ({checkpoint['elapsed']:.2f}s 절약)")
+                self.reused.append(name)
+                if self.on_resume:
+                    self.on_resume(name, checkpoint)
+                return checkpoint["result"]
+        self._rerun = True
+
+        if not self.enabled:
+            return fn()[0]
+        if os.path.exists(path):
+            os.remove(path)  # 실행 도중 실패하면 이전 체크포인트가 남지 않도록
+        start = time.perf_counter()
+        result, outputs = fn()
+        checkpoint = {
+            "stage": name,
+            "fingerprint": fingerprint,
+            "completed_at": time.time(),
+            "elapsed": time.perf_counter() - start,
+            "outputs": {os.path.abspath(p): os.path.getsize(p) for p in outputs},
+            "result": result,
+        }
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False, default=_jsonable)
+        os.replace(tmp_path, path)
+        return result
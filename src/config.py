@@ -1,4 +1,34 @@
 import os
+import functools
+from dataclasses import dataclass, fields, replace
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+def request_paths(data_dir: str, request_id: Optional[str] = None) -> Dict[str, str]:
+    """요청별(또는 기본) 처리 산출물 경로를 계산합니다."""
+    processed_dir = os.path.join(data_dir, 'processed', request_id) if request_id else os.path.join(data_dir, 'processed')
+    return {
+        "PROCESSED_DATA_DIR": processed_dir,
+        "IMAGE_DIR": os.path.join(processed_dir, 'images'),
+        "SAMPLE_ANNOTATIONS_PATH": os.path.join(processed_dir, 'sample_annotations.json'),
+        "CROPPED_COMPONENTS_DIR": os.path.join(processed_dir, 'cropped_components'),
+        "INFERENCE_RESULTS_DIR": os.path.join(processed_dir, 'inference_results'),
+        "RECOMBINED_PDF_OUTPUT_PATH": os.path.join(processed_dir, 'recombined_output.pdf'),
+    }
+
+
+def store_paths(data_dir: str) -> Dict[str, str]:
+    """DATA_DIR 아래에 두는 공유 저장소(캐시, 카탈로그, 색인) 경로를 계산합니다."""
+    return {
+        "DETECTION_CACHE_DIR": os.path.join(data_dir, 'cache', 'detections'),
+        "CROP_STORE_DIR": os.path.join(data_dir, 'crop_store'),
+        "CATALOG_DB_PATH": os.path.join(data_dir, 'catalog.sqlite3'),
+        "THUMBNAIL_DIR": os.path.join(data_dir, 'thumbnails'),
+        "DETECTION_STORE_DIR": os.path.join(data_dir, 'detections'),
+        "SEARCH_INDEX_PATH": os.path.join(data_dir, 'search.sqlite3'),
+    }
+
 
 class Config:
     def __init__(self):
@@ -17,6 +47,11 @@ class Config:
         self.INFERENCE_RESULTS_DIR = os.path.join(self.PROCESSED_DATA_DIR, 'inference_results')
         self.RECOMBINED_PDF_OUTPUT_PATH = os.path.join(self.PROCESSED_DATA_DIR, 'recombined_output.pdf')
 
+        # --- Web Server Paths ---
+        self.UPLOADS_DIR = os.path.join(self.PROJECT_ROOT, 'uploads')
+        self.RESULTS_DIR = os.path.join(self.PROJECT_ROOT, 'results')
+        self.HISTORY_DIR = os.path.join(self.PROJECT_ROOT, 'history')
+
         # --- AWS S3 Configuration ---
         self.S3_BUCKET = '1to100-ai-data-jykim-250626'
         self.S3_RAW_IMAGES_PATH = 'raw-images/2_image_outputs/'
@@ -49,6 +84,13 @@ class Config:
         self.LEARNING_RATE = 5e-5
         self.NUM_EPOCHS = 5
 
+        # --- Memory-mapped training dataset (src/training_dataset.py) ---
+        # output.manifest 페이지를 한 번만 디코딩/letterbox 해서 uint8 memmap으로 저장
+        self.TRAINING_DATASET_DIR = os.path.join(self.TRAINING_DATA_DIR, 'mmap')
+        self.TRAINING_IMAGE_SIZE = 1024
+        self.TRAINING_BUILD_WORKERS = min(4, os.cpu_count() or 1)
+        self.TRAINING_LOADER_WORKERS = min(4, os.cpu_count() or 1)
+
         # --- Post-processing ---
         self.DPI = 72
         self.PDF_STANDARD_DPI = 72
@@ -68,6 +110,138 @@ class Config:
         self.GUTTER_MARGIN_MM = 10
         self.COLUMN_COUNT = 2
 
+        # --- Shuffle ---
+        # text_content에 이 키워드가 들어 있는 유닛들은 셔플 후에도 연속으로 배치
+        self.SHUFFLE_SECTION_KEYWORDS = ["화법과 작문", "문법"]
+        self.SHUFFLE_EXCLUDE_ORIGINAL = True  # 원래 순서와 같은 결과는 만들지 않음
+
+        # --- Shared CPU process pool (src/cpu_pool.py) ---
+        # 후처리/렌더링 병렬 작업이 함께 쓰는 forkserver 프로세스 수 (동시 요청 수와 무관하게 이 이하)
+        self.CPU_POOL_WORKERS = min(4, os.cpu_count() or 1)
+
+        # --- Annotation post-processing ---
+        self.ANNOTATION_WORKERS = min(4, os.cpu_count() or 1)  # 요청당 동시에 후처리할 페이지 수 (1이면 순차)
+        self.ANNOTATION_PARALLEL_MIN_PAGES = 4  # 이보다 페이지가 적으면 프로세스 풀을 띄우지 않음
+
+        # --- Recombination rendering ---
+        self.RECOMBINE_RENDER_WORKERS = min(4, os.cpu_count() or 1)  # 요청당 동시에 렌더링할 페이지 구간 수 (1이면 순차)
+        self.RECOMBINE_PAGES_PER_BATCH = 16
+        self.LAYOUT_ENGINE = "packed"  # "packed" | "greedy"
+        self.LAYOUT_REORDER_WINDOW = 3  # 셔플 제약(고정 유닛, 영역 그룹, 원래 순서 제외)을 넘어서는 앞당기기는 하지 않음
+
+        # --- Startup ---
+        # "off" | "background" | "blocking": 웹 워커 시작 시 무거운 백엔드를 미리 import/로드
+        self.WARM_UP_ON_STARTUP = "background"
+        self.JOB_HISTORY_LIMIT = 100
+
+        # --- Serving ---
+        # "thread": 웹 프로세스의 스레드 풀에서 파이프라인 실행
+        # "process": 검출기를 부모에서 한 번 로드한 뒤 fork한 파이프라인 워커 프로세스 풀에서 실행
+        self.SERVE_MODE = "thread"
+        self.SERVE_WORKERS = os.cpu_count() or 1
+        self.SERVE_MAX_IN_FLIGHT_PER_WORKER = 1  # 워커에 배정할 최대 요청 수; 실행은 워커당 한 건씩, 나머지는 워커 큐에서 대기
+        self.SERVE_MAX_QUEUED = 32  # 모든 워커가 가득 찬 뒤 대기시킬 최대 요청 수 (초과 시 503)
+        self.SERVE_START_METHOD = "fork"  # fork를 지원하지 않는 플랫폼에서는 spawn으로 대체
+
+        # --- Detection & annotation post-processing thresholds ---
+        self.DETECTION_CONF = 0.3
+        # 검출은 이 하한으로 한 번만 돌리고 원시 박스를 저장 (src/detection_store.py), DETECTION_CONF 이상 필터는 후처리에서
+        self.DETECTION_FLOOR_CONF = 0.05
+        self.DEFAULT_MIN_CONF = 0.35
+        self.MIN_CONF_BY_LABEL = {"question_number": 0.40, "figure": 0.50}
+        self.MIN_AREA_RATIO = 0.002
+        self.QUESTION_NUMBER_MAX_ASPECT = 5.0
+        self.NMS_IOU_THRESHOLD = 0.5
+        self.QB_MERGE_X_OVERLAP_RATIO = 0.6
+        self.QB_MERGE_MAX_VGAP_RATIO = 0.03
+        self.QB_MERGE_COLUMN_AWARE = True
+        self.QB_MERGE_MAX_PASSES = 1
+
+        # --- Tiled detection (src/inference.py detect_tiled) ---
+        # 고해상도 페이지를 겹치는 타일로 잘라 원본 해상도로 검출 (작은 question_number 박스 보존)
+        self.DETECTION_TILING = False
+        self.DETECTION_TILE_SIZE = 1024  # 타일 한 변(px), 모델 입력 크기로도 사용
+        self.DETECTION_TILE_OVERLAP = 0.2  # 이웃 타일 겹침 비율 (가장 큰 작은-박스보다 넓게)
+        self.DETECTION_BATCH_SIZE = 8  # 한 번에 모델에 넣는 타일 수 (여러 페이지의 타일이 섞임)
+        self.DETECTION_TILE_NMS_IOU = 0.5
+        self.DETECTION_TILE_EDGE_MARGIN = 2  # 내부 타일 경계에 이만큼 붙은 박스는 잘린 것으로 보고 버림
+        self.DETECTION_TILE_FULL_PAGE_PASS = True  # 큰 박스(지문 등)용 페이지 전체 패스 추가
+
+        # --- PDF text layer (src/pdf_text_layer.py) ---
+        # 텍스트가 있는 페이지는 문항 번호/[1~3] 안내문/꼬리말을 YOLO 대신 PDF 텍스트에서 바로 읽음
+        self.TEXT_LAYER_ENABLED = True
+        self.TEXT_LAYER_MIN_CHARS = 20  # 이보다 글자가 적은 페이지(스캔본)는 YOLO 결과만 사용
+        self.TEXT_LAYER_MAX_QUESTION_NUMBER = 45
+        self.TEXT_LAYER_FOOTER_BAND = 0.06  # 페이지 아래쪽 이 비율 안의 줄은 꼬리말
+
+        # --- Pre-detection page filter (src/page_filter.py) ---
+        # 표지/빈 페이지/메모/답안지/중복 페이지는 렌더링과 검출을 건너뜀 (사유는 debug 리포트에 기록)
+        self.PAGE_FILTER_ENABLED = True
+        self.PAGE_FILTER_THUMB_WIDTH = 96  # 잉크 비율/해시 계산용 흑백 썸네일 너비(px)
+        self.PAGE_BLANK_MAX_INK_RATIO = 0.002  # 썸네일에서 어두운 픽셀 비율이 이 이하면 빈 페이지
+        self.PAGE_MEMO_MAX_CHARS = 30  # 문항 번호 없이 이 이하 글자만 있으면 메모/빈 페이지
+        self.PAGE_COVER_KEYWORDS = ["수험 번호", "문제지 표지", "표지를 넘기지"]
+        self.PAGE_ANSWER_SHEET_KEYWORDS = ["답안지", "OMR", "답안 카드"]
+        self.PAGE_DUPLICATE_MAX_HAMMING = 6  # 256비트 dHash 거리
+        self.PAGE_DUPLICATE_MAX_MEAN_DIFF = 1.5  # 후보 썸네일의 8x8 칸별 평균 밝기 차 최댓값 (0-255)
+        self.PAGE_DUPLICATE_THUMB_WIDTH = 384  # 텍스트 레이어가 없는 스캔 페이지의 중복 확인용 썸네일 너비(px)
+
+        # --- Page-level detection cache ---
+        self.DETECTION_CACHE_ENABLED = True
+        self.DETECTION_CACHE_DIR = os.path.join(self.DATA_DIR, 'cache', 'detections')
+        self.DETECTION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+        self.DETECTION_CACHE_MAX_ENTRIES = 200_000
+
+        # --- Content-addressed crop store (src/crop_store.py) ---
+        self.CROP_STORE_ENABLED = True
+        self.CROP_STORE_DIR = os.path.join(self.DATA_DIR, 'crop_store')
+
+        # --- Resumable stage checkpoints (src/checkpoints.py) ---
+        # 같은 request_id로 다시 실행하면 입력이 바뀌지 않은 앞 단계를 건너뜀
+        self.PIPELINE_CHECKPOINTS = True
+        self.PIPELINE_RETRIES = 1  # 실패한 요청을 같은 작업 공간에서 자동으로 다시 실행하는 횟수
+
+        # --- Upload/result catalog for the web UI (src/file_catalog.py) ---
+        self.CATALOG_DB_PATH = os.path.join(self.DATA_DIR, 'catalog.sqlite3')
+        self.THUMBNAIL_DIR = os.path.join(self.DATA_DIR, 'thumbnails')
+        self.THUMBNAIL_WIDTH = 120
+        self.CATALOG_PAGE_SIZE = 25
+
+        # --- On-demand sampling profiler (src/profiling.py): ?profile=1 / X-Profile: 1 ---
+        self.PROFILING_ENABLED = True
+        self.PROFILE_SAMPLE_INTERVAL_MS = 5.0
+
+        # --- Raw detection store for threshold re-tuning (src/detection_store.py) ---
+        self.DETECTION_STORE_ENABLED = True
+        self.DETECTION_STORE_DIR = os.path.join(self.DATA_DIR, 'detections')
+
+        # --- Full-text passage search (src/search_index.py): SQLite FTS5 over character bigrams ---
+        self.SEARCH_INDEX_ENABLED = True
+        self.SEARCH_INDEX_PATH = os.path.join(self.DATA_DIR, 'search.sqlite3')
+        self.SEARCH_INDEX_LABELS = ['passage', 'question_block']
+        self.SEARCH_RESULT_LIMIT = 20
+
+        # --- Image encoding policy per artifact class (see src/image_io.py) ---
+        # format: "png" | "jpeg" | "ppm"(crop only); compress_level: PNG zlib 0-9;
+        # quality: JPEG 1-95; optimize: extra encoder pass (slow, smaller files)
+        self.IMAGE_IO_POLICY = {
+            # rendered pages: read by the detector and cropped, so kept lossless
+            "page": {"format": "png", "compress_level": 1, "optimize": False},
+            # component crops embedded into the recombined PDF
+            "crop": {"format": "png", "compress_level": 1, "optimize": False},
+            # debug overlays (_detected, _filtered, _placement)
+            "overlay": {"format": "jpeg", "quality": 80, "optimize": False},
+        }
+
+        # --- Evaluation ---
+        self.GROUND_TRUTH_MANIFEST_PATH = os.path.join(self.PROJECT_ROOT, 'output.manifest')
+        self.EVALUATION_DIR = os.path.join(self.DATA_DIR, 'evaluation')
+        self.EVAL_IOU_THRESHOLDS = [0.5 + 0.05 * i for i in range(10)]
+
+    def image_policy(self, artifact: str) -> Dict[str, Any]:
+        """'page' | 'crop' | 'overlay' 산출물의 인코딩 설정."""
+        return dict(self.IMAGE_IO_POLICY[artifact])
+
     def mm_to_pt(self, mm):
         return mm * 2.83465
 
@@ -92,9 +266,200 @@ class Config:
         return self.mm_to_pt(self.GUTTER_MARGIN_MM)
 
     def set_request_id(self, request_id: str):
-        self.PROCESSED_DATA_DIR = os.path.join(self.DATA_DIR, 'processed', request_id)
-        self.IMAGE_DIR = os.path.join(self.PROCESSED_DATA_DIR, 'images')
-        self.SAMPLE_ANNOTATIONS_PATH = os.path.join(self.PROCESSED_DATA_DIR, 'sample_annotations.json')
-        self.CROPPED_COMPONENTS_DIR = os.path.join(self.PROCESSED_DATA_DIR, 'cropped_components')
-        self.INFERENCE_RESULTS_DIR = os.path.join(self.PROCESSED_DATA_DIR, 'inference_results')
-        self.RECOMBINED_PDF_OUTPUT_PATH = os.path.join(self.PROCESSED_DATA_DIR, 'recombined_output.pdf')
\ No newline at end of file
+        for name, value in request_paths(self.DATA_DIR, request_id).items():
+            setattr(self, name, value)
+
+    def recombine_settings(self) -> Dict[str, Any]:
+        """recombine_pdf에 넘기는 재조합 설정 dict."""
+        return {
+            "page_size": (self.DEFAULT_PAGE_WIDTH_PT, self.DEFAULT_PAGE_HEIGHT_PT),
+            "margin": self.top_margin_pt,
+            "spacing_between_components": self.gutter_margin_pt,
+            "header_y_position": self.header_height_pt,
+            "header_line_width": 0.5,
+            "two_column_layout": True,
+            "column_line_width": 0.5,
+            "image_scale_factor": 1.0,
+            "start_question_number": 1,
+            "question_number_font_size": 12,
+            "question_number_offset_x": 10,
+            "question_number_offset_y": 12,
+            "render_workers": self.RECOMBINE_RENDER_WORKERS,
+            "cpu_pool_workers": self.CPU_POOL_WORKERS,
+            "pages_per_render_batch": self.RECOMBINE_PAGES_PER_BATCH,
+            "layout_engine": self.LAYOUT_ENGINE,
+            "layout_reorder_window": self.LAYOUT_REORDER_WINDOW,
+            "overlay_image_policy": self.image_policy("overlay")
+        }
+
+
+@dataclass(frozen=True)
+class PipelineContext:
+    """
+    Config에서 한 번 계산해 두는 불변 파이프라인 설정입니다.
+    속성 이름이 Config와 같으므로 Config를 받는 함수에 그대로 넘길 수 있고,
+    요청별 경로는 for_request()로 복사본을 만들어 스레드 간에 안전하게 공유합니다.
+    """
+    # paths
+    PROJECT_ROOT: str
+    DATA_DIR: str
+    RAW_DATA_DIR: str
+    UPLOADS_DIR: str
+    RESULTS_DIR: str
+    HISTORY_DIR: str
+    PROCESSED_DATA_DIR: str
+    IMAGE_DIR: str
+    SAMPLE_ANNOTATIONS_PATH: str
+    CROPPED_COMPONENTS_DIR: str
+    INFERENCE_RESULTS_DIR: str
+    RECOMBINED_PDF_OUTPUT_PATH: str
+    YOLO_MODEL_PATH: str
+    # class maps
+    CLASSES: Tuple[str, ...]
+    CLASS_NAMES: Mapping[int, str]
+    ID2LABEL: Mapping[int, str]
+    LABEL2ID: Mapping[str, int]
+    # rendering / detection / post-processing
+    DPI: int
+    PDF_STANDARD_DPI: int
+    SCALE_FACTOR: float
+    DETECTION_CONF: float
+    DETECTION_FLOOR_CONF: float
+    DEFAULT_MIN_CONF: float
+    MIN_CONF_BY_LABEL: Mapping[str, float]
+    MIN_AREA_RATIO: float
+    QUESTION_NUMBER_MAX_ASPECT: float
+    NMS_IOU_THRESHOLD: float
+    QB_MERGE_X_OVERLAP_RATIO: float
+    QB_MERGE_MAX_VGAP_RATIO: float
+    QB_MERGE_COLUMN_AWARE: bool
+    QB_MERGE_MAX_PASSES: int
+    TEXT_LAYER_ENABLED: bool
+    TEXT_LAYER_MIN_CHARS: int
+    TEXT_LAYER_MAX_QUESTION_NUMBER: int
+    TEXT_LAYER_FOOTER_BAND: float
+    DETECTION_TILING: bool
+    DETECTION_TILE_SIZE: int
+    DETECTION_TILE_OVERLAP: float
+    DETECTION_BATCH_SIZE: int
+    DETECTION_TILE_NMS_IOU: float
+    DETECTION_TILE_EDGE_MARGIN: float
+    DETECTION_TILE_FULL_PAGE_PASS: bool
+    PAGE_FILTER_ENABLED: bool
+    PAGE_FILTER_THUMB_WIDTH: int
+    PAGE_BLANK_MAX_INK_RATIO: float
+    PAGE_MEMO_MAX_CHARS: int
+    PAGE_COVER_KEYWORDS: Tuple[str, ...]
+    PAGE_ANSWER_SHEET_KEYWORDS: Tuple[str, ...]
+    PAGE_DUPLICATE_MAX_HAMMING: int
+    PAGE_DUPLICATE_MAX_MEAN_DIFF: float
+    PAGE_DUPLICATE_THUMB_WIDTH: int
+    DETECTION_CACHE_ENABLED: bool
+    DETECTION_CACHE_DIR: str
+    DETECTION_CACHE_MAX_BYTES: int
+    DETECTION_CACHE_MAX_ENTRIES: int
+    IMAGE_IO_POLICY: Mapping[str, Mapping[str, Any]]
+    CROP_STORE_ENABLED: bool
+    CROP_STORE_DIR: str
+    DETECTION_STORE_ENABLED: bool
+    DETECTION_STORE_DIR: str
+    SEARCH_INDEX_ENABLED: bool
+    SEARCH_INDEX_PATH: str
+    SEARCH_INDEX_LABELS: Tuple[str, ...]
+    SEARCH_RESULT_LIMIT: int
+    PIPELINE_CHECKPOINTS: bool
+    PIPELINE_RETRIES: int
+    CATALOG_DB_PATH: str
+    THUMBNAIL_DIR: str
+    THUMBNAIL_WIDTH: int
+    CATALOG_PAGE_SIZE: int
+    PROFILING_ENABLED: bool
+    PROFILE_SAMPLE_INTERVAL_MS: float
+    # page geometry in points
+    PAGE_WIDTH_PT: float
+    PAGE_HEIGHT_PT: float
+    HEADER_HEIGHT_PT: float
+    TOP_MARGIN_PT: float
+    GUTTER_MARGIN_PT: float
+    SHUFFLE_SECTION_KEYWORDS: Tuple[str, ...]
+    SHUFFLE_EXCLUDE_ORIGINAL: bool
+    RECOMBINE_CFG: Mapping[str, Any]
+    WARM_UP_ON_STARTUP: str
+    JOB_HISTORY_LIMIT: int
+    SERVE_MODE: str
+    SERVE_WORKERS: int
+    SERVE_MAX_IN_FLIGHT_PER_WORKER: int
+    SERVE_MAX_QUEUED: int
+    SERVE_START_METHOD: str
+    CPU_POOL_WORKERS: int
+    ANNOTATION_WORKERS: int
+    ANNOTATION_PARALLEL_MIN_PAGES: int
+    REQUEST_ID: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, config: Config) -> "PipelineContext":
+        values = {f.name: getattr(config, f.name) for f in fields(cls) if hasattr(config, f.name)}
+        values.update({
+            "CLASSES": tuple(config.CLASSES),
+            "CLASS_NAMES": MappingProxyType(dict(config.CLASS_NAMES)),
+            "ID2LABEL": MappingProxyType(dict(config.ID2LABEL)),
+            "LABEL2ID": MappingProxyType(dict(config.LABEL2ID)),
+            "MIN_CONF_BY_LABEL": MappingProxyType(dict(config.MIN_CONF_BY_LABEL)),
+            "SHUFFLE_SECTION_KEYWORDS": tuple(config.SHUFFLE_SECTION_KEYWORDS),
+            "PAGE_COVER_KEYWORDS": tuple(config.PAGE_COVER_KEYWORDS),
+            "PAGE_ANSWER_SHEET_KEYWORDS": tuple(config.PAGE_ANSWER_SHEET_KEYWORDS),
+            "PAGE_WIDTH_PT": float(config.DEFAULT_PAGE_WIDTH_PT),
+            "PAGE_HEIGHT_PT": float(config.DEFAULT_PAGE_HEIGHT_PT),
+            "HEADER_HEIGHT_PT": config.header_height_pt,
+            "TOP_MARGIN_PT": config.top_margin_pt,
+            "GUTTER_MARGIN_PT": config.gutter_margin_pt,
+            "RECOMBINE_CFG": _freeze(config.recombine_settings()),
+            "IMAGE_IO_POLICY": MappingProxyType({k: MappingProxyType(dict(v)) for k, v in config.IMAGE_IO_POLICY.items()}),
+            "REQUEST_ID": None,
+        })
+        # 요청 작업 공간과 공유 저장소 경로는 DATA_DIR에서 다시 계산 (DATA_DIR만 바꿔도 모두 따라감)
+        values.update(request_paths(config.DATA_DIR))
+        values.update(store_paths(config.DATA_DIR))
+        return cls(**values)
+
+    def for_request(self, request_id: str) -> "PipelineContext":
+        """요청 작업 공간 경로만 바꾼 복사본을 돌려줍니다."""
+        return replace(self, REQUEST_ID=request_id, **request_paths(self.DATA_DIR, request_id))
+
+    def recombine_cfg(self) -> Dict[str, Any]:
+        """recombine_pdf용 설정의 (워커 프로세스로 넘길 수 있는) 일반 dict 복사본 (중첩 dict까지 복사)."""
+        return _thaw(self.RECOMBINE_CFG)
+
+    def image_policy(self, artifact: str) -> Dict[str, Any]:
+        """'page' | 'crop' | 'overlay' 산출물의 인코딩 설정 (일반 dict)."""
+        return dict(self.IMAGE_IO_POLICY[artifact])
+
+    def __reduce__(self):
+        """MappingProxyType은 pickle되지 않으므로 일반 dict로 풀어서 워커 프로세스에 넘깁니다."""
+        return (_rebuild_context, ({f.name: _thaw(getattr(self, f.name)) for f in fields(self)},))
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    return value
+
+
+def _rebuild_context(values: Dict[str, Any]) -> PipelineContext:
+    for name in ("CLASS_NAMES", "ID2LABEL", "LABEL2ID", "MIN_CONF_BY_LABEL"):
+        values[name] = MappingProxyType(values[name])
+    values["RECOMBINE_CFG"] = _freeze(values["RECOMBINE_CFG"])
+    values["IMAGE_IO_POLICY"] = MappingProxyType({k: MappingProxyType(v) for k, v in values["IMAGE_IO_POLICY"].items()})
+    return PipelineContext(**values)
+
+
+@functools.lru_cache(maxsize=1)
+def get_pipeline_context() -> PipelineContext:
+    """프로세스당 한 번만 만들어지는 기본 PipelineContext."""
+    return PipelineContext.from_config(Config())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Shared CPU Process Pool
+
+Per-page annotation post-processing (`annotation_processor._process_pages`)
+and recombination rendering (`pdf_recombiner._render_document`) fan out to
+worker processes. Both use one process-wide pool instead of creating a pool
+per request:
+
+-   The pool starts its processes with "forkserver" ("spawn" where that is
+    unavailable). In SERVE_MODE "thread" the pipeline runs in server threads
+    while the warm-up thread, the detector lock and SQLite connections are
+    live; a plain fork could copy a held lock into the child and deadlock it.
+-   It has `CPU_POOL_WORKERS` processes however many requests are running.
+    Concurrent requests queue their tasks on the same processes, and each
+    request keeps at most its own worker setting (`ANNOTATION_WORKERS`,
+    `render_workers`) of tasks in flight.
+-   It is created on first use, or by `start_cpu_pool` at server startup, and
+    re-created if a worker process died.
+"""
+
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, List, Optional, Sequence
+
+# 풀 자식 프로세스가 시작할 때 미리 import해 둘 모듈 (forkserver에서 한 번만 import)
+PRELOAD_MODULES = ["src.annotation_processor", "src.pdf_recombiner"]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PRELOAD_MODULES)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def get_cpu_pool(workers: int) -> ProcessPoolExecutor:
+    """The process-wide pool; `workers` sizes it when it is (re)created."""
+    global _pool
+    with _pool_lock:
+        # 워커가 비정상 종료되면 executor는 broken 상태로 남으므로 새로 만듦
+        if _pool is None or getattr(_pool, "_broken", False):
+            _pool = ProcessPoolExecutor(max_workers=max(1, int(workers)), mp_context=_mp_context())
+        return _pool
+
+
+def start_cpu_pool(workers: int):
+    """Creates the pool and starts its processes now instead of on the first parallel request."""
+    pool = get_cpu_pool(workers)
+    list(pool.map(abs, range(max(1, int(workers)))))
+
+
+def shutdown_cpu_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def run_tasks(pool: ProcessPoolExecutor, fn: Callable[..., Any], tasks: Sequence[tuple], max_in_flight: int,
+              on_done: Optional[Callable[[int, Any], None]] = None) -> List[Any]:
+    """
+    fn(*task) for every task on `pool`, with at most `max_in_flight` submitted at a time.
+    Returns the results in task order; on_done(index, result) is called as each task finishes.
+    """
+    results: List[Any] = [None] * len(tasks)
+    pending = {}
+    next_task = 0
+    while next_task < len(tasks) or pending:
+        while next_task < len(tasks) and len(pending) < max(1, max_in_flight):
+            pending[pool.submit(fn, *tasks[next_task])] = next_task
+            next_task += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                results[index] = future.result()
+            except BaseException:
+                for other in pending:  # 실패한 요청의 남은 작업이 공유 풀을 차지하지 않도록 취소
+                    other.cancel()
+                raise
+            if on_done:
+                on_done(index, results[index])
+    return results
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed Crop Store
+
+Keeps every component crop (passage, question_block, header, figure) once,
+keyed by a hash of its pixels, under `CROP_STORE_DIR/blobs/`. A SQLite
+catalog (`CROP_STORE_DIR/catalog.sqlite3`) records:
+
+-   crops:       crop_id (pixel hash), label, size, file path
+-   exams:       exam_id (hash of the source PDF), file name, page count
+-   occurrences: where a crop was found (exam, page, bbox, label)
+-   units:       the logical units of each exam, with components referring
+                 to crop_ids instead of per-request file paths
+
+Re-processing an exam or uploading overlapping material adds catalog rows
+but no new image files, and `load_units` rebuilds the logical units of any
+processed exam without running detection, e.g. to assemble a custom exam:
+
+    python -m src.crop_store --list
+    python -m src.crop_store --assemble <exam_id> [<exam_id> ...] --output custom.pdf --seed 7
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import functools
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from src.config import Config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+Component = Dict[str, Any]
+LogicalUnit = List[Component]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crops (
+    crop_id TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS exams (
+    exam_id TEXT PRIMARY KEY,
+    filename TEXT,
+    page_count INTEGER,
+    created_at REAL NOT NULL,
+    last_seen_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS occurrences (
+    crop_id TEXT NOT NULL REFERENCES crops(crop_id),
+    exam_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (crop_id, exam_id, page, x0, y0)
+);
+CREATE INDEX IF NOT EXISTS occurrences_exam ON occurrences(exam_id, page);
+CREATE TABLE IF NOT EXISTS units (
+    exam_id TEXT NOT NULL,
+    unit_index INTEGER NOT NULL,
+    unit_json TEXT NOT NULL,
+    PRIMARY KEY (exam_id, unit_index)
+);
+"""
+
+
+def file_digest(path: str) -> str:
+    """Exam identity: sha256 of the source PDF bytes (first 32 hex digits)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:32]
+
+
+def crop_digest(array: "np.ndarray") -> str:
+    """Pixel hash of a crop (independent of the encoder settings)."""
+    h = hashlib.sha256(f"{array.shape}|{array.dtype}".encode())
+    h.update(memoryview(array.tobytes()))
+    return h.hexdigest()[:32]
+
+
+class CropStore:
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir, "blobs")
+        self.catalog_path = os.path.join(root_dir, "catalog.sqlite3")
+        self._local = threading.local()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process (connections must not cross a fork)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.catalog_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # --- writes ---
+    def register_exam(self, exam_id: str, filename: str, page_count: int):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO exams (exam_id, filename, page_count, created_at, last_seen_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(exam_id) DO UPDATE SET filename=excluded.filename, page_count=excluded.page_count, "
+                "last_seen_at=excluded.last_seen_at",
+                (exam_id, filename, page_count, now, now))
+
+    def put(self, array: "np.ndarray", label: str, policy: Dict[str, Any], exam_id: Optional[str] = None,
+            page: Optional[int] = None, bbox: Optional[Sequence[float]] = None) -> Tuple[str, str]:
+        """
+        Stores a crop unless identical pixels are already stored; returns
+        (crop_id, path). The occurrence (exam, page, bbox) is recorded either way.
+        """
+        from src.image_cropper import save_array_image
+
+        crop_id = crop_digest(array)
+        conn = self._connect()
+        row = conn.execute("SELECT path FROM crops WHERE crop_id = ?", (crop_id,)).fetchone()
+        if row is not None and os.path.exists(row[0]):
+            path = row[0]
+        else:
+            final_base = os.path.join(self.blob_dir, crop_id[:2], crop_id)
+            os.makedirs(os.path.dirname(final_base), exist_ok=True)
+            tmp_path = save_array_image(array, f"{final_base}.{os.getpid()}.{threading.get_ident()}.tmp", policy)
+            path = final_base + os.path.splitext(tmp_path)[1]
+            os.replace(tmp_path, path)
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO crops (crop_id, label, width, height, path, bytes, created_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (crop_id, label, int(array.shape[1]), int(array.shape[0]), path,
+                              os.path.getsize(path), time.time()))
+        if exam_id is not None:
+            x0, y0, x1, y1 = (float(v) for v in bbox) if bbox is not None else (None,) * 4
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO occurrences (crop_id, exam_id, page, x0, y0, x1, y1, label) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (crop_id, exam_id, -1 if page is None else int(page), x0, y0, x1, y1, label))
+        return crop_id, path
+
+    def save_units(self, exam_id: str, logical_units: List[LogicalUnit]):
+        """Replaces the stored logical units of an exam (components keep label, crop_id, text_content)."""
+        def light(component: Component) -> Component:
+            item = {"label": component["label"], "crop_id": component["crop_id"],
+                    "text_content": component.get("text_content", "")}
+            if component.get("attachments"):
+                item["attachments"] = [{"label": a["label"], "crop_id": a["crop_id"]} for a in component["attachments"]]
+            return item
+
+        rows = [(exam_id, i, json.dumps([light(c) for c in unit], ensure_ascii=False))
+                for i, unit in enumerate(logical_units)]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM units WHERE exam_id = ?", (exam_id,))
+            conn.executemany("INSERT INTO units (exam_id, unit_index, unit_json) VALUES (?, ?, ?)", rows)
+
+    # --- reads ---
+    def path(self, crop_id: str) -> Optional[str]:
+        row = self._connect().execute("SELECT path FROM crops WHERE crop_id = ?", (crop_id,)).fetchone()
+        return row[0] if row else None
+
+    def load_units(self, exam_id: str) -> List[LogicalUnit]:
+        """Logical units of a processed exam with `image_path` resolved from the catalog."""
+        conn = self._connect()
+        rows = conn.execute("SELECT unit_json FROM units WHERE exam_id = ? ORDER BY unit_index", (exam_id,)).fetchall()
+        units = [json.loads(r[0]) for r in rows]
+        crop_ids = {c["crop_id"] for u in units for c in u} | \
+                   {a["crop_id"] for u in units for c in u for a in c.get("attachments", [])}
+        paths: Dict[str, str] = {}
+        ids = list(crop_ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            q = f"SELECT crop_id, path FROM crops WHERE crop_id IN ({','.join('?' * len(chunk))})"
+            paths.update(conn.execute(q, chunk).fetchall())
+        for unit in units:
+            for c in unit:
+                c["image_path"] = paths.get(c["crop_id"], "")
+                for a in c.get("attachments", []):
+                    a["image_path"] = paths.get(a["crop_id"], "")
+        return units
+
+    def exams(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT e.exam_id, e.filename, e.page_count, e.last_seen_at, COUNT(u.unit_index) "
+            "FROM exams e LEFT JOIN units u ON u.exam_id = e.exam_id GROUP BY e.exam_id ORDER BY e.last_seen_at DESC"
+        ).fetchall()
+        return [{"exam_id": r[0], "filename": r[1], "page_count": r[2], "last_seen_at": r[3], "units": r[4]}
+                for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        crops, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM crops").fetchone()
+        occurrences = conn.execute("SELECT COUNT(*) FROM occurrences").fetchone()[0]
+        return {"crops": crops, "bytes": total_bytes, "occurrences": occurrences,
+                "dedup_ratio": occurrences / crops if crops else None}
+
+
+@functools.lru_cache(maxsize=4)
+def _open_store(root_dir: str) -> CropStore:
+    return CropStore(root_dir)
+
+
+def get_crop_store(config: Config) -> Optional[CropStore]:
+    """Process-wide store for the configured directory, or None if disabled."""
+    if not config.CROP_STORE_ENABLED:
+        return None
+    return _open_store(config.CROP_STORE_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+    import uuid
+    from src.config import get_pipeline_context
+    from src.layout_organizer import shuffle_for_layout
+    from src.pdf_recombiner import recombine_pdf
+
+    parser = argparse.ArgumentParser(description="Crop store catalog / assemble exams without detection")
+    parser.add_argument("--list", action="store_true", help="처리된 시험지 목록")
+    parser.add_argument("--assemble", nargs="+", metavar="EXAM_ID", help="이 시험지들의 논리 단위로 새 PDF 조합")
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    context = get_pipeline_context()
+    store = _open_store(context.CROP_STORE_DIR)
+    if args.list or not args.assemble:
+        for exam in store.exams():
+            print(f"{exam['exam_id']}  {exam['units']:>4} units  {exam['page_count'] or 0:>3} pages  {exam['filename']}")
+        print(store.stats())
+    if args.assemble:
+        units: List[LogicalUnit] = []
+        for exam_id in args.assemble:
+            loaded = store.load_units(exam_id)
+            if not loaded:
+                raise SystemExit(f"unknown exam or no units: {exam_id}")
+            units.extend(loaded)
+        output = args.output or os.path.join(context.RESULTS_DIR, f"assembled_{uuid.uuid4().hex[:8]}.pdf")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        shuffled, layout_constraints = shuffle_for_layout(units, seed=args.seed)
+        recombine_pdf(output, shuffled, dict(context.recombine_cfg(), layout_constraints=layout_constraints))
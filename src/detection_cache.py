@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Page-level Detection Cache
+
+Stores the annotation list produced by the detector for a rendered page,
+keyed by a hash of the page pixels plus the model version and confidence
+threshold, so re-uploaded exams skip YOLO for pages already seen.
+
+Entries are small JSON files under `DETECTION_CACHE_DIR`; the store is an
+on-disk LRU (file mtime is refreshed on every hit) bounded by total bytes
+and entry count.
+"""
+
+import os
+import json
+import hashlib
+import functools
+import threading
+from typing import List, Dict, Any, Optional
+
+from src.config import Config
+
+
+@functools.lru_cache(maxsize=8)
+def model_version(model_path: str) -> str:
+    """Content hash of the weights file (computed once per path)."""
+    if not os.path.exists(model_path):
+        return "missing:" + os.path.basename(model_path)
+    h = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def page_pixel_hash(image_path: str) -> str:
+    """Hash of the decoded page pixels (independent of PNG encoder settings)."""
+    from PIL import Image
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        h = hashlib.sha256(f"{img.size[0]}x{img.size[1]}".encode())
+        h.update(img.tobytes())
+    return h.hexdigest()
+
+
+class DetectionCache:
+    def __init__(self, cache_dir: str, max_bytes: int, max_entries: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._entries = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        for path, size, _ in self._scan():
+            self._bytes += size
+            self._entries += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _scan(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    @staticmethod
+    def make_key(pixel_hash: str, model_ver: str, conf: float) -> str:
+        return hashlib.sha256(f"{pixel_hash}|{model_ver}|{conf:.4f}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                annotations = json.load(f)
+            os.utime(path)  # LRU touch
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return annotations
+
+    def put(self, key: str, annotations: List[Dict[str, Any]]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(annotations, ensure_ascii=False).encode('utf-8')
+        try:
+            old_size = os.path.getsize(path)  # 덮어쓰면 이전 파일 크기만큼 빼야 _bytes가 실제와 맞음
+            existed = True
+        except FileNotFoundError:
+            old_size, existed = 0, False
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if not existed:
+                self._entries += 1
+            self._bytes += len(data) - old_size
+            if self._bytes > self.max_bytes or self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries down to 90% of both limits (caller holds the lock)."""
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        total_bytes = sum(e[1] for e in entries)
+        count = len(entries)
+        for path, size, _ in entries:
+            if total_bytes <= 0.9 * self.max_bytes and count <= 0.9 * self.max_entries:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            count -= 1
+        self._bytes, self._entries = total_bytes, count
+
+
+@functools.lru_cache(maxsize=4)
+def _open_cache(cache_dir: str, max_bytes: int, max_entries: int) -> DetectionCache:
+    return DetectionCache(cache_dir, max_bytes, max_entries)
+
+
+def get_detection_cache(config: Config) -> Optional[DetectionCache]:
+    """Process-wide cache instance for the configured directory, or None if disabled."""
+    if not config.DETECTION_CACHE_ENABLED:
+        return None
+    return _open_cache(config.DETECTION_CACHE_DIR, config.DETECTION_CACHE_MAX_BYTES, config.DETECTION_CACHE_MAX_ENTRIES)
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Raw Detection Store
+
+`run_pipeline` detects once at `DETECTION_FLOOR_CONF` and keeps every raw
+detector box of an exam in `DETECTION_STORE_DIR/<exam_id>.npz`. Each file
+holds one (N, 6) float32 array [x0, y0, x1, y1, conf, class id], per-page
+offsets and page sizes, plus a small JSON blob with the text layer and the
+page list. All thresholds (`DETECTION_CONF`, per-class minimums, area ratio,
+NMS IoU, block merging) are applied afterwards, so they can be re-tuned
+from the store in milliseconds without running the detector again:
+
+    python -m src.detection_store --list
+    python -m src.detection_store --exam <exam_id> --set NMS_IOU_THRESHOLD=0.4 --set MIN_CONF_BY_LABEL.figure=0.3
+
+The same comparison is served by `POST /detections/{exam_id}/retune`.
+"""
+
+import os
+import json
+import time
+import difflib
+import functools
+import threading
+from dataclasses import replace
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import Config, PipelineContext
+
+TUNABLE_SETTINGS = (
+    "DETECTION_CONF", "DEFAULT_MIN_CONF", "MIN_CONF_BY_LABEL", "MIN_AREA_RATIO", "QUESTION_NUMBER_MAX_ASPECT",
+    "NMS_IOU_THRESHOLD", "QB_MERGE_X_OVERLAP_RATIO", "QB_MERGE_MAX_VGAP_RATIO", "QB_MERGE_COLUMN_AWARE",
+    "QB_MERGE_MAX_PASSES",
+)
+# 0-1 범위의 신뢰도/비율 임계값 (MIN_CONF_BY_LABEL의 값도 같은 규칙)
+FRACTION_SETTINGS = (
+    "DETECTION_CONF", "DEFAULT_MIN_CONF", "MIN_AREA_RATIO", "NMS_IOU_THRESHOLD", "QB_MERGE_X_OVERLAP_RATIO",
+    "QB_MERGE_MAX_VGAP_RATIO",
+)
+
+
+class DetectionStore:
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    def path(self, exam_id: str) -> str:
+        return os.path.join(self.root_dir, f"{exam_id}.npz")
+
+    def save(self, exam_id: str, pages: List[Dict[str, Any]], config: Config, filename: Optional[str] = None,
+             skipped_pages: Optional[List[Dict[str, Any]]] = None):
+        """
+        pages: `sample_annotations.json` records (raw YOLO `annotations`, optional `image_size`,
+        `text_layer_annotations`, `text_lines`). Replaces any earlier store of the exam.
+        """
+        import numpy as np
+
+        rows, offsets, sizes, page_meta = [], [0], [], []
+        for page in pages:
+            for a in page["annotations"]:
+                rows.append([*a["bbox"], a.get("confidence", 0.5), config.LABEL2ID.get(a["label"], -1)])
+            offsets.append(len(rows))
+            sizes.append(page.get("image_size") or (0, 0))
+            page_meta.append({k: page[k] for k in ("image_path", "text_layer", "text_layer_annotations", "text_lines")
+                              if page.get(k) is not None})
+        meta = {
+            "exam_id": exam_id,
+            "filename": filename,
+            "created_at": time.time(),
+            "floor_conf": config.DETECTION_FLOOR_CONF,
+            "class_names": {str(k): v for k, v in config.CLASS_NAMES.items()},
+            "pages": page_meta,
+            "skipped_pages": skipped_pages or [],
+        }
+        tmp_path = self.path(exam_id) + f".{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez_compressed(tmp_path,
+                            boxes=np.asarray(rows, dtype=np.float32).reshape(-1, 6),
+                            offsets=np.asarray(offsets, dtype=np.int64),
+                            sizes=np.asarray(sizes, dtype=np.int32).reshape(-1, 2),
+                            meta=np.asarray(json.dumps(meta, ensure_ascii=False)))
+        os.replace(tmp_path, self.path(exam_id))
+
+    def load(self, exam_id: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """(meta, page records) ready for `annotation_processor.process_page`. KeyError if not stored."""
+        import numpy as np
+
+        path = self.path(exam_id)
+        if not os.path.exists(path):
+            raise KeyError(exam_id)
+        with np.load(path) as data:
+            boxes, offsets, sizes = data["boxes"], data["offsets"], data["sizes"]
+            meta = json.loads(str(data["meta"]))
+        class_names = meta["class_names"]
+        pages = []
+        for i, page_meta in enumerate(meta["pages"]):
+            page = dict(page_meta)
+            page["annotations"] = [
+                {"label": class_names.get(str(int(cls)), "unknown"), "bbox": [float(x0), float(y0), float(x1), float(y1)],
+                 "confidence": float(conf), "text_content": ""}
+                for x0, y0, x1, y1, conf, cls in boxes[offsets[i]:offsets[i + 1]]
+            ]
+            if sizes[i][0] > 0:
+                page["image_size"] = [int(sizes[i][0]), int(sizes[i][1])]
+            pages.append(page)
+        return meta, pages
+
+    def exams(self) -> List[Dict[str, Any]]:
+        import numpy as np
+        out = []
+        for name in sorted(os.listdir(self.root_dir)):
+            if not name.endswith(".npz") or ".tmp." in name:
+                continue
+            path = os.path.join(self.root_dir, name)
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                boxes = int(data["boxes"].shape[0])
+            out.append({"exam_id": meta["exam_id"], "filename": meta.get("filename"), "pages": len(meta["pages"]),
+                        "boxes": boxes, "floor_conf": meta["floor_conf"], "bytes": os.path.getsize(path),
+                        "created_at": meta["created_at"]})
+        return sorted(out, key=lambda e: e["created_at"], reverse=True)
+
+
+@functools.lru_cache(maxsize=4)
+def _open_store(root_dir: str) -> DetectionStore:
+    return DetectionStore(root_dir)
+
+
+def get_detection_store(config: Config) -> Optional[DetectionStore]:
+    """Store for the configured directory, or None if disabled."""
+    if not config.DETECTION_STORE_ENABLED:
+        return None
+    return _open_store(config.DETECTION_STORE_DIR)
+
+
+# --- re-tuning ---
+def _fraction(name: str, value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0.0 <= value <= 1.0:
+        raise ValueError(f"{name} must be a number between 0 and 1, got {value!r}")
+    return float(value)
+
+
+def _check_override(name: str, value: Any, context: PipelineContext) -> Any:
+    """The override converted to the setting's type; ValueError if it has the wrong type or range."""
+    if name in FRACTION_SETTINGS:
+        return _fraction(name, value)
+    if name == "MIN_CONF_BY_LABEL":
+        if not isinstance(value, dict):
+            raise ValueError(f"MIN_CONF_BY_LABEL must be an object of label -> confidence, got {value!r}")
+        unknown = sorted(str(label) for label in value if label not in context.LABEL2ID)
+        if unknown:
+            raise ValueError(f"unknown label in MIN_CONF_BY_LABEL: {', '.join(unknown)} "
+                             f"(labels: {', '.join(context.LABEL2ID)})")
+        return {label: _fraction(f"MIN_CONF_BY_LABEL.{label}", conf) for label, conf in value.items()}
+    if name == "QUESTION_NUMBER_MAX_ASPECT":
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"{name} must be a positive number, got {value!r}")
+        return float(value)
+    if name == "QB_MERGE_COLUMN_AWARE":
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} must be true or false, got {value!r}")
+        return value
+    if name == "QB_MERGE_MAX_PASSES":
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name} must be a non-negative integer, got {value!r}")
+        return value
+    return value
+
+
+def apply_overrides(context: PipelineContext, overrides: Dict[str, Any], floor_conf: float) -> PipelineContext:
+    """
+    Threshold overrides on top of `context`. "MIN_CONF_BY_LABEL" takes a dict of label -> confidence that
+    is merged into the current one. ValueError for settings that are not post-processing thresholds, values
+    of the wrong type or outside [0, 1] (confidences and ratios), or a DETECTION_CONF below the confidence
+    the boxes were stored at.
+    """
+    unknown = sorted(set(overrides) - set(TUNABLE_SETTINGS))
+    if unknown:
+        raise ValueError(f"not a post-processing threshold: {', '.join(unknown)} (tunable: {', '.join(TUNABLE_SETTINGS)})")
+    values = {name: _check_override(name, value, context) for name, value in overrides.items()}
+    if "MIN_CONF_BY_LABEL" in values:
+        values["MIN_CONF_BY_LABEL"] = MappingProxyType({**context.MIN_CONF_BY_LABEL, **values["MIN_CONF_BY_LABEL"]})
+    if values.get("DETECTION_CONF", floor_conf) < floor_conf:
+        raise ValueError(f"DETECTION_CONF {values['DETECTION_CONF']} is below the stored floor {floor_conf}")
+    # 워커 풀 없이 순차로: 한 시험지 후처리는 수 ms라 프로세스를 띄우는 비용이 더 큼
+    return replace(context, ANNOTATION_WORKERS=1, **values)
+
+
+def postprocess(pages: List[Dict[str, Any]], config: Config) -> Tuple[List[List[Dict[str, Any]]], Dict[str, Any]]:
+    """Steps 1-7 + grouping without crops or overlays: (units of annotations, summary)."""
+    from src.annotation_processor import process_page, group_logical_units
+
+    annotations, reports = [], []
+    for i, page in enumerate(pages):
+        # process_page가 어노테이션에 필드를 추가하므로 페이지 사본으로 실행
+        filtered, report = process_page(i, {**page, "annotations": [dict(a) for a in page["annotations"]]},
+                                        config, None)
+        annotations.extend(filtered)
+        reports.append(report)
+    units = group_logical_units(annotations)
+    components: Dict[str, int] = {}
+    for a in annotations:
+        components[a["label"]] = components.get(a["label"], 0) + 1
+    summary = {
+        "logical_units": len(units),
+        "after_filter": components,
+        "merged_question_blocks": sum(r["merged_qb_count"] for r in reports),
+        "question_numbers_attached": sum(r["numbers_attached"] for r in reports),
+        "question_numbers_orphan": sum(r["numbers_orphan"] for r in reports),
+        "figures_attached": sum(r["figures_attached"] for r in reports),
+    }
+    return units, summary
+
+
+def unit_signature(unit: List[Dict[str, Any]]) -> str:
+    """"p3 header+passage+question_block x3" 형태의 한 줄 요약 (페이지는 첫 컴포넌트 기준)."""
+    parts: List[List[Any]] = []
+    for a in unit:
+        if parts and parts[-1][0] == a["label"]:
+            parts[-1][1] += 1
+        else:
+            parts.append([a["label"], 1])
+    body = "+".join(label if n == 1 else f"{label} x{n}" for label, n in parts)
+    return f"p{unit[0].get('page_index', 0)} {body}"
+
+
+def retune(store: DetectionStore, exam_id: str, overrides: Dict[str, Any],
+           context: Optional[PipelineContext] = None) -> Dict[str, Any]:
+    """Re-runs post-processing of a stored exam with the current and the overridden thresholds and diffs the units."""
+    from src.config import get_pipeline_context
+    # process_page의 지연 import(PIL 등)가 첫 후처리 측정에 섞이지 않도록 미리 로드
+    import src.annotation_processor  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+    context = context or get_pipeline_context()
+    meta, pages = store.load(exam_id)
+    baseline_cfg = apply_overrides(context, {}, meta["floor_conf"])
+    tuned_cfg = apply_overrides(context, overrides, meta["floor_conf"])
+
+    t0 = time.perf_counter()
+    base_units, base_summary = postprocess(pages, baseline_cfg)
+    t1 = time.perf_counter()
+    tuned_units, tuned_summary = postprocess(pages, tuned_cfg)
+    t2 = time.perf_counter()
+
+    base_sig = [unit_signature(u) for u in base_units]
+    tuned_sig = [unit_signature(u) for u in tuned_units]
+    changes = [line for line in difflib.unified_diff(base_sig, tuned_sig, "current", "tuned", n=0, lineterm="")
+               if not line.startswith(("---", "+++", "@@"))]
+    return {
+        "exam_id": exam_id,
+        "filename": meta.get("filename"),
+        "pages": len(pages),
+        "stored_boxes": sum(len(p["annotations"]) for p in pages),
+        "overrides": overrides,
+        "elapsed_ms": {"current": round((t1 - t0) * 1000, 2), "tuned": round((t2 - t1) * 1000, 2)},
+        "current": base_summary,
+        "tuned": tuned_summary,
+        "unit_changes": changes,
+    }
+
+
+def parse_override(text: str) -> Tuple[str, Any]:
+    """"NAME=VALUE" or "MIN_CONF_BY_LABEL.figure=0.3" (VALUE parsed as JSON when possible)."""
+    name, sep, raw = text.partition("=")
+    if not sep:
+        raise ValueError(f"expected NAME=VALUE, got {text!r}")
+    try:
+        value = json.loads(raw)
+    except json.JSONDecodeError:
+        value = raw
+    name = name.strip()
+    if "." in name:
+        name, key = name.split(".", 1)
+        return name, {key: value}
+    return name, value
+
+
+def print_retune(report: Dict[str, Any]):
+    print(f"{report['exam_id']} ({report['filename']}): {report['pages']} pages, {report['stored_boxes']} stored boxes")
+    print(f"overrides: {json.dumps(report['overrides'], ensure_ascii=False)}")
+    print(f"post-processing: current {report['elapsed_ms']['current']} ms, tuned {report['elapsed_ms']['tuned']} ms")
+    cur, new = report["current"], report["tuned"]
+    for key in ("logical_units", "merged_question_blocks", "question_numbers_attached", "question_numbers_orphan",
+                "figures_attached"):
+        mark = "" if cur[key] == new[key] else "  *"
+        print(f"  {key:<28}{cur[key]:>6} -> {new[key]:<6}{mark}")
+    for label in sorted(set(cur["after_filter"]) | set(new["after_filter"])):
+        a, b = cur["after_filter"].get(label, 0), new["after_filter"].get(label, 0)
+        print(f"  {'kept ' + label:<28}{a:>6} -> {b:<6}{'' if a == b else '  *'}")
+    if report["unit_changes"]:
+        print("logical unit changes:")
+        for line in report["unit_changes"]:
+            print(f"  {line}")
+    else:
+        print("logical units unchanged")
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.config import get_pipeline_context
+
+    parser = argparse.ArgumentParser(description="저장된 원시 검출 결과로 후처리 임계값 재조정 (YOLO 재실행 없음)")
+    parser.add_argument("--list", action="store_true", help="저장된 시험지 목록")
+    parser.add_argument("--exam", type=str, default=None, help="exam_id")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help=f"임계값 재정의 (반복 가능): {', '.join(TUNABLE_SETTINGS)}")
+    parser.add_argument("--json", action="store_true", help="리포트를 JSON으로 출력")
+    args = parser.parse_args()
+
+    context = get_pipeline_context()
+    store = _open_store(context.DETECTION_STORE_DIR)
+    if args.list or not args.exam:
+        for exam in store.exams():
+            print(f"{exam['exam_id']}  {exam['pages']:>3} pages  {exam['boxes']:>6} boxes  "
+                  f"{exam['bytes'] / 1024:>7.1f} KiB  {exam['filename']}")
+    if args.exam:
+        overrides: Dict[str, Any] = {}
+        for item in args.overrides:
+            name, value = parse_override(item)
+            if isinstance(value, dict) and isinstance(overrides.get(name), dict):
+                overrides[name].update(value)
+            else:
+                overrides[name] = value
+        try:
+            report = retune(store, args.exam, overrides, context)
+        except KeyError:
+            raise SystemExit(f"no stored detections for exam {args.exam}")
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print_retune(report)
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Detector Evaluation Harness
+
+Runs the configured YOLO detector over the pages labeled in the SageMaker
+Ground Truth manifest (`output.manifest`) and reports:
+
+1.  Per-class precision / recall / AP@0.5 / AP@0.5:0.95 for the raw detector
+    output and for the output of the `annotation_processor` post-processing
+    (confidence filter, per-class NMS, question_block merge).
+2.  Per-page latency percentiles for detection and for post-processing.
+
+Usage:
+    python -m src.evaluate --images data/processed/images
+    python -m src.evaluate --detections data/processed/<id>/sample_annotations.json --nms-iou 0.4
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+import urllib.parse
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.annotation_processor import filter_page_annotations
+
+Box = Tuple[float, float, float, float]
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU matrix (len(a) x len(b)) for xyxy boxes."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    area_a = np.clip(a[:, 2] - a[:, 0], 0, None) * np.clip(a[:, 3] - a[:, 1], 0, None)
+    area_b = np.clip(b[:, 2] - b[:, 0], 0, None) * np.clip(b[:, 3] - b[:, 1], 0, None)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def match_detections(pred_boxes: np.ndarray, pred_scores: np.ndarray, gt_boxes: np.ndarray,
+                     iou_thresholds: np.ndarray) -> np.ndarray:
+    """
+    Greedy confidence-ordered matching of one class on one page.
+    Returns a (num_preds, num_thresholds) boolean true-positive matrix, rows in
+    the same order as `pred_boxes`.
+    """
+    tp = np.zeros((len(pred_boxes), len(iou_thresholds)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return tp
+    ious = box_iou(pred_boxes, gt_boxes)
+    order = np.argsort(-pred_scores, kind="stable")
+    for t, thr in enumerate(iou_thresholds):
+        taken = np.zeros(len(gt_boxes), dtype=bool)
+        for i in order:
+            cand = np.where(taken, -1.0, ious[i])
+            j = int(np.argmax(cand))
+            if cand[j] >= thr:
+                taken[j] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(tp: np.ndarray, scores: np.ndarray, num_gt: int) -> np.ndarray:
+    """All-point interpolated AP for each IoU threshold column of `tp`."""
+    if num_gt == 0 or len(scores) == 0:
+        return np.zeros(tp.shape[1] if tp.ndim == 2 else 1)
+    order = np.argsort(-scores, kind="stable")
+    tp_cum = np.cumsum(tp[order], axis=0)
+    fp_cum = np.cumsum(~tp[order], axis=0)
+    recall = tp_cum / num_gt
+    precision = tp_cum / np.maximum(tp_cum + fp_cum, 1)
+    ones = np.ones((1, tp.shape[1]))
+    mrec = np.concatenate([0 * ones, recall, ones])
+    mpre = np.concatenate([ones, precision, 0 * ones])
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre, axis=0), axis=0), axis=0)
+    return np.sum((mrec[1:] - mrec[:-1]) * mpre[1:], axis=0)
+
+
+def _local_image_name(source_ref: str) -> str:
+    """Ground Truth `page_XX` (0-based) → `pdf_processor` `page_{XX+1}` file name."""
+    name = urllib.parse.unquote(os.path.basename(source_ref))
+    match = re.search(r'_page_(\d+)\.png$', name)
+    if match:
+        name = name[:match.start()] + f"_page_{int(match.group(1)) + 1}.png"
+    return name
+
+
+def load_ground_truth(manifest_path: str, image_dir: str, config: Config) -> List[Dict[str, Any]]:
+    """
+    Reads the manifest and returns one entry per locally available page:
+    {"image_path", "gt_size": (w, h), "annotations": [{"label", "bbox"}]}.
+    Boxes stay in manifest pixel space; they are rescaled per page later.
+    """
+    pages = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            key = 'suneung-korean-layout-detection-v2'
+            if 'suneung-korean-layout-detection-v2-chain' in data:
+                key = 'suneung-korean-layout-detection-v2-chain'
+            image_path = os.path.join(image_dir, _local_image_name(data['source-ref']))
+            if not os.path.exists(image_path):
+                continue
+            size = data[key]['image_size'][0]
+            annos = []
+            for ann in data[key]['annotations']:
+                x1, y1 = float(ann['left']), float(ann['top'])
+                annos.append({
+                    "label": config.CLASS_NAMES.get(int(ann['class_id']), "unknown"),
+                    "bbox": (x1, y1, x1 + float(ann['width']), y1 + float(ann['height'])),
+                })
+            pages.append({"image_path": image_path, "gt_size": (size['width'], size['height']), "annotations": annos})
+    return pages
+
+
+class _ClassAccumulator:
+    """Collects scores / TP flags / GT counts for one class across pages."""
+
+    def __init__(self, num_thresholds: int):
+        self.scores: List[np.ndarray] = []
+        self.tp: List[np.ndarray] = []
+        self.num_gt = 0
+        self.num_thresholds = num_thresholds
+
+    def add(self, scores: np.ndarray, tp: np.ndarray, num_gt: int):
+        self.scores.append(scores)
+        self.tp.append(tp)
+        self.num_gt += num_gt
+
+    def summary(self) -> Dict[str, Any]:
+        scores = np.concatenate(self.scores) if self.scores else np.zeros(0)
+        tp = np.concatenate(self.tp) if self.tp else np.zeros((0, self.num_thresholds), dtype=bool)
+        ap = average_precision(tp, scores, self.num_gt)
+        n_tp = int(tp[:, 0].sum()) if len(tp) else 0
+        return {
+            "num_gt": self.num_gt,
+            "num_pred": int(len(scores)),
+            "precision": n_tp / len(scores) if len(scores) else 0.0,
+            "recall": n_tp / self.num_gt if self.num_gt else 0.0,
+            "ap50": float(ap[0]),
+            "ap50_95": float(np.mean(ap)),
+        }
+
+
+def _accumulate(acc: Dict[str, _ClassAccumulator], preds: List[Dict[str, Any]], gts: List[Dict[str, Any]],
+                classes: List[str], iou_thresholds: np.ndarray):
+    for label in classes:
+        p = [a for a in preds if a["label"] == label]
+        g = [a for a in gts if a["label"] == label]
+        pred_boxes = np.array([a["bbox"] for a in p], dtype=np.float64).reshape(-1, 4)
+        pred_scores = np.array([float(a.get("confidence", 0.5)) for a in p], dtype=np.float64)
+        gt_boxes = np.array([a["bbox"] for a in g], dtype=np.float64).reshape(-1, 4)
+        tp = match_detections(pred_boxes, pred_scores, gt_boxes, iou_thresholds)
+        acc[label].add(pred_scores, tp, len(g))
+
+
+def _summarize(acc: Dict[str, _ClassAccumulator]) -> Dict[str, Any]:
+    per_class = {label: a.summary() for label, a in acc.items()}
+    present = [v for v in per_class.values() if v["num_gt"] > 0]
+    return {
+        "per_class": per_class,
+        "map50": float(np.mean([v["ap50"] for v in present])) if present else 0.0,
+        "map50_95": float(np.mean([v["ap50_95"] for v in present])) if present else 0.0,
+    }
+
+
+def latency_stats(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"count": 0}
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    p50, p90, p95, p99 = np.percentile(arr, [50, 90, 95, 99])
+    return {"count": int(arr.size), "mean": float(arr.mean()), "p50": float(p50), "p90": float(p90),
+            "p95": float(p95), "p99": float(p99), "max": float(arr.max())}
+
+
+def evaluate(config: Config, manifest_path: str, image_dir: str,
+             detections_path: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Evaluates detector + post-processing against the manifest.
+    If `detections_path` (a `sample_annotations.json`) is given, those stored
+    detections are used instead of running the model, which makes
+    post-processing threshold sweeps cheap.
+    """
+    gt_pages = load_ground_truth(manifest_path, image_dir, config)
+    stored: Dict[str, List[Dict[str, Any]]] = {}
+    model = None
+    if detections_path:
+        with open(detections_path, 'r', encoding='utf-8') as f:
+            for page in json.load(f):
+                stored[os.path.basename(page["image_path"])] = page["annotations"]
+        gt_pages = [p for p in gt_pages if os.path.basename(p["image_path"]) in stored]
+    else:
+        from src.inference import load_detector, results_to_annotations
+        model = load_detector(config)
+    if limit:
+        gt_pages = gt_pages[:limit]
+    if not gt_pages:
+        raise FileNotFoundError(f"No labeled pages from {manifest_path} were found in {image_dir}.")
+
+    classes = list(config.CLASSES)
+    iou_thresholds = np.asarray(config.EVAL_IOU_THRESHOLDS, dtype=np.float64)
+    raw_acc = {c: _ClassAccumulator(len(iou_thresholds)) for c in classes}
+    post_acc = {c: _ClassAccumulator(len(iou_thresholds)) for c in classes}
+    detect_ms: List[float] = []
+    post_ms: List[float] = []
+    page_rows = []
+
+    print(f"Evaluating {len(gt_pages)} labeled pages...")
+    for page_index, page in enumerate(gt_pages):
+        image_path = page["image_path"]
+        with Image.open(image_path) as img:
+            img_w, img_h = img.size
+        sx = img_w / float(page["gt_size"][0])
+        sy = img_h / float(page["gt_size"][1])
+        gts = [{"label": g["label"], "bbox": (g["bbox"][0]*sx, g["bbox"][1]*sy, g["bbox"][2]*sx, g["bbox"][3]*sy)}
+               for g in page["annotations"]]
+
+        if model is not None:
+            t0 = time.perf_counter()
+            results = model(image_path, conf=config.DETECTION_CONF, verbose=False)
+            raw = [a for r in results for a in results_to_annotations(r, config)]
+            detect_ms.append((time.perf_counter() - t0) * 1000.0)
+        else:
+            raw = [a for a in stored[os.path.basename(image_path)]
+                   if float(a.get("confidence", 0.5)) >= config.DETECTION_CONF]
+
+        t0 = time.perf_counter()
+        post = filter_page_annotations(raw, img_w, img_h, config, page_index=page_index, image_path=image_path)
+        post_ms.append((time.perf_counter() - t0) * 1000.0)
+
+        _accumulate(raw_acc, raw, gts, classes, iou_thresholds)
+        _accumulate(post_acc, post, gts, classes, iou_thresholds)
+        page_rows.append({"image_path": image_path, "gt": len(gts), "raw": len(raw), "post": len(post),
+                          "detect_ms": detect_ms[-1] if model is not None else None, "postprocess_ms": post_ms[-1]})
+
+    return {
+        "manifest": os.path.abspath(manifest_path),
+        "pages_evaluated": len(gt_pages),
+        "thresholds": {
+            "detection_conf": config.DETECTION_CONF,
+            "default_min_conf": config.DEFAULT_MIN_CONF,
+            "min_conf_by_label": config.MIN_CONF_BY_LABEL,
+            "min_area_ratio": config.MIN_AREA_RATIO,
+            "nms_iou": config.NMS_IOU_THRESHOLD,
+            "qb_merge_x_overlap_ratio": config.QB_MERGE_X_OVERLAP_RATIO,
+            "qb_merge_max_vgap_ratio": config.QB_MERGE_MAX_VGAP_RATIO,
+            "qb_merge_column_aware": config.QB_MERGE_COLUMN_AWARE,
+            "qb_merge_max_passes": config.QB_MERGE_MAX_PASSES,
+        },
+        "raw": _summarize(raw_acc),
+        "postprocessed": _summarize(post_acc),
+        "latency_ms": {"detect": latency_stats(detect_ms), "postprocess": latency_stats(post_ms)},
+        "pages": page_rows,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    for stage in ("raw", "postprocessed"):
+        res = report[stage]
+        print(f"\n[{stage}] mAP@0.5={res['map50']:.3f}  mAP@0.5:0.95={res['map50_95']:.3f}")
+        print(f"  {'class':<16}{'gt':>6}{'pred':>6}{'P':>8}{'R':>8}{'AP50':>8}{'AP50-95':>9}")
+        for label, m in res["per_class"].items():
+            print(f"  {label:<16}{m['num_gt']:>6}{m['num_pred']:>6}{m['precision']:>8.3f}{m['recall']:>8.3f}"
+                  f"{m['ap50']:>8.3f}{m['ap50_95']:>9.3f}")
+    for stage, stats in report["latency_ms"].items():
+        if stats.get("count"):
+            print(f"\n[latency:{stage}] p50={stats['p50']:.1f}ms p95={stats['p95']:.1f}ms "
+                  f"p99={stats['p99']:.1f}ms (n={stats['count']})")
+
+
+if __name__ == "__main__":
+    config = Config()
+    parser = argparse.ArgumentParser(description="Ground Truth 기준 검출기/후처리 평가")
+    parser.add_argument("--manifest", type=str, default=config.GROUND_TRUTH_MANIFEST_PATH, help="Ground Truth manifest 경로")
+    parser.add_argument("--images", type=str, default=config.IMAGE_DIR, help="페이지 PNG 폴더")
+    parser.add_argument("--detections", type=str, default=None, help="저장된 sample_annotations.json (모델 실행 생략)")
+    parser.add_argument("--limit", type=int, default=None, help="평가할 최대 페이지 수")
+    parser.add_argument("--conf", type=float, default=None, help="DETECTION_CONF 재정의")
+    parser.add_argument("--min-conf", type=float, default=None, help="DEFAULT_MIN_CONF 재정의")
+    parser.add_argument("--min-area-ratio", type=float, default=None, help="MIN_AREA_RATIO 재정의")
+    parser.add_argument("--nms-iou", type=float, default=None, help="NMS_IOU_THRESHOLD 재정의")
+    parser.add_argument("--merge-x-overlap", type=float, default=None, help="QB_MERGE_X_OVERLAP_RATIO 재정의")
+    parser.add_argument("--merge-vgap", type=float, default=None, help="QB_MERGE_MAX_VGAP_RATIO 재정의")
+    parser.add_argument("--merge-passes", type=int, default=None, help="QB_MERGE_MAX_PASSES 재정의")
+    parser.add_argument("--output", type=str, default=None, help="리포트 JSON 경로")
+    args = parser.parse_args()
+
+    overrides = {
+        "DETECTION_CONF": args.conf, "DEFAULT_MIN_CONF": args.min_conf, "MIN_AREA_RATIO": args.min_area_ratio,
+        "NMS_IOU_THRESHOLD": args.nms_iou, "QB_MERGE_X_OVERLAP_RATIO": args.merge_x_overlap,
+        "QB_MERGE_MAX_VGAP_RATIO": args.merge_vgap, "QB_MERGE_MAX_PASSES": args.merge_passes,
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            setattr(config, name, value)
+
+    report = evaluate(config, args.manifest, args.images, detections_path=args.detections, limit=args.limit)
+    print_report(report)
+
+    output_path = args.output or os.path.join(config.EVALUATION_DIR, "evaluation_report.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n평가 리포트: {output_path}")
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Upload / Result Catalog
+
+The web UI used to `os.listdir` `history/` and `results/` on every page load
+and render every file name. `FileCatalog` keeps one SQLite row per stored
+PDF instead (`CATALOG_DB_PATH`):
+
+-   kind ("upload" | "result"), file name, size, page count, sha256
+-   for results: the upload it was made from, seed, pipeline wall time
+-   thumbnail path, filled the first time the thumbnail is requested
+
+Rows are written when an upload is saved and when a job finishes; `sync`
+adopts files that were put into the directories by other means (and drops
+rows whose file is gone) and runs once at server start. Listings are
+paginated and sorted in SQL, and thumbnails are rendered once with fitz at
+`THUMBNAIL_WIDTH` pixels into `THUMBNAIL_DIR` (named by content hash, so
+identical PDFs share one).
+"""
+
+import os
+import time
+import sqlite3
+import functools
+import threading
+from typing import Any, Dict, Optional
+
+from src.config import Config
+from src.crop_store import file_digest
+
+KINDS = ("upload", "result")
+SORT_COLUMNS = ("created_at", "name", "bytes", "page_count", "processing_s")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    page_count INTEGER,
+    sha256 TEXT,
+    source TEXT,
+    seed INTEGER,
+    processing_s REAL,
+    thumbnail TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS files_created ON files(kind, created_at, name);
+CREATE INDEX IF NOT EXISTS files_bytes ON files(kind, bytes, name);
+CREATE INDEX IF NOT EXISTS files_pages ON files(kind, page_count, name);
+CREATE INDEX IF NOT EXISTS files_processing ON files(kind, processing_s, name);
+"""
+
+
+def pdf_page_count(path: str) -> Optional[int]:
+    import fitz  # PyMuPDF
+    try:
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception:
+        return None
+
+
+class FileCatalog:
+    def __init__(self, db_path: str, thumbnail_dir: str, thumbnail_width: int = 120):
+        self.db_path = db_path
+        self.thumbnail_dir = thumbnail_dir
+        self.thumbnail_width = thumbnail_width
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process (connections must not cross a fork)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # --- writes ---
+    def record(self, kind: str, path: str, source: Optional[str] = None, seed: Optional[int] = None,
+               processing_s: Optional[float] = None, created_at: Optional[float] = None):
+        """Adds or replaces the row of a stored PDF (page count and hash are read from the file)."""
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {KINDS}")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (kind, name, bytes, page_count, sha256, source, seed, processing_s, "
+                "thumbnail, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                (kind, os.path.basename(path), os.path.getsize(path), pdf_page_count(path), file_digest(path),
+                 source, seed, processing_s, created_at or time.time()))
+
+    def sync(self, kind: str, directory: str) -> Dict[str, int]:
+        """Adopts PDFs in `directory` that have no row yet and removes rows whose file is gone."""
+        on_disk = {name for name in os.listdir(directory) if os.path.isfile(os.path.join(directory, name))}
+        conn = self._connect()
+        known = {row["name"] for row in conn.execute("SELECT name FROM files WHERE kind = ?", (kind,))}
+        for name in sorted(on_disk - known):
+            path = os.path.join(directory, name)
+            self.record(kind, path, created_at=os.path.getmtime(path))
+        gone = sorted(known - on_disk)
+        with conn:
+            conn.executemany("DELETE FROM files WHERE kind = ? AND name = ?", [(kind, name) for name in gone])
+        return {"added": len(on_disk - known), "removed": len(gone)}
+
+    # --- reads ---
+    def listing(self, kind: str, page: int = 1, per_page: int = 25, sort: str = "created_at",
+                order: str = "desc") -> Dict[str, Any]:
+        """One page of `kind` rows sorted by `sort` (SORT_COLUMNS); unknown values fall back to the defaults."""
+        sort = sort if sort in SORT_COLUMNS else "created_at"
+        order = "asc" if order == "asc" else "desc"
+        conn = self._connect()
+        total = conn.execute("SELECT COUNT(*) FROM files WHERE kind = ?", (kind,)).fetchone()[0]
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+        rows = conn.execute(
+            f"SELECT * FROM files WHERE kind = ? ORDER BY {sort} {order}, name {order} LIMIT ? OFFSET ?",
+            (kind, per_page, (page - 1) * per_page)).fetchall()
+        return {"items": [dict(r) for r in rows], "total": total, "page": page, "pages": pages,
+                "per_page": per_page, "sort": sort, "order": order}
+
+    def thumbnail(self, kind: str, name: str, pdf_path: str) -> Optional[str]:
+        """First-page PNG of a catalogued PDF, rendered on first request and reused afterwards."""
+        conn = self._connect()
+        row = conn.execute("SELECT sha256, thumbnail FROM files WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        if row is None:
+            return None
+        if row["thumbnail"] and os.path.exists(row["thumbnail"]):
+            return row["thumbnail"]
+        path = os.path.join(self.thumbnail_dir, f"{row['sha256']}_{self.thumbnail_width}.png")
+        if not os.path.exists(path):
+            import fitz  # PyMuPDF
+            with fitz.open(pdf_path) as doc:
+                if not doc.page_count:
+                    return None
+                page = doc[0]
+                zoom = self.thumbnail_width / max(1.0, page.rect.width)
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.png"
+            pix.save(tmp_path)
+            os.replace(tmp_path, path)
+        with conn:
+            conn.execute("UPDATE files SET thumbnail = ? WHERE kind = ? AND name = ?", (path, kind, name))
+        return path
+
+
+@functools.lru_cache(maxsize=4)
+def _open_catalog(db_path: str, thumbnail_dir: str, thumbnail_width: int) -> FileCatalog:
+    return FileCatalog(db_path, thumbnail_dir, thumbnail_width)
+
+
+def get_file_catalog(config: Config) -> FileCatalog:
+    """Process-wide catalog for the configured paths."""
+    return _open_catalog(config.CATALOG_DB_PATH, config.THUMBNAIL_DIR, config.THUMBNAIL_WIDTH)
@@ -3,17 +3,23 @@
 Image Cropping Utilities
 
 This module provides functions for cropping and processing image components
-based on bounding box annotations.
+based on bounding box annotations, either with PIL (`crop_and_mask_image`) or
+on a decoded page array (`load_page_array` / `crop_and_mask_array`).
 """
 
 import os
-from PIL import Image
-from typing import Tuple
+from typing import Any, Dict, Sequence, Tuple, TYPE_CHECKING
+
+from src.image_io import save_image
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
 
 # Bbox is defined as a tuple of four floats (x_min, y_min, x_max, y_max)
 Bbox = Tuple[float, float, float, float]
 
-def crop_and_mask_image(image: Image.Image, bbox: Bbox) -> Image.Image:
+def crop_and_mask_image(image: "Image.Image", bbox: Bbox) -> "Image.Image":
     """
     Crops the given PIL Image to the specified bounding box.
     The 'mask' functionality is not yet implemented.
@@ -29,3 +35,59 @@ def crop_and_mask_image(image: Image.Image, bbox: Bbox) -> Image.Image:
     # We assume the bbox format matches this.
     cropped_image = image.crop(bbox)
     return cropped_image
+
+def load_page_array(image_path: str) -> "np.ndarray":
+    """
+    Decodes a page image once into a NumPy array (H x W x C, uint8) so that
+    every component on the page can be cropped by slicing instead of
+    re-opening the file per crop.
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        return np.asarray(img)
+
+def crop_and_mask_array(page: "np.ndarray", bbox: Tuple[int, int, int, int],
+                        mask_bboxes: Sequence[Tuple[int, int, int, int]] = ()) -> "np.ndarray":
+    """
+    NumPy counterpart of `crop_and_mask_image` plus masking.
+
+    Returns the (x_min, y_min, x_max, y_max) region of `page`; areas outside
+    the page are zero-filled like `PIL.Image.crop`. `mask_bboxes` are given
+    relative to the crop and are painted white inclusively (same pixels as
+    `ImageDraw.rectangle(..., fill="white")`) with one boolean-mask assignment.
+    Without masks the in-bounds crop is a view into `page`.
+    """
+    import numpy as np
+
+    x0, y0, x1, y1 = (int(v) for v in bbox)
+    h, w = max(0, y1 - y0), max(0, x1 - x0)
+    page_h, page_w = page.shape[:2]
+    sx0, sy0 = max(0, x0), max(0, y0)
+    sx1, sy1 = min(page_w, x1), min(page_h, y1)
+    inside = sx1 > sx0 and sy1 > sy0
+    if inside and (sx0, sy0, sx1, sy1) == (x0, y0, x1, y1) and not len(mask_bboxes):
+        return page[y0:y1, x0:x1]
+
+    crop = np.zeros((h, w) + page.shape[2:], dtype=page.dtype)
+    if inside:
+        crop[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = page[sy0:sy1, sx0:sx1]
+    if len(mask_bboxes) and h and w:
+        m = np.asarray(mask_bboxes, dtype=np.int64).reshape(-1, 4)
+        rows = np.arange(h)[None, :]
+        cols = np.arange(w)[None, :]
+        in_rows = (rows >= m[:, 1:2]) & (rows <= m[:, 3:4])  # (K, h)
+        in_cols = (cols >= m[:, 0:1]) & (cols <= m[:, 2:3])  # (K, w)
+        mask = (in_rows.T.astype(np.uint8) @ in_cols.astype(np.uint8)) > 0
+        crop[mask] = 255
+    return crop
+
+def save_array_image(array: "np.ndarray", out_path_base: str, policy: Dict[str, Any]) -> str:
+    """
+    Writes a crop with the "crop" image policy (see `src.image_io`) and
+    returns the file path; the extension follows the policy format.
+    """
+    from PIL import Image
+
+    return save_image(Image.fromarray(array), out_path_base, policy)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Image Encoding Policy
+
+Every intermediate or debug image the pipeline writes goes through
+`save_image` / `save_pixmap` with the policy of its artifact class from
+`Config.IMAGE_IO_POLICY`:
+
+-   "page":    rendered PDF pages (detector input, crop source)
+-   "crop":    component crops embedded into the recombined PDF
+-   "overlay": debug overlays that are only looked at when debugging
+
+A policy is a dict such as {"format": "png", "compress_level": 1,
+"optimize": False} or {"format": "jpeg", "quality": 80}. Callers pass the
+output path without extension; the extension follows the format and the
+written path is returned.
+"""
+
+from typing import Any, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+IMAGE_EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "ppm": ".ppm"}
+
+
+def image_format(policy: Dict[str, Any]) -> str:
+    fmt = str(policy.get("format", "png")).lower()
+    fmt = "jpeg" if fmt == "jpg" else fmt
+    if fmt not in IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported image format in policy: {policy.get('format')!r}")
+    return fmt
+
+
+def save_image(image: "Image.Image", out_path_base: str, policy: Dict[str, Any]) -> str:
+    """Encodes a PIL image according to `policy` and returns the written path."""
+    fmt = image_format(policy)
+    out_path = out_path_base + IMAGE_EXTENSIONS[fmt]
+    optimize = bool(policy.get("optimize", False))
+    if fmt == "png":
+        image.save(out_path, format="PNG", compress_level=int(policy.get("compress_level", 6)), optimize=optimize)
+    elif fmt == "jpeg":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(out_path, format="JPEG", quality=int(policy.get("quality", 85)), optimize=optimize)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(out_path, format="PPM")
+    return out_path
+
+
+def save_pixmap(pix, out_path_base: str, policy: Dict[str, Any]) -> str:
+    """Same as `save_image` for a PyMuPDF Pixmap (pixels are not copied twice)."""
+    from PIL import Image
+
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    image = Image.frombuffer(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride, 1)
+    return save_image(image, out_path_base, policy)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Layout Detector Inference
+
+Thin wrappers around the YOLO layout detector shared by the pipeline
+(`main.py`) and the evaluation harness (`evaluate.py`).
+
+Tiled mode (`DETECTION_TILING`): each page is cut into overlapping
+`DETECTION_TILE_SIZE` tiles that go through the detector at native
+resolution, so small boxes (question numbers) are not lost to the
+downsampling of a whole page to the model input size. Tiles of all pages are
+streamed through the detector in batches of `DETECTION_BATCH_SIZE`. Tile boxes
+cut by an interior tile edge are dropped (the neighbouring tile or the
+optional whole-page pass, downscaled to one tile, sees them whole), and the
+rest are merged per page with class-wise vectorized NMS.
+"""
+
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from src.config import Config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+Tile = Tuple[int, int, int, int]
+
+_detectors: Dict[str, Any] = {}
+_detectors_lock = threading.Lock()
+# ultralytics predictors are not thread-safe; callers sharing the detector hold this while predicting
+detector_call_lock = threading.Lock()
+
+
+def load_detector(config: Config):
+    """Loads the YOLO layout detector from `config.YOLO_MODEL_PATH`."""
+    from ultralytics import YOLO
+    return YOLO(config.YOLO_MODEL_PATH)
+
+
+def get_detector(config: Config):
+    """
+    Process-wide detector for `config.YOLO_MODEL_PATH`, loaded on first use.
+    When it is loaded before the serving worker processes are forked, the
+    workers share the weights copy-on-write instead of loading their own.
+    """
+    path = config.YOLO_MODEL_PATH
+    with _detectors_lock:
+        if path not in _detectors:
+            _detectors[path] = load_detector(config)
+        return _detectors[path]
+
+
+def _rows_to_annotations(rows, config: Config) -> List[Dict[str, Any]]:
+    annotations = []
+    for *xyxy, conf, cls in rows:
+        x_min, y_min, x_max, y_max = map(float, xyxy)
+        annotations.append({
+            "label": config.CLASS_NAMES.get(int(cls), "unknown"),
+            "bbox": [x_min, y_min, x_max, y_max],
+            "confidence": float(conf),
+            "text_content": "",
+        })
+    return annotations
+
+
+def results_to_annotations(result, config: Config) -> List[Dict[str, Any]]:
+    """
+    Converts a single ultralytics result into the annotation dicts used by
+    `sample_annotations.json` (label, bbox, confidence, text_content).
+    """
+    return _rows_to_annotations(result.boxes.data, config)
+
+
+def _result_rows(result) -> "np.ndarray":
+    """(n, 6) float array [x0, y0, x1, y1, conf, cls] from an ultralytics result (tensor or list)."""
+    import numpy as np
+    data = result.boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float64).reshape(-1, 6)
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float) -> List[Tile]:
+    """
+    (x0, y0, x1, y1) tiles covering the page, neighbours overlapping by `overlap` of the tile size.
+    The last tile of each row/column is shifted back to end at the page edge, so all tiles
+    have the same size (pages smaller than a tile give one tile of the page size).
+    """
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1.0 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        return positions + [length - tile_size]
+
+    tw, th = min(tile_size, width), min(tile_size, height)
+    return [(x, y, x + tw, y + th) for y in starts(height) for x in starts(width)]
+
+
+def batched_nms(boxes: "np.ndarray", scores: "np.ndarray", classes: "np.ndarray", iou_thr: float) -> "np.ndarray":
+    """
+    Class-wise NMS in one pass: boxes of different classes are shifted apart so they never
+    overlap, then greedy NMS runs with vectorized IoU against all remaining boxes.
+    Returns kept indices in descending score order.
+    """
+    import numpy as np
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offset = classes.astype(np.float64)[:, None] * (boxes.max() + 1.0)
+    b = boxes + offset
+    areas = np.clip(b[:, 2] - b[:, 0], 0, None) * np.clip(b[:, 3] - b[:, 1], 0, None)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        lt = np.maximum(b[i, :2], b[rest, :2])
+        rb = np.minimum(b[i, 2:], b[rest, 2:])
+        wh = np.clip(rb - lt, 0, None)
+        inter = wh[:, 0] * wh[:, 1]
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou < iou_thr]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _interior_cut(rows: "np.ndarray", tile: Tile, width: int, height: int, margin: float) -> "np.ndarray":
+    """Mask of boxes touching a tile edge that is not a page edge (cut objects)."""
+    x0, y0, x1, y1 = tile
+    cut = (rows[:, 0] <= x0 + margin) & (x0 > 0)
+    cut |= (rows[:, 1] <= y0 + margin) & (y0 > 0)
+    cut |= (rows[:, 2] >= x1 - margin) & (x1 < width)
+    cut |= (rows[:, 3] >= y1 - margin) & (y1 < height)
+    return cut
+
+
+def detect_tiled(model, image_paths: Sequence[str], config: Config,
+                 on_page_done=None) -> List[List[Dict[str, Any]]]:
+    """
+    Tiled detection for several pages. Returns one annotation list per page (input order).
+    `on_page_done(page_idx, annotations)` is called as soon as all tiles of a page are merged.
+    """
+    import numpy as np
+    from PIL import Image
+
+    tile_size = int(config.DETECTION_TILE_SIZE)
+    batch_size = max(1, int(config.DETECTION_BATCH_SIZE))
+    margin = float(config.DETECTION_TILE_EDGE_MARGIN)
+    full_page = bool(config.DETECTION_TILE_FULL_PAGE_PASS)
+
+    pages: List[Optional[Dict[str, Any]]] = [None] * len(image_paths)
+    results: List[List[Dict[str, Any]]] = [[] for _ in image_paths]
+
+    def jobs() -> Iterator[Tuple[int, Optional[Tile], "np.ndarray"]]:
+        # 페이지를 하나씩 디코딩해서 타일을 흘려보냄 (모든 페이지를 한꺼번에 메모리에 올리지 않음)
+        for idx, path in enumerate(image_paths):
+            with Image.open(path) as img:
+                rgb = img.convert("RGB")
+            w, h = rgb.size
+            tiles = tile_grid(w, h, tile_size, config.DETECTION_TILE_OVERLAP)
+            scale = min(1.0, tile_size / float(max(w, h)))
+            pages[idx] = {"size": (w, h), "scale": scale, "rows": [], "pending": len(tiles) + int(full_page)}
+            if full_page:
+                # 페이지 전체 패스: 타일 한 장 크기로 줄여서 같은 배치에 넣음 (큰 박스용)
+                small = rgb.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR)
+                yield idx, None, np.ascontiguousarray(np.asarray(small)[..., ::-1])
+            bgr = np.ascontiguousarray(np.asarray(rgb)[..., ::-1])
+            del rgb
+            for tile in tiles:
+                yield idx, tile, bgr[tile[1]:tile[3], tile[0]:tile[2]]
+
+    def finish(idx: int):
+        page = pages[idx]
+        rows = np.concatenate(page["rows"]) if page["rows"] else np.zeros((0, 6))
+        keep = batched_nms(rows[:, :4], rows[:, 4], rows[:, 5], config.DETECTION_TILE_NMS_IOU)
+        results[idx] = _rows_to_annotations(rows[keep], config)
+        pages[idx] = None
+        if on_page_done:
+            on_page_done(idx, results[idx])
+
+    def flush(batch: List[Tuple[int, Optional[Tile], "np.ndarray"]]):
+        outputs = model([arr for _, _, arr in batch], conf=config.DETECTION_FLOOR_CONF, imgsz=tile_size, verbose=False)
+        for (idx, tile, _), result in zip(batch, outputs):
+            page = pages[idx]
+            rows = _result_rows(result)
+            if tile is None:
+                rows[:, :4] /= page["scale"]
+            elif len(rows):
+                rows[:, [0, 2]] += tile[0]
+                rows[:, [1, 3]] += tile[1]
+                rows = rows[~_interior_cut(rows, tile, *page["size"], margin)]
+            page["rows"].append(rows)
+            page["pending"] -= 1
+            if page["pending"] == 0:
+                finish(idx)
+        batch.clear()
+
+    batch: List[Tuple[int, Optional[Tile], "np.ndarray"]] = []
+    for job in jobs():
+        batch.append(job)
+        if len(batch) >= batch_size:
+            flush(batch)
+    if batch:
+        flush(batch)
+    return results
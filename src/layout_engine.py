@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Column Packing Layout Engine
+
+Plans the placement of shuffled logical units into page columns so that
+fewer pages are produced than with the greedy first-fit placement in
+`pdf_recombiner.plan_layout`.
+
+1.  Each unit is split into atomic blocks: a component plus its attachments,
+    and a header together with the passage that follows it.
+2.  Units may be pulled forward by at most `reorder_window` positions to fill
+    a column gap (unit-internal order is never changed). With the shuffle's
+    `layout_constraints` a unit only moves within its segment (never across a
+    pinned unit or into/out of a section group), and an order that would
+    restore the original exam order is not used.
+3.  Column breaks over the resulting block sequence are chosen by dynamic
+    programming: minimum number of columns first, then minimum squared slack
+    so the columns are evenly filled.
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+
+Component = Dict[str, Any]
+LogicalUnit = List[Component]
+Block = Dict[str, Any]
+
+
+def scale_to_column(img_w: int, img_h: int, column_width: float) -> Tuple[int, int]:
+    """Shrinks images wider than a column; smaller images keep their size."""
+    if img_w > column_width:
+        scale = column_width / img_w
+        return int(img_w * scale), int(img_h * scale)
+    return int(img_w), int(img_h)
+
+
+def build_blocks(unit: LogicalUnit, unit_index: int, geo: Dict[str, Any],
+                 image_sizes: Dict[str, Tuple[int, int]]) -> List[Block]:
+    """
+    Splits one logical unit into blocks that must share a column.
+    A block is {"unit": idx, "items": [(type, path, w, h), ...], "height": h}.
+    """
+    column_width = geo["column_width"]
+    spacing = geo["spacing"]
+    blocks: List[Block] = []
+    joined_with_header = False
+    for i, component in enumerate(unit):
+        path = component['image_path']
+        if path not in image_sizes:
+            print(f"경고: 이미지를 찾을 수 없습니다. 건너뜁니다 -> {path}")
+            joined_with_header = False
+            continue
+        items = [(component['label'], path) + scale_to_column(*image_sizes[path], column_width)]
+        for att in component.get('attachments', []):
+            if att['image_path'] in image_sizes:
+                items.append(("attachment", att['image_path']) + scale_to_column(*image_sizes[att['image_path']], column_width))
+        if joined_with_header:
+            blocks[-1]["items"].extend(items)
+        else:
+            blocks.append({"unit": unit_index, "items": items})
+        joined_with_header = (
+            component['label'] == 'header' and (i + 1) < len(unit) and unit[i + 1]['label'] == 'passage'
+        )
+    for block in blocks:
+        block["height"] = sum(it[3] for it in block["items"]) + spacing * (len(block["items"]) - 1)
+    return blocks
+
+
+def order_units_for_packing(unit_blocks: List[List[Block]], capacity: float, spacing: float,
+                            reorder_window: int, segments: Optional[List[int]] = None) -> List[int]:
+    """
+    Returns a unit order that keeps the shuffled order except that, when the
+    next unit's first block does not fit the current column gap, one of the
+    following `reorder_window` units whose first block fits is placed first.
+    A unit is never postponed more than `reorder_window` times, and only units
+    with the same `segments` value as the next unit are considered.
+    """
+    pending = [i for i, blocks in enumerate(unit_blocks) if blocks]
+    if reorder_window <= 0:
+        return pending
+    skipped = {i: 0 for i in pending}
+    order: List[int] = []
+    used = 0.0
+    fresh = True  # current column is empty
+
+    def fits(height):
+        return fresh or used + spacing + height <= capacity
+
+    while pending:
+        choice = 0
+        head = pending[0]
+        if skipped[head] < reorder_window and not fits(unit_blocks[head][0]["height"]):
+            for k in range(1, min(reorder_window + 1, len(pending))):
+                if segments is not None and segments[pending[k]] != segments[head]:
+                    break
+                if fits(unit_blocks[pending[k]][0]["height"]):
+                    choice = k
+                    break
+        for k in range(choice):
+            skipped[pending[k]] += 1
+        unit_idx = pending.pop(choice)
+        order.append(unit_idx)
+        for block in unit_blocks[unit_idx]:
+            if fits(block["height"]):
+                used = block["height"] if fresh else used + spacing + block["height"]
+            else:
+                used = block["height"]
+            fresh = False
+    return order
+
+
+def pack_columns(heights: List[float], capacity: float, spacing: float) -> List[int]:
+    """
+    DP over column breaks for a fixed block order. Minimizes the number of
+    columns, then the sum of squared slack of every column but the last.
+    Returns the start index of each column. A block taller than a column
+    gets a column of its own.
+    """
+    n = len(heights)
+    if n == 0:
+        return []
+    INF = (float("inf"), float("inf"))
+    best = [INF] * (n + 1)  # best[i]: cost of packing heights[:i]
+    prev = [0] * (n + 1)
+    best[0] = (0, 0.0)
+    for i in range(1, n + 1):
+        used = -spacing
+        for j in range(i - 1, -1, -1):
+            used += spacing + heights[j]
+            if used > capacity and j < i - 1:
+                break
+            slack = max(0.0, capacity - used) if i < n else 0.0
+            cand = (best[j][0] + 1, best[j][1] + slack * slack)
+            if cand < best[i]:
+                best[i] = cand
+                prev[i] = j
+    starts = []
+    i = n
+    while i > 0:
+        starts.append(prev[i])
+        i = prev[i]
+    return starts[::-1]
+
+
+def plan_packed_layout(logical_units_to_place: List[LogicalUnit], geo: Dict[str, Any],
+                       image_sizes: Dict[str, Tuple[int, int]], reorder_window: int = 0,
+                       constraints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Packed counterpart of `pdf_recombiner.plan_layout`; returns the same
+    placement map structure ({"pages": [{"page_id", "items"}]}), with each
+    item also recording the index of the logical unit it came from.
+    `constraints` is the {"segments", "avoid_order"} dict from
+    `layout_organizer.shuffle_for_layout`; without it units move freely.
+    """
+    spacing = geo["spacing"]
+    capacity = geo["page_height"] - geo["margin"] - geo["content_start_y"]
+    columns_per_page = 2 if geo["two_column_layout"] else 1
+
+    unit_blocks = [build_blocks(unit, idx, geo, image_sizes) for idx, unit in enumerate(logical_units_to_place)]
+    constraints = constraints or {}
+    order = order_units_for_packing(unit_blocks, capacity, spacing, reorder_window, constraints.get("segments"))
+    avoid_order = constraints.get("avoid_order")
+    if avoid_order is not None and order == [i for i in avoid_order if unit_blocks[i]]:
+        order = sorted(order)  # 앞당기기 결과가 원래 순서면 셔플된 순서 그대로 배치
+    blocks = [b for idx in order for b in unit_blocks[idx]]
+    starts = pack_columns([b["height"] for b in blocks], capacity, spacing)
+
+    pages: List[Dict[str, Any]] = [{"page_id": 0, "items": []}]
+    for col_idx, start in enumerate(starts):
+        end = starts[col_idx + 1] if col_idx + 1 < len(starts) else len(blocks)
+        page_id, column = divmod(col_idx, columns_per_page)
+        while len(pages) <= page_id:
+            pages.append({"page_id": len(pages), "items": []})
+        x = float(geo["column_x_pos"][column])
+        y = float(geo["content_start_y"])
+        for block in blocks[start:end]:
+            for item_type, path, w, h in block["items"]:
+                pages[page_id]["items"].append({
+                    "type": item_type,
+                    "image_path": path,
+                    "page": page_id,
+                    "column": column,
+                    "x": x,
+                    "y": y,
+                    "w": float(w),
+                    "h": float(h),
+                    "unit": block["unit"],
+                })
+                y += h + spacing
+    return {"pages": pages, "unit_order": order}
+
+
+def annotate_fill_ratios(placement_map: Dict[str, Any], geo: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds per-page `fill_ratio` (used / available column height) and a summary."""
+    capacity = geo["page_height"] - geo["margin"] - geo["content_start_y"]
+    columns_per_page = 2 if geo["two_column_layout"] else 1
+    ratios = []
+    for page in placement_map["pages"]:
+        used = 0.0
+        for column in range(columns_per_page):
+            items = [it for it in page["items"] if it["column"] == column]
+            if items:
+                used += min(capacity, sum(it["h"] for it in items) + geo["spacing"] * (len(items) - 1))
+        page["fill_ratio"] = used / (capacity * columns_per_page) if capacity > 0 else 0.0
+        ratios.append(page["fill_ratio"])
+    placement_map["summary"] = {
+        "page_count": len(ratios),
+        "mean_fill_ratio": sum(ratios) / len(ratios) if ratios else 0.0,
+    }
+    return placement_map
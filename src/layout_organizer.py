@@ -1,41 +1,219 @@
+import math
 import random
-from typing import List, Dict, Any
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
 Component = Dict[str, Any]
 LogicalUnit = List[Component]
 
-def shuffle_logical_units(logical_units: List[LogicalUnit], seed: int | None = None) -> List[LogicalUnit]:
+
+@dataclass(frozen=True)
+class ShuffleConstraints:
     """
-    '문제 세트' 단위로 1차 셔플하고, 각 세트 내부의 'question_block'만 2차 셔플합니다.
-    header/passage는 세트 선두 고정, attachments는 블록과 동반 이동합니다.
+    셔플 제약 조건. 인덱스는 shuffle_logical_units에 넘긴 logical_units 기준입니다.
+    - pinned: 제자리에 고정할 유닛 (그룹에 속한 유닛을 고정하면 그룹 전체가 고정)
+    - groups: 항상 연속으로 붙어 다녀야 하는 유닛 묶음 (예: 화법과 작문, 문법 영역)
+    - shuffle_questions: 유닛 내부 question_block 순서도 섞을지 여부
+    - shuffle_within_groups: 그룹 내부 유닛 순서도 섞을지 여부
+    - exclude_original: 원래 순서와 완전히 같은 배열은 만들지 않음
+    """
+    pinned: Tuple[int, ...] = ()
+    groups: Tuple[Tuple[int, ...], ...] = ()
+    shuffle_questions: bool = True
+    shuffle_within_groups: bool = True
+    exclude_original: bool = True
+
+
+def section_groups(logical_units: List[LogicalUnit], keywords: Sequence[str]) -> Tuple[Tuple[int, ...], ...]:
+    """
+    컴포넌트 text_content에 키워드(예: "화법과 작문", "문법")가 들어 있는 유닛들을 키워드별 그룹으로 묶습니다.
+    한 유닛은 먼저 나온 키워드 하나에만 속합니다.
+    """
+    groups: Dict[str, List[int]] = {}
+    for idx, unit in enumerate(logical_units):
+        text = " ".join(c.get('text_content') or "" for c in unit)
+        for keyword in keywords:
+            if keyword and keyword in text:
+                groups.setdefault(keyword, []).append(idx)
+                break
+    return tuple(tuple(g) for g in groups.values() if len(g) > 1)
+
+
+def _split_unit(unit: LogicalUnit) -> Tuple[List[Component], List[Component]]:
+    """header/passage(+알 수 없는 타입)는 선두 고정, question_block은 셔플 대상."""
+    fixed_prefix: List[Component] = []
+    questions: List[Component] = []
+    for component in unit:
+        if component.get('label') == 'question_block':
+            questions.append(component)
+        else:
+            fixed_prefix.append(component)
+    return fixed_prefix, questions
+
+
+def _unrank_permutation(rank: int, n: int) -> List[int]:
+    """rank(0 <= rank < n!)번째 순열 (Lehmer code). rank 0은 항등 순열."""
+    pool = list(range(n))
+    perm = []
+    for i in range(n, 0, -1):
+        f = math.factorial(i - 1)
+        digit, rank = divmod(rank, f)
+        perm.append(pool.pop(digit))
+    return perm
+
+
+class OrderingSpace:
+    """
+    제약을 만족하는 모든 배열을 0..size-1 정수에 일대일 대응시킵니다 (혼합 기수 + 순열 rank).
+    서로 다른 rank는 곧 서로 다른 배열입니다. rank 0은 그룹을 한데 모은 원래 순서로, 그룹 구성원이
+    원래부터 연속(그룹에 적힌 순서)일 때만 원래 순서와 같습니다.
+    """
+
+    def __init__(self, logical_units: List[LogicalUnit], constraints: ShuffleConstraints):
+        self.units: Dict[int, Tuple[List[Component], List[Component]]] = {}
+        for idx, unit in enumerate(logical_units):
+            if not unit or unit[0].get('label') == 'footer':
+                continue
+            if unit[0].get('label') in ('header', 'passage', 'question_block'):
+                self.units[idx] = _split_unit(unit)
+
+        # 이동 단위(item): 그룹 하나 또는 그룹에 속하지 않은 유닛 하나, 원래 순서대로
+        group_of: Dict[int, int] = {}
+        groups: List[List[int]] = []
+        for group in constraints.groups:
+            members = [i for i in group if i in self.units and i not in group_of]
+            if members:
+                for i in members:
+                    group_of[i] = len(groups)
+                groups.append(members)
+        self.items: List[List[int]] = []
+        seen_groups = set()
+        for idx in self.units:
+            if idx in group_of:
+                g = group_of[idx]
+                if g not in seen_groups:
+                    seen_groups.add(g)
+                    self.items.append(groups[g])
+            else:
+                self.items.append([idx])
+        pinned = set(constraints.pinned)
+        self.pinned_slots = [s for s, item in enumerate(self.items) if pinned.intersection(item)]
+        self.free_slots = [s for s in range(len(self.items)) if s not in set(self.pinned_slots)]
+
+        # 혼합 기수의 각 자리: (종류, 키, n) — 자리 값은 n! 미만
+        self.digits: List[Tuple[str, int, int]] = [("items", 0, len(self.free_slots))]
+        if constraints.shuffle_within_groups:
+            self.digits += [("group", s, len(item)) for s, item in enumerate(self.items) if len(item) > 1]
+        if constraints.shuffle_questions:
+            self.digits += [("questions", idx, len(q)) for idx, (_, q) in self.units.items() if len(q) > 1]
+        self.size = 1
+        for _, _, n in self.digits:
+            self.size *= math.factorial(n)
+        # 흩어져 있던 그룹을 모으면 원래 순서는 어떤 rank로도 나오지 않으므로 제외할 배열이 없음
+        self.exclude_original = constraints.exclude_original and \
+            [idx for item in self.items for idx in item] == list(self.units)
+
+    @property
+    def variant_count(self) -> int:
+        """만들 수 있는 서로 다른 배열 수 (원래 순서 제외 옵션 반영)."""
+        return self.size - 1 if self.exclude_original else self.size
+
+    def unrank(self, rank: int) -> List[LogicalUnit]:
+        return self.arrange(rank)[0]
+
+    def arrange(self, rank: int) -> Tuple[List[LogicalUnit], Dict[str, Any]]:
+        """
+        rank번째 배열과, 배치 단계(layout_engine)가 유닛을 앞당길 때 지켜야 할 제약:
+        - segments: 결과 유닛별 구간 번호. 같은 번호가 연속된 구간 안에서만 순서를 바꿀 수 있음
+          (고정 유닛은 각자 한 구간, 그룹은 그룹 하나가 한 구간, 나머지는 고정/그룹 사이의 자유 구간)
+        - avoid_order: 결과 위치를 이 순서로 놓으면 원래 순서가 되므로 피해야 할 배치 (해당 없으면 None)
+        """
+        perms: Dict[Tuple[str, int], List[int]] = {}
+        for kind, key, n in self.digits:
+            rank, digit = divmod(rank, math.factorial(n))
+            perms[(kind, key)] = _unrank_permutation(digit, n)
+
+        slot_order = list(range(len(self.items)))
+        for target, source in zip(self.free_slots, perms[("items", 0)]):
+            slot_order[target] = self.free_slots[source]
+
+        ordered: List[LogicalUnit] = []
+        sources: List[int] = []
+        segments: List[int] = []
+        segment = -1
+        previous_free = False
+        questions_moved = False
+        pinned_slots = set(self.pinned_slots)
+        for target, slot in enumerate(slot_order):
+            item = self.items[slot]
+            members = [item[i] for i in perms[("group", slot)]] if ("group", slot) in perms else item
+            free = target not in pinned_slots and len(item) == 1
+            movable_group = target not in pinned_slots and ("group", slot) in perms
+            shared = free or movable_group  # 구성원이 한 구간을 같이 쓰는지
+            if shared and not (free and previous_free):
+                segment += 1
+            for idx in members:
+                if not shared:
+                    segment += 1  # 고정 유닛, 내부 순서가 고정된 그룹의 유닛은 각자 한 구간
+                prefix, questions = self.units[idx]
+                if ("questions", idx) in perms:
+                    order = perms[("questions", idx)]
+                    questions = [questions[i] for i in order]
+                    questions_moved = questions_moved or order != sorted(order)
+                ordered.append(prefix + questions)
+                sources.append(idx)
+                segments.append(segment)
+            previous_free = free
+        avoid_order = None
+        if self.exclude_original and not questions_moved:
+            avoid_order = sorted(range(len(sources)), key=lambda p: sources[p])
+        return ordered, {"segments": segments, "avoid_order": avoid_order}
+
+    def sample_ranks(self, k: int, rng: random.Random) -> List[int]:
+        """
+        서로 다른 rank k개를 한 번에 고릅니다 (거절 샘플링 없음):
+        임의 시작점 + 범위 크기와 서로소인 임의 보폭의 등차수열 (mod 범위).
+        """
+        count = self.variant_count
+        if count == 0 and k <= 1:
+            return [0] * k  # 섞을 수 있는 것이 없으면 원래 순서 그대로
+        if k > count:
+            raise ValueError(f"제약 조건에서 가능한 서로 다른 배열은 {count}개뿐입니다 (요청: {k}).")
+        offset = 1 if self.exclude_original else 0
+        start = rng.randrange(count)
+        stride = rng.randrange(1, count) if count > 1 else 1
+        while math.gcd(stride, count) != 1:
+            stride += 1
+        return [offset + (start + i * stride) % count for i in range(k)]
+
+
+def generate_orderings(logical_units: List[LogicalUnit], k: int, seed: int | None = None,
+                       constraints: Optional[ShuffleConstraints] = None) -> List[List[LogicalUnit]]:
+    """
+    제약을 만족하며 서로 모두 다른 셔플 결과 k개를 만듭니다. 같은 seed면 항상 같은 결과입니다.
+    k가 가능한 배열 수보다 크면 ValueError.
     """
+    space = OrderingSpace(logical_units, constraints or ShuffleConstraints())
     rng = random.Random(seed)
-    shufflable_units: List[LogicalUnit] = []
-
-    for unit in logical_units:
-        if not unit:
-            continue
-        first_label = unit[0].get('label')
-        if first_label == 'footer':
-            continue
-
-        if first_label in ['header', 'passage', 'question_block']:
-            fixed_prefix: List[Component] = []
-            questions_to_shuffle: List[Component] = []
-
-            for component in unit:
-                if component.get('label') in ['header', 'passage']:
-                    fixed_prefix.append(component)
-                elif component.get('label') == 'question_block':
-                    questions_to_shuffle.append(component)
-                else:
-                    # unknown types follow prefix (rare)
-                    fixed_prefix.append(component)
-
-            rng.shuffle(questions_to_shuffle)
-
-            new_unit = fixed_prefix + questions_to_shuffle
-            shufflable_units.append(new_unit)
-
-    rng.shuffle(shufflable_units)
-    return shufflable_units
\ No newline at end of file
+    return [space.unrank(rank) for rank in space.sample_ranks(k, rng)]
+
+
+def shuffle_logical_units(logical_units: List[LogicalUnit], seed: int | None = None,
+                          constraints: Optional[ShuffleConstraints] = None) -> List[LogicalUnit]:
+    """
+    '문제 세트' 단위로 1차 셔플하고, 각 세트 내부의 'question_block'만 2차 셔플합니다.
+    header/passage는 세트 선두 고정, attachments는 블록과 동반 이동합니다. footer 유닛은 제외됩니다.
+    제약을 만족하는 배열 중 하나를 균등하게 고르며, generate_orderings(..., k=1, seed)의 첫 결과와 같습니다.
+    """
+    return generate_orderings(logical_units, 1, seed, constraints)[0]
+
+
+def shuffle_for_layout(logical_units: List[LogicalUnit], seed: int | None = None,
+                       constraints: Optional[ShuffleConstraints] = None) -> Tuple[List[LogicalUnit], Dict[str, Any]]:
+    """
+    shuffle_logical_units와 같은 결과에, 패킹 배치가 제약을 깨지 않도록 recombine cfg의
+    'layout_constraints'로 넘길 값({"segments", "avoid_order"})을 함께 돌려줍니다.
+    """
+    space = OrderingSpace(logical_units, constraints or ShuffleConstraints())
+    rank = space.sample_ranks(1, random.Random(seed))[0]
+    return space.arrange(rank)
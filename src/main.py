@@ -2,119 +2,311 @@ import os
 import json
 import glob
 import shutil
-from typing import Dict, Any, List
-
-from PIL import Image
-from ultralytics import YOLO
+import time
+import random
+from typing import Dict, Any, List, Optional, Callable, Tuple
 
 from src.annotation_processor import process_annotations_from_json
-from src.layout_organizer import shuffle_logical_units
+from src.layout_organizer import shuffle_for_layout, section_groups, ShuffleConstraints
 from src.pdf_recombiner import recombine_pdf
 from src.pdf_processor import convert_pdfs_to_pngs
-from src.config import Config
+from src.pdf_text_layer import layer_summary
+from src.config import PipelineContext, get_pipeline_context
+from src.inference import get_detector, detector_call_lock, results_to_annotations, detect_tiled
+from src.detection_cache import get_detection_cache, model_version, page_pixel_hash
+from src.image_io import save_image
+from src.crop_store import get_crop_store, file_digest
+from src.detection_store import get_detection_store, TUNABLE_SETTINGS
+from src.search_index import get_search_index
+from src.checkpoints import StageCheckpoints, config_params
+from src.profiling import SamplingProfiler, enter_stage
+
+# 단계별 체크포인트 지문에 들어가는 설정 (이름 끝의 *는 접두사)
+RENDER_SETTINGS = ("DPI", "PDF_STANDARD_DPI", "PAGE_FILTER_*", "PAGE_BLANK_*", "PAGE_MEMO_*", "PAGE_DUPLICATE_*",
+                   "PAGE_COVER_*", "PAGE_ANSWER_SHEET_*", "TEXT_LAYER_*")
+DETECT_SETTINGS = ("CLASS_NAMES", "DETECTION_FLOOR_CONF", "DETECTION_TIL*", "DETECTION_BATCH_SIZE", "DETECTION_STORE_ENABLED")
+GROUP_SETTINGS = TUNABLE_SETTINGS + ("CROP_STORE_*",)
+SHUFFLE_SETTINGS = ("SHUFFLE_*",)
+
+def _page_images(image_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(image_dir, '**', '*.png'), recursive=True) +
+                  glob.glob(os.path.join(image_dir, '**', '*.jpg'), recursive=True) +
+                  glob.glob(os.path.join(image_dir, '**', '*.jpeg'), recursive=True))
+
+def _read_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_json(path: str, data: Any):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
 
-def run_pipeline(input_pdf_path: str, request_id: str) -> str:
-    """주어진 PDF를 셔플하여 새로운 PDF로 저장합니다."""
+def warm_up(context: Optional[PipelineContext] = None, load_model: bool = True) -> float:
+    """
+    무거운 백엔드(PIL, PyMuPDF, numpy, ultralytics/torch)를 미리 import하고 검출기를 한 번 로드합니다.
+    모듈 import 시점에는 아무것도 로드하지 않으므로, 웹 워커는 startup 훅에서 이 함수를 호출합니다.
+    """
+    start = time.perf_counter()
+    import fitz  # noqa: F401
+    import numpy  # noqa: F401
+    from PIL import Image  # noqa: F401
+    if load_model:
+        try:
+            get_detector(context or get_pipeline_context())
+        except Exception as e:
+            print(f"[warm_up] 검출기 로드 실패: {e}")
+    elapsed = time.perf_counter() - start
+    print(f"[warm_up] 백엔드 준비 완료 ({elapsed:.2f}s)")
+    return elapsed
+
+def run_pipeline(input_pdf_path: str, request_id: str, context: Optional[PipelineContext] = None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 seed: Optional[int] = None, profile: bool = False) -> str:
+    """
+    주어진 PDF를 셔플하여 새로운 PDF로 저장합니다.
+    context를 넘기면 공유 PipelineContext에서 요청별 복사본만 만들어 사용합니다.
+    on_progress에는 단계 시작({"event": "stage", ...})과 페이지 단위 진행 이벤트가 전달됩니다.
+    seed가 같으면 같은 PDF에 대해 항상 같은 순서가 나옵니다. 없으면 새로 뽑아 "shuffled" 이벤트로 알립니다.
+    profile=True면 샘플링 프로파일러로 실행하고 결과를 debug/에 남깁니다 (실패한 실행도 포함, src/profiling.py).
+    """
+    if not profile:
+        return _run_pipeline(input_pdf_path, request_id, context, on_progress, seed)
+
+    config = (context or get_pipeline_context()).for_request(request_id)
+    profiler = SamplingProfiler(request_id, config.PROFILE_SAMPLE_INTERVAL_MS).start()
+    try:
+        return _run_pipeline(input_pdf_path, request_id, context, on_progress, seed)
+    finally:
+        profiler.stop()
+        debug_dir = os.path.join(config.PROCESSED_DATA_DIR, "debug")
+        summary = profiler.save(debug_dir)
+        print(f"[profile] {summary['duration_s']:.2f}s, 샘플 {summary['sampled_s']:.2f}s → {debug_dir}")
+        if on_progress:
+            on_progress({"event": "profile_saved", "request_id": request_id,
+                         "spans": [s for s in summary["spans"] if s["depth"] == 0], "top_self": summary["top_self"][:5]})
+
+def _run_pipeline(input_pdf_path: str, request_id: str, context: Optional[PipelineContext],
+                  on_progress: Optional[Callable[[Dict[str, Any]], None]], seed: Optional[int]) -> str:
     print(f"Running pipeline for request: {request_id}")
 
-    config = Config()
-    config.set_request_id(request_id)
+    def emit(event: Dict[str, Any]):
+        if on_progress:
+            on_progress(event)
+
+    def stage(step: int, name: str):
+        emit({"event": "stage", "step": step, "total_steps": 5, "stage": name})
+        enter_stage(name)
+
+    from PIL import Image
+
+    config = (context or get_pipeline_context()).for_request(request_id)
 
     # Create a temporary directory for the uploaded file
-    temp_raw_dir = os.path.join(config.PROJECT_ROOT, "uploads", request_id, "raw")
+    temp_raw_dir = os.path.join(config.UPLOADS_DIR, request_id, "raw")
     os.makedirs(temp_raw_dir, exist_ok=True)
     shutil.copy(input_pdf_path, os.path.join(temp_raw_dir, os.path.basename(input_pdf_path)))
 
+    # 같은 request_id로 다시 실행하면 입력이 그대로인 앞 단계는 체크포인트에서 이어받습니다 (src/checkpoints.py)
+    exam_id = file_digest(input_pdf_path)
+    checkpoints = StageCheckpoints(
+        config.PROCESSED_DATA_DIR, enabled=config.PIPELINE_CHECKPOINTS,
+        on_resume=lambda name, cp: emit({"event": "stage_resumed", "stage": name, "saved_seconds": round(cp["elapsed"], 2)}))
+    text_layers_path = os.path.join(config.PROCESSED_DATA_DIR, "text_layers.json")
+    logical_units_path = os.path.join(config.PROCESSED_DATA_DIR, "debug", "logical_units.json")
+    shuffled_units_path = os.path.join(config.PROCESSED_DATA_DIR, "shuffled_units.json")
+
     # --- Step 0: PDF to PNG Conversion ---
     print("\n[0/4] PDF를 PNG 이미지로 변환...")
-    convert_pdfs_to_pngs(config, temp_raw_dir)
+    stage(0, "render_pages")
+
+    def render_pages():
+        skipped: List[Dict[str, Any]] = []
+        layers = convert_pdfs_to_pngs(config, temp_raw_dir, skipped)
+        _write_json(text_layers_path, layers)
+        return {"skipped_pages": skipped}, _page_images(config.IMAGE_DIR) + [text_layers_path]
+
+    rendered = checkpoints.run("render_pages", {"pdf": exam_id, "page_policy": config.image_policy("page"),
+                                                **config_params(config, RENDER_SETTINGS)}, render_pages)
+    skipped_pages: List[Dict[str, Any]] = rendered["skipped_pages"]
+    if skipped_pages:
+        emit({"event": "pages_skipped", "pages": [{"page": p["page"], "reason": p["reason"]} for p in skipped_pages]})
     print("PDF to PNG conversion complete.")
 
     # --- Step 1: YOLOv8 Inference and Annotation JSON Generation ---
     print("\n[1/4] YOLOv8 추론 및 어노테이션 JSON 생성...")
-    model = YOLO(config.YOLO_MODEL_PATH)
-
-    all_image_annotations: List[Dict[str, Any]] = []
-    image_files = glob.glob(os.path.join(config.IMAGE_DIR, '**', '*.png'), recursive=True) + \
-                  glob.glob(os.path.join(config.IMAGE_DIR, '**', '*.jpg'), recursive=True) + \
-                  glob.glob(os.path.join(config.IMAGE_DIR, '**', '*.jpeg'), recursive=True)
-
-    if not image_files:
-        raise FileNotFoundError(f"No image files found in {config.IMAGE_DIR}. Please ensure images are present.")
-    
-    print(f"Found {len(image_files)} images for inference.")
-    for image_path in sorted(image_files):
-        results = model(image_path, conf=0.3)
-
-        image_annotations: Dict[str, Any] = {
-            "image_path": image_path,
-            "annotations": []
-        }
-
-        for r in results:
-            im_bgr = r.plot()
-            im_rgb = Image.fromarray(im_bgr[..., ::-1])
-            output_dir_detected = config.INFERENCE_RESULTS_DIR
-            os.makedirs(output_dir_detected, exist_ok=True)
-            output_filename_detected = os.path.basename(image_path).rsplit('.',1)[0] + "_detected.png"
-            output_filepath_detected = os.path.join(output_dir_detected, output_filename_detected)
-            im_rgb.save(output_filepath_detected)
-
-            for *xyxy, conf, cls in r.boxes.data:
-                x_min, y_min, x_max, y_max = map(float, xyxy)
-                label = config.CLASS_NAMES.get(int(cls), "unknown")
-                annotation = {
-                    "label": label,
-                    "bbox": [x_min, y_min, x_max, y_max],
-                    "confidence": float(conf),
-                    "text_content": "",
-                }
-                image_annotations["annotations"].append(annotation)
-
-        all_image_annotations.append(image_annotations)
-
-    with open(config.SAMPLE_ANNOTATIONS_PATH, 'w', encoding='utf-8') as f:
-        json.dump(all_image_annotations, f, ensure_ascii=False, indent=2)
-
-    print(f"All annotations saved to {config.SAMPLE_ANNOTATIONS_PATH}")
+    stage(1, "detect")
+
+    def detect():
+        text_layers = _read_json(text_layers_path)
+        cache = get_detection_cache(config)
+        model_ver = model_version(config.YOLO_MODEL_PATH) if cache else None
+
+        all_image_annotations: List[Dict[str, Any]] = []
+        image_files = _page_images(config.IMAGE_DIR)
+
+        if not image_files:
+            raise FileNotFoundError(f"No image files found in {config.IMAGE_DIR}. Please ensure images are present.")
+
+        def apply_text_layer(image_annotations: Dict[str, Any]):
+            # 텍스트가 있는 페이지: 문항 번호/안내문/꼬리말은 후처리에서 YOLO 결과 대신 PDF 텍스트를 사용
+            layer = text_layers.get(image_annotations["image_path"])
+            image_annotations["text_layer"] = layer_summary(layer)
+            if layer is not None:
+                image_annotations["text_layer_annotations"] = layer["annotations"]
+                image_annotations["text_lines"] = layer["lines"]
+
+        def finish_page(page_index: int, cache_key: Optional[str], annotations: List[Dict[str, Any]]):
+            image_annotations = all_image_annotations[page_index]
+            image_annotations["annotations"] = annotations
+            if cache_key:
+                cache.put(cache_key, annotations)
+            apply_text_layer(image_annotations)
+            emit({"event": "page_detected", "page": page_index, "total": len(image_files),
+                  "cache": image_annotations.get("detection_cache")})
+
+        if config.DETECTION_TILING:
+            # 타일 결과는 일반 검출과 다르므로 캐시 키에 타일 설정을 포함
+            model_ver = model_ver and (f"{model_ver}|tiles:{config.DETECTION_TILE_SIZE}:{config.DETECTION_TILE_OVERLAP}"
+                                       f":{config.DETECTION_TILE_FULL_PAGE_PASS}")
+
+        print(f"Found {len(image_files)} images for inference.")
+        pending: List[Tuple[int, Optional[str]]] = []  # (page_index, cache_key) of pages to detect
+        for page_index, image_path in enumerate(image_files):
+            image_annotations: Dict[str, Any] = {
+                "image_path": image_path,
+                "annotations": []
+            }
+            all_image_annotations.append(image_annotations)
+
+            cache_key = None
+            if cache:
+                cache_key = cache.make_key(page_pixel_hash(image_path), model_ver, config.DETECTION_FLOOR_CONF)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    image_annotations["detection_cache"] = "hit"
+                    finish_page(page_index, None, cached)
+                    continue
+                image_annotations["detection_cache"] = "miss"
+            pending.append((page_index, cache_key))
+
+        if pending:
+            model = get_detector(config)
+
+        if pending and config.DETECTION_TILING:
+            # 모든 페이지의 타일을 배치로 묶어 검출 (ultralytics plot 대신 debug/의 필터 오버레이 참고)
+            paths = [all_image_annotations[page_index]["image_path"] for page_index, _ in pending]
+            with detector_call_lock:
+                detect_tiled(model, paths, config,
+                             on_page_done=lambda i, annotations: finish_page(pending[i][0], pending[i][1], annotations))
+        else:
+            for page_index, cache_key in pending:
+                image_path = all_image_annotations[page_index]["image_path"]
+                with detector_call_lock:
+                    results = model(image_path, conf=config.DETECTION_FLOOR_CONF)
+
+                annotations: List[Dict[str, Any]] = []
+                for r in results:
+                    im_bgr = r.plot()
+                    im_rgb = Image.fromarray(im_bgr[..., ::-1])
+                    output_dir_detected = config.INFERENCE_RESULTS_DIR
+                    os.makedirs(output_dir_detected, exist_ok=True)
+                    output_filename_detected = os.path.basename(image_path).rsplit('.',1)[0] + "_detected"
+                    save_image(im_rgb, os.path.join(output_dir_detected, output_filename_detected), config.image_policy("overlay"))
+
+                    annotations.extend(results_to_annotations(r, config))
+                finish_page(page_index, cache_key, annotations)
+
+        with open(config.SAMPLE_ANNOTATIONS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(all_image_annotations, f, ensure_ascii=False, indent=2)
+
+        print(f"All annotations saved to {config.SAMPLE_ANNOTATIONS_PATH}")
+
+        detection_store = get_detection_store(config)
+        if detection_store is not None:
+            # 하한 신뢰도의 원시 박스를 저장해 두면 임계값은 검출 없이 재조정 가능 (python -m src.detection_store)
+            for image_annotations in all_image_annotations:
+                with Image.open(image_annotations["image_path"]) as img:
+                    image_annotations["image_size"] = list(img.size)
+            detection_store.save(exam_id, all_image_annotations, config,
+                                 filename=os.path.basename(input_pdf_path), skipped_pages=skipped_pages)
+        return {"pages": len(image_files)}, [config.SAMPLE_ANNOTATIONS_PATH]
+
+    detected = checkpoints.run("detect", {"model": model_version(config.YOLO_MODEL_PATH),
+                                          **config_params(config, DETECT_SETTINGS)}, detect)
 
     # --- Step 2: Process Annotations and Group Logical Units ---
     print("\n[2/4] 어노테이션 처리 및 논리적 단위 그룹화...")
-    logical_units = process_annotations_from_json(
-        config.SAMPLE_ANNOTATIONS_PATH,
-        config.CROPPED_COMPONENTS_DIR,
-        config
-    )
+    stage(2, "group")
+
+    def group():
+        store = get_crop_store(config)
+        if store is not None:
+            store.register_exam(exam_id, os.path.basename(input_pdf_path), detected["pages"])
+        units = process_annotations_from_json(
+            config.SAMPLE_ANNOTATIONS_PATH,
+            config.CROPPED_COMPONENTS_DIR,
+            config,
+            exam_id=exam_id,
+            skipped_pages=skipped_pages
+        )
+        crops = [item["image_path"] for u in units for c in u for item in [c, *c.get("attachments", [])]]
+        return {"units": len(units)}, [logical_units_path] + crops
+
+    checkpoints.run("group", {"crop_policy": config.image_policy("crop"),
+                              **config_params(config, GROUP_SETTINGS)}, group)
+    logical_units = _read_json(logical_units_path)
     print(f"-> {len(logical_units)}개의 논리적 단위를 생성했습니다.")
+    search_index = get_search_index(config)
+    if search_index is not None:
+        # 체크포인트로 group을 건너뛴 경우에도 색인은 logical_units.json 기준으로 최신 상태 유지
+        indexed = search_index.index_exam(exam_id, os.path.basename(input_pdf_path), logical_units)
+        print(f"-> 검색 색인: 텍스트가 있는 구성요소 {indexed}개")
 
     # --- Step 3: Shuffle Logical Units ---
     print("\n[3/4] 논리적 단위 셔플하기...")
-    shuffled_units = shuffle_logical_units(logical_units)
-    print(f"-> {len(shuffled_units)}개의 유닛을 셔플했습니다.")
+    stage(3, "shuffle")
+
+    def shuffle():
+        run_seed = seed if seed is not None else random.SystemRandom().randrange(2**31)
+        constraints = ShuffleConstraints(groups=section_groups(logical_units, config.SHUFFLE_SECTION_KEYWORDS),
+                                         exclude_original=config.SHUFFLE_EXCLUDE_ORIGINAL)
+        units, layout_constraints = shuffle_for_layout(logical_units, seed=run_seed, constraints=constraints)
+        _write_json(shuffled_units_path, units)
+        return {"seed": run_seed, "section_groups": len(constraints.groups),
+                "layout_constraints": layout_constraints}, [shuffled_units_path]
+
+    # seed 없이 재시도하면 처음 뽑은 seed를 그대로 이어받음
+    shuffled = checkpoints.run("shuffle", {"seed": seed, **config_params(config, SHUFFLE_SETTINGS)}, shuffle)
+    shuffled_units = _read_json(shuffled_units_path)
+    emit({"event": "shuffled", "seed": shuffled["seed"], "units": len(shuffled_units),
+          "section_groups": shuffled["section_groups"]})
+    print(f"-> {len(shuffled_units)}개의 유닛을 셔플했습니다. (seed={shuffled['seed']})")
 
     # --- Step 4: Recombine PDF ---
     print("\n[4/4] PDF 파일로 재조합하기...")
-    recombine_pdf_cfg = {
-        "page_size": (config.DEFAULT_PAGE_WIDTH_PT, config.DEFAULT_PAGE_HEIGHT_PT),
-        "margin": config.top_margin_pt,
-        "spacing_between_components": config.gutter_margin_pt,
-        "header_y_position": config.header_height_pt,
-        "header_line_width": 0.5,
-        "two_column_layout": True,
-        "column_line_width": 0.5,
-        "image_scale_factor": 1.0,
-        "start_question_number": 1,
-        "question_number_font_size": 12,
-        "question_number_offset_x": 10,
-        "question_number_offset_y": 12
-    }
-    recombine_pdf(
-        config.RECOMBINED_PDF_OUTPUT_PATH,
-        shuffled_units,
-        recombine_pdf_cfg
-    )
+    stage(4, "recombine")
+
+    def recombine():
+        # 배치 단계의 유닛 앞당기기가 고정/그룹/원래 순서 제외 제약을 깨지 않도록 함께 넘김
+        # (이전 형식의 체크포인트에는 없으므로 그때는 앞당기지 않음)
+        layout_constraints = shuffled.get("layout_constraints")
+        cfg = dict(config.recombine_cfg(), layout_constraints=layout_constraints)
+        if layout_constraints is None:
+            cfg["layout_reorder_window"] = 0
+        recombine_pdf(
+            config.RECOMBINED_PDF_OUTPUT_PATH,
+            shuffled_units,
+            cfg,
+            on_progress=on_progress
+        )
+        return {}, [config.RECOMBINED_PDF_OUTPUT_PATH]
+
+    checkpoints.run("recombine", {"recombine": config.recombine_cfg()}, recombine)
 
     pdf_path = os.path.abspath(config.RECOMBINED_PDF_OUTPUT_PATH)
+    if checkpoints.reused:
+        print(f"체크포인트에서 이어받은 단계: {', '.join(checkpoints.reused)}")
     print(f"\n모든 작업이 완료되었습니다. 최종 PDF: {pdf_path}")
     return pdf_path
 
@@ -125,6 +317,11 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="PDF 셔플 파이프라인 실행")
     parser.add_argument("--pdf", type=str, help="입력 PDF 파일 경로", required=True)
+    parser.add_argument("--seed", type=int, default=None, help="셔플 seed (같은 seed → 같은 순서)")
+    parser.add_argument("--request-id", type=str, default=None,
+                        help="이전 실행의 작업 공간에서 이어서 실행 (유효한 체크포인트 단계는 건너뜀)")
+    parser.add_argument("--profile", action="store_true", help="샘플링 프로파일러로 실행 (debug/profile.*)")
     args = parser.parse_args()
-    request_id = str(uuid.uuid4())
-    run_pipeline(args.pdf, request_id)
+    request_id = args.request_id or str(uuid.uuid4())
+    print(f"request_id: {request_id}")
+    run_pipeline(args.pdf, request_id, seed=args.seed, profile=args.profile)
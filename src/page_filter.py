@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-detection Page Filter
+
+Exam PDFs carry pages with nothing to extract: covers, blank or 메모 pages,
+answer sheets, and occasionally the same page twice. `PageFilter.classify`
+looks at each PDF page before it is rendered at full resolution and returns
+a skip reason, so those pages are neither rendered nor sent to the detector:
+
+-   "blank":        (almost) no ink on a small grayscale thumbnail
+-   "memo":         only a few characters of text (e.g. "메모")
+-   "answer_sheet": answer-sheet keywords (답안지, OMR ...)
+-   "cover":        cover keywords (수험 번호, 표지 ...)
+-   "duplicate":    same text as an earlier page of the same upload (hash of the
+                    text layer with whitespace removed) and a near-identical thumbnail;
+                    scans are compared by a perceptual hash (dHash) of a larger
+                    thumbnail, confirmed cell by cell so a small change keeps the page
+
+The text rules never skip a question page, i.e. one with a numbered line
+("3.") and a choice marker (①). Cover instructions are numbered but have no
+choices, and answer sheets have choice bubbles but no "N." lines. Text rules
+apply only to pages with a text layer; scans are checked for blank and
+duplicate pages only. Pages printed from one template (same boxes, different
+text) share a dHash, so for pages with a text layer the text decides.
+"""
+
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import Config
+from src.pdf_text_layer import QUESTION_NUMBER_RE
+
+CHOICE_MARKERS = "①②③④⑤"
+DUPLICATE_CELL_PX = 8  # 스캔 중복 확인 시 평균 밝기 차를 비교하는 칸 크기
+
+
+def dhash(gray, size: int = 16) -> int:
+    """Difference hash of a grayscale array: size*size bits (brighter-than-right-neighbour)."""
+    import numpy as np
+    from PIL import Image
+    small = np.asarray(Image.fromarray(gray).resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def shrink(gray, width: int):
+    """Grayscale array resized to `width` px wide (box filter, aspect ratio kept)."""
+    import numpy as np
+    from PIL import Image
+    height = max(1, round(gray.shape[0] * width / gray.shape[1]))
+    return np.asarray(Image.fromarray(gray).resize((width, height), Image.BOX))
+
+
+def max_cell_diff(a, b, cell: int = DUPLICATE_CELL_PX) -> float:
+    """Largest mean absolute difference over cell x cell blocks of two same-shape grayscale arrays."""
+    import numpy as np
+    h, w = (a.shape[0] // cell) * cell, (a.shape[1] // cell) * cell
+    diff = np.abs(a[:h, :w].astype(np.int16) - b[:h, :w]).astype(np.float32)
+    return float(diff.reshape(h // cell, cell, w // cell, cell).mean(axis=(1, 3)).max())
+
+
+class PageFilter:
+    """Classifies the pages of one upload; keeps the hashes of kept pages for duplicate checks."""
+
+    def __init__(self, config: Config):
+        self.config = config
+        # (텍스트 해시 또는 스캔이면 None, dHash, 썸네일, page ref)
+        self._kept: List[Tuple[Optional[str], int, Any, Dict[str, Any]]] = []
+
+    def _thumbnail(self, page, width: int):
+        import fitz  # PyMuPDF
+        import numpy as np
+        zoom = width / max(1.0, page.rect.width)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+    def classify(self, page, ref: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        (skip reason or None, stats). `ref` identifies the page in the report (e.g. pdf + page number)
+        and is recorded as `duplicate_of` for later copies of a kept page.
+        """
+        config = self.config
+
+        text = page.get_text("text")
+        chars = len("".join(text.split()))
+        numbers = 0
+        for line in text.splitlines():
+            match = QUESTION_NUMBER_RE.match(line)
+            if match and 1 <= int(match.group(1)) <= config.TEXT_LAYER_MAX_QUESTION_NUMBER:
+                numbers += 1
+        choices = sum(text.count(c) for c in CHOICE_MARKERS)
+        if chars:
+            thumb = self._thumbnail(page, config.PAGE_FILTER_THUMB_WIDTH)
+        else:  # 스캔: 중복 확인용 큰 썸네일을 한 번만 렌더링하고 잉크 비율은 축소본으로 계산
+            large = self._thumbnail(page, config.PAGE_DUPLICATE_THUMB_WIDTH)
+            thumb = shrink(large, config.PAGE_FILTER_THUMB_WIDTH)
+        ink_ratio = float((thumb < 200).mean())
+        stats = {"chars": chars, "question_numbers": numbers, "choice_markers": choices,
+                 "images": len(page.get_images(full=False)), "ink_ratio": round(ink_ratio, 5)}
+        question_page = numbers > 0 and choices > 0
+
+        def has_any(keywords) -> bool:
+            compact = "".join(text.split())
+            return any("".join(k.split()) in compact for k in keywords)
+
+        if chars and not question_page:
+            if has_any(config.PAGE_ANSWER_SHEET_KEYWORDS):
+                return "answer_sheet", stats
+            if has_any(config.PAGE_COVER_KEYWORDS):
+                return "cover", stats
+            if chars <= config.PAGE_MEMO_MAX_CHARS and stats["images"] == 0:
+                return "memo", stats
+        if ink_ratio <= config.PAGE_BLANK_MAX_INK_RATIO and not question_page:
+            return "blank", stats
+
+        # 텍스트 레이어가 있으면 텍스트가 같은 페이지끼리만 비교 (같은 양식의 페이지는 썸네일이 거의 같음)
+        text_hash = hashlib.sha1("".join(text.split()).encode("utf-8")).hexdigest() if chars else None
+        if text_hash is None:
+            thumb = large
+        h = dhash(thumb)
+        for kept_text_hash, kept_hash, kept_thumb, kept_ref in self._kept:
+            if kept_text_hash != text_hash or bin(h ^ kept_hash).count("1") > config.PAGE_DUPLICATE_MAX_HAMMING:
+                continue
+            if kept_thumb.shape == thumb.shape and \
+                    max_cell_diff(kept_thumb, thumb) <= config.PAGE_DUPLICATE_MAX_MEAN_DIFF:
+                stats["duplicate_of"] = kept_ref
+                return "duplicate", stats
+        self._kept.append((text_hash, h, thumb, ref))
+        return None, stats
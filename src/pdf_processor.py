@@ -1,13 +1,28 @@
-import fitz  # PyMuPDF
 import os
 import shutil
+from typing import Any, Dict, List, Optional
 from src.config import Config
+from src.image_io import save_pixmap
+from src.pdf_text_layer import extract_page_layer
+from src.page_filter import PageFilter
 
-def convert_pdfs_to_pngs(config: Config, input_dir: str):
+def convert_pdfs_to_pngs(config: Config, input_dir: str,
+                         skipped_pages: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
     """
-    Converts all PDF files in the input directory to PNG images, page by page.
+    Converts all PDF files in the input directory to images, page by page
+    (format and compression follow `config.image_policy("page")`).
+    With `TEXT_LAYER_ENABLED`, also returns {image path: text layer} for the
+    pages that carry text (see `src/pdf_text_layer.py`).
+    With `PAGE_FILTER_ENABLED`, blank/memo/cover/answer-sheet/duplicate pages
+    are not rendered (see `src/page_filter.py`); each gets a record
+    {"pdf", "page", "reason", "stats"} in `skipped_pages` if a list is given.
     """
+    import fitz  # PyMuPDF
+
+    text_layers: Dict[str, Dict[str, Any]] = {}
+
     output_dir = config.IMAGE_DIR
+    page_policy = config.image_policy("page")
 
     # Create or clear the output directory
     if os.path.exists(output_dir):
@@ -21,10 +36,10 @@ def convert_pdfs_to_pngs(config: Config, input_dir: str):
         pdf_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
         if not pdf_files:
             print(f"No PDF files found in {input_dir}")
-            return
+            return text_layers
     except FileNotFoundError:
         print(f"Error: Input directory not found at {input_dir}")
-        return
+        return text_layers
 
     print(f"Found {len(pdf_files)} PDF file(s) to process.")
 
@@ -35,26 +50,44 @@ def convert_pdfs_to_pngs(config: Config, input_dir: str):
         
         base_filename = os.path.splitext(pdf_filename)[0]
         print(f"Processing {pdf_filename}...")
+        page_filter = PageFilter(config) if config.PAGE_FILTER_ENABLED else None
+        skipped = 0
 
         # Iterate through each page of the PDF
         for page_num in range(len(pdf_document)):
             page = pdf_document.load_page(page_num)
+
+            if page_filter is not None:
+                # 렌더링 전에 표지/빈 페이지/답안지/중복 페이지를 걸러냄 (YOLO에 보내지 않음)
+                ref = {"pdf": pdf_filename, "page": page_num + 1}
+                reason, stats = page_filter.classify(page, ref)
+                if reason is not None:
+                    skipped += 1
+                    if skipped_pages is not None:
+                        skipped_pages.append({**ref, "reason": reason, "stats": stats})
+                    continue
             
             # Render page to an image (pixmap) with higher DPI
             zoom = config.DPI / config.PDF_STANDARD_DPI
             mat = fitz.Matrix(zoom, zoom)
             pix = page.get_pixmap(matrix=mat)
             
-            # Define the output image path
-            output_image_path = os.path.join(output_dir, f"{base_filename}_page_{page_num + 1}.png")
-            
-            # Save the image
-            pix.save(output_image_path)
+            # Save the image with the "page" encoding policy
+            output_image_base = os.path.join(output_dir, f"{base_filename}_page_{page_num + 1}")
+            image_path = save_pixmap(pix, output_image_base, page_policy)
+
+            if config.TEXT_LAYER_ENABLED:
+                layer = extract_page_layer(page, zoom, config)
+                if layer is not None:
+                    text_layers[image_path] = layer
             
-        print(f"  > Finished converting {len(pdf_document)} pages.")
+        print(f"  > Finished converting {len(pdf_document) - skipped} pages ({skipped} skipped).")
         pdf_document.close()
 
+    if config.TEXT_LAYER_ENABLED:
+        print(f"Text layer found on {len(text_layers)} page(s).")
     print("\nConversion complete.")
+    return text_layers
 
 if __name__ == "__main__":
     config = Config()
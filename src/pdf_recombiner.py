@@ -1,11 +1,15 @@
-import fitz  # PyMuPDF
-from PIL import Image, ImageDraw
 import os
 import json
-from typing import List, Dict, Any
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from src.image_io import save_image
+from src.layout_engine import scale_to_column, plan_packed_layout, annotate_fill_ratios
+from src.profiling import span
 
 Component = Dict[str, Any]
 LogicalUnit = List[Component]
+ProgressCallback = Callable[[Dict[str, Any]], None]
 
 PALETTE = {
     "header": (0, 0, 255),
@@ -15,82 +19,106 @@ PALETTE = {
     "other": (120, 120, 120),
 }
 
-def recombine_pdf(
-    output_pdf_path: str,
-    logical_units_to_place: List[LogicalUnit],
-    cfg: Dict[str, Any]
-):
-    """
-    재조합 + 항상 배치 맵(JSON) + placement_debug PNGs 생성.
-    """
-    placement_map = {"pages": [], "output_pdf": os.path.abspath(output_pdf_path)}
+def _read_image_sizes(logical_units: List[LogicalUnit]) -> Dict[str, Tuple[int, int]]:
+    """배치에 필요한 모든 이미지 크기를 한 번씩만 읽습니다. 없는 파일은 제외됩니다."""
+    from PIL import Image
 
-    doc = fitz.open()
-    page = doc.new_page(width=cfg['page_size'][0], height=cfg['page_size'][1])
+    sizes: Dict[str, Tuple[int, int]] = {}
+    for unit in logical_units:
+        for component in unit:
+            paths = [component['image_path']] + [a['image_path'] for a in component.get('attachments', [])]
+            for path in paths:
+                if path in sizes or not os.path.exists(path):
+                    continue
+                with Image.open(path) as img:
+                    sizes[path] = img.size
+    return sizes
 
+def _layout_geometry(cfg: Dict[str, Any]) -> Dict[str, Any]:
     page_width, page_height = cfg['page_size']
     margin = cfg['margin']
     spacing = cfg['spacing_between_components']
-
     header_y = cfg.get('header_y_position', 70)
-    header_line_width = cfg.get('header_line_width', 0.5)
-    content_start_y = header_y + spacing
-
     two_column_layout = cfg.get('two_column_layout', False)
-    column_line_width = cfg.get('column_line_width', 0)
-
-    def draw_header(p):
-        p.draw_line(fitz.Point(margin, header_y), fitz.Point(page_width - margin, header_y), color=(0, 0, 0), width=header_line_width)
-
-    def _ensure_page_entry(pg_obj):
-        pid = int(pg_obj.number)
-        if len(placement_map["pages"]) == 0 or placement_map["pages"][-1]["page_id"] != pid:
-            placement_map["pages"].append({"page_id": pid, "items": []})
-
-    draw_header(page)
-    _ensure_page_entry(page)
-
     if two_column_layout:
         column_width = (page_width - 3 * margin) / 2
         column_x_pos = [margin, margin + column_width + margin]
-        y_cursors = [content_start_y, content_start_y]
     else:
         column_width = page_width - 2 * margin
         column_x_pos = [float(margin)]
-        y_cursors = [content_start_y]
+    return {
+        "page_width": page_width, "page_height": page_height, "margin": margin, "spacing": spacing,
+        "header_y": header_y, "content_start_y": header_y + spacing, "two_column_layout": two_column_layout,
+        "column_width": column_width, "column_x_pos": column_x_pos,
+    }
 
+def plan_layout(
+    logical_units_to_place: List[LogicalUnit],
+    cfg: Dict[str, Any],
+    image_sizes: Dict[str, Tuple[int, int]]
+) -> Dict[str, Any]:
+    """
+    이미지 크기만으로 모든 항목의 페이지/컬럼/좌표를 계산합니다 (PDF는 건드리지 않음).
+    반환값은 배치 맵 {"pages": [{"page_id", "items": [...], "fill_ratio"}, ...], "summary"} 입니다.
+    cfg['layout_engine']이 "packed"이면 layout_engine의 컬럼 패킹을, 아니면 greedy 배치를 사용합니다.
+    """
+    geo = _layout_geometry(cfg)
+    if cfg.get('layout_engine', 'greedy') == 'packed':
+        placement_map = plan_packed_layout(logical_units_to_place, geo, image_sizes,
+                                           reorder_window=cfg.get('layout_reorder_window', 0),
+                                           constraints=cfg.get('layout_constraints'))
+        return annotate_fill_ratios(placement_map, geo)
+
+    page_height = geo["page_height"]
+    margin = geo["margin"]
+    spacing = geo["spacing"]
+    content_start_y = geo["content_start_y"]
+    two_column_layout = geo["two_column_layout"]
+    column_width = geo["column_width"]
+    column_x_pos = geo["column_x_pos"]
+
+    pages: List[Dict[str, Any]] = [{"page_id": 0, "items": []}]
+    y_cursors = [content_start_y, content_start_y] if two_column_layout else [content_start_y]
     current_column = 0
-    current_question_num = cfg.get('start_question_number', 1)
 
     def get_scaled_dimensions(img_w, img_h):
-        max_allowed_width = column_width
-        if img_w > max_allowed_width:
-            scale = max_allowed_width / img_w
-            return int(img_w * scale), int(img_h * scale)
-        return int(img_w), int(img_h)
+        return scale_to_column(img_w, img_h, column_width)
 
     def ensure_space(h_needed):
-        nonlocal page, current_column, y_cursors
+        nonlocal current_column, y_cursors
         if y_cursors[current_column] + h_needed > page_height - margin:
             if two_column_layout and current_column == 0:
                 current_column = 1
             else:
-                page = doc.new_page(width=page_width, height=page_height)
-                draw_header(page)
-                _ensure_page_entry(page)
+                pages.append({"page_id": len(pages), "items": []})
                 y_cursors = [content_start_y, content_start_y] if two_column_layout else [content_start_y]
                 current_column = 0
 
+    def place(item_type, path, w, h):
+        x_pos = column_x_pos[current_column]
+        y_pos = y_cursors[current_column]
+        item = {
+            "type": item_type,
+            "image_path": path,
+            "page": pages[-1]["page_id"],
+            "column": current_column,
+            "x": float(x_pos),
+            "y": float(y_pos),
+            "w": float(w),
+            "h": float(h)
+        }
+        pages[-1]["items"].append(item)
+        y_cursors[current_column] += h + spacing
+        return item
+
     for unit_idx, unit in enumerate(logical_units_to_place):
         for i, component in enumerate(unit):
             image_path = component['image_path']
-            if not os.path.exists(image_path):
+            if image_path not in image_sizes:
                 print(f"경고: 이미지를 찾을 수 없습니다. 건너뜁니다 -> {image_path}")
                 continue
 
-            with Image.open(image_path) as img:
-                w0, h0 = img.size
-            w, h = get_scaled_dimensions(w0, h0)
+            w, h = get_scaled_dimensions(*image_sizes[image_path])
 
             is_header_followed_by_passage = (
                 component['label'] == 'header' and (i + 1) < len(unit) and unit[i + 1]['label'] == 'passage'
@@ -98,93 +126,143 @@ def recombine_pdf(
             required_height = h
             if is_header_followed_by_passage:
                 next_comp = unit[i + 1]
-                if os.path.exists(next_comp['image_path']):
-                    with Image.open(next_comp['image_path']) as nimg:
-                        nw, nh = get_scaled_dimensions(*nimg.size)
+                if next_comp['image_path'] in image_sizes:
+                    nw, nh = get_scaled_dimensions(*image_sizes[next_comp['image_path']])
                     required_height += spacing + nh
 
             attachments = component.get('attachments', [])
             for att in attachments:
-                if os.path.exists(att['image_path']):
-                    with Image.open(att['image_path']) as aimg:
-                        aw, ah = get_scaled_dimensions(*aimg.size)
+                if att['image_path'] in image_sizes:
+                    aw, ah = get_scaled_dimensions(*image_sizes[att['image_path']])
                     required_height += spacing + ah
 
             ensure_space(required_height)
-
-            x_pos = column_x_pos[current_column]
-            y_pos = y_cursors[current_column]
-
-            rect = fitz.Rect(x_pos, y_pos, x_pos + w, y_pos + h)
-            page.insert_image(rect, filename=image_path)
-
-            item = {
-                "type": component['label'],
-                "image_path": image_path,
-                "page": int(page.number),
-                "column": current_column,
-                "x": float(x_pos),
-                "y": float(y_pos),
-                "w": float(w),
-                "h": float(h)
-            }
-
-            if component['label'] == "question_block":
-                # q_num_text = f"{current_question_num}."
-                # text_pos = fitz.Point(x_pos + cfg.get('question_number_offset_x', 10),
-                #                       y_pos + cfg.get('question_number_offset_y', 12))
-                # page.insert_text(text_pos, q_num_text, fontsize=cfg.get('question_number_font_size', 12), color=(0, 0, 0))
-                # item["question_number"] = current_question_num
-                # current_question_num += 1
-                pass
-
-            y_cursors[current_column] += h + spacing
-            _ensure_page_entry(page)
-            placement_map["pages"][-1]["items"].append(item)
+            place(component['label'], image_path, w, h)
 
             for att in attachments:
                 apath = att['image_path']
-                if not os.path.exists(apath):
+                if apath not in image_sizes:
                     continue
-                with Image.open(apath) as aimg:
-                    aw0, ah0 = aimg.size
-                aw, ah = get_scaled_dimensions(aw0, ah0)
+                aw, ah = get_scaled_dimensions(*image_sizes[apath])
                 ensure_space(ah)
-                ax = column_x_pos[current_column]
-                ay = y_cursors[current_column]
-                rect_att = fitz.Rect(ax, ay, ax + aw, ay + ah)
-                page.insert_image(rect_att, filename=apath)
-                y_cursors[current_column] += ah + spacing
-                _ensure_page_entry(page)
-                placement_map["pages"][-1]["items"].append({
-                    "type": "attachment",
-                    "image_path": apath,
-                    "page": int(page.number),
-                    "column": current_column,
-                    "x": float(ax),
-                    "y": float(ay),
-                    "w": float(aw),
-                    "h": float(ah)
-                })
-
-    # divider
-    if two_column_layout and column_line_width > 0:
-        for p in doc:
+                place("attachment", apath, aw, ah)
+
+    return annotate_fill_ratios({"pages": pages}, geo)
+
+def _render_pages(page_entries: List[Dict[str, Any]], cfg: Dict[str, Any], output_path: Optional[str] = None,
+                  on_page: Optional[Callable[[int], None]] = None):
+    """
+    배치 맵의 페이지 목록을 새 문서에 그립니다. output_path가 주어지면 저장 후 경로를,
+    아니면 열린 문서를 반환합니다. (워커 프로세스에서 호출되므로 최상위 함수)
+    on_page는 페이지 하나를 다 그릴 때마다 page_id로 호출됩니다.
+    """
+    import fitz  # PyMuPDF
+
+    geo = _layout_geometry(cfg)
+    page_width, page_height = geo["page_width"], geo["page_height"]
+    margin = geo["margin"]
+    header_y = geo["header_y"]
+    header_line_width = cfg.get('header_line_width', 0.5)
+    column_line_width = cfg.get('column_line_width', 0)
+
+    doc = fitz.open()
+    for entry in page_entries:
+        page = doc.new_page(width=page_width, height=page_height)
+        page.draw_line(fitz.Point(margin, header_y), fitz.Point(page_width - margin, header_y), color=(0, 0, 0), width=header_line_width)
+        for it in entry["items"]:
+            rect = fitz.Rect(it["x"], it["y"], it["x"] + it["w"], it["y"] + it["h"])
+            page.insert_image(rect, filename=it["image_path"])
+        # divider
+        if geo["two_column_layout"] and column_line_width > 0:
             center_x = page_width / 2
-            p.draw_line(fitz.Point(center_x, content_start_y),
-                        fitz.Point(center_x, page_height - margin),
-                        color=(0, 0, 0), width=column_line_width)
+            page.draw_line(fitz.Point(center_x, geo["content_start_y"]),
+                           fitz.Point(center_x, page_height - margin),
+                           color=(0, 0, 0), width=column_line_width)
+        if on_page:
+            on_page(entry["page_id"])
+    if output_path is None:
+        return doc
+    doc.save(output_path)
+    doc.close()
+    return output_path
+
+def _render_document(pages: List[Dict[str, Any]], cfg: Dict[str, Any], output_pdf_path: str,
+                     on_progress: Optional[ProgressCallback] = None):
+    """
+    페이지가 많으면 페이지 구간별로 공유 CPU 풀(src/cpu_pool.py)에서 요청당 최대 render_workers 구간씩
+    렌더링한 뒤 insert_pdf로 병합합니다.
+    on_progress에는 페이지(또는 구간)가 완성될 때마다 {"event": "pages_rendered", ...}가 전달됩니다.
+    """
+    import fitz  # PyMuPDF
+    from src.cpu_pool import get_cpu_pool, run_tasks
+
+    total = len(pages)
+    rendered = 0
+
+    def report(first_page, last_page):
+        nonlocal rendered
+        rendered += last_page - first_page + 1
+        if on_progress:
+            on_progress({"event": "pages_rendered", "pages": [first_page, last_page],
+                         "rendered": rendered, "total": total})
+
+    workers = max(1, int(cfg.get('render_workers', 1)))
+    batch_size = max(1, int(cfg.get('pages_per_render_batch', 16)))
+    if workers == 1 or len(pages) <= batch_size:
+        doc = _render_pages(pages, cfg, on_page=lambda pid: report(pid, pid))
+        doc.save(output_pdf_path)
+        doc.close()
+        return
+
+    batches = [pages[i:i + batch_size] for i in range(0, len(pages), batch_size)]
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_pdf_path))) as tmp_dir:
+        part_paths = [os.path.join(tmp_dir, f"part_{i:04d}.pdf") for i in range(len(batches))]
+        pool = get_cpu_pool(cfg.get('cpu_pool_workers', workers))
+        run_tasks(pool, _render_pages, list(zip(batches, [cfg] * len(batches), part_paths)), workers,
+                  on_done=lambda i, _: report(batches[i][0]["page_id"], batches[i][-1]["page_id"]))
+        doc = fitz.open()
+        for part_path in part_paths:
+            with fitz.open(part_path) as part:
+                doc.insert_pdf(part)
+        doc.save(output_pdf_path)
+        doc.close()
+
+def recombine_pdf(
+    output_pdf_path: str,
+    logical_units_to_place: List[LogicalUnit],
+    cfg: Dict[str, Any],
+    on_progress: Optional[ProgressCallback] = None
+):
+    """
+    재조합 + 항상 배치 맵(JSON) + placement_debug 이미지 생성 (overlay_image_policy 형식).
+    배치 계획(plan_layout)과 렌더링(_render_document)을 분리해 페이지 구간을 병렬로 그립니다.
+    on_progress로 배치 완료("layout_planned")와 페이지 렌더링 진행 상황을 알립니다.
+    """
+    page_width, page_height = cfg['page_size']
+
+    with span("read_image_sizes"):
+        image_sizes = _read_image_sizes(logical_units_to_place)
+    with span("plan_layout"):
+        placement_map = plan_layout(logical_units_to_place, cfg, image_sizes)
+    placement_map["output_pdf"] = os.path.abspath(output_pdf_path)
+    if on_progress:
+        on_progress({"event": "layout_planned", **placement_map["summary"]})
 
     # save pdf + placement
-    doc.save(output_pdf_path)
-    doc.close()
+    with span("render_document"):
+        _render_document(placement_map["pages"], cfg, output_pdf_path, on_progress=on_progress)
+    if on_progress:
+        on_progress({"event": "pdf_saved", "path": os.path.abspath(output_pdf_path)})
     json_path = os.path.splitext(output_pdf_path)[0] + "_placement.json"
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(placement_map, f, ensure_ascii=False, indent=2)
-    print(f"\nPDF 재조합 완료: {output_pdf_path}")
+    print(f"\nPDF 재조합 완료: {output_pdf_path} ({placement_map['summary']['page_count']}쪽, "
+          f"평균 채움률 {placement_map['summary']['mean_fill_ratio']:.2f})")
     print(f"배치 맵 JSON: {json_path}")
 
-    # --- placement debug PNGs ---
+    # --- placement debug images ---
+    overlay_policy = cfg.get("overlay_image_policy", {"format": "png"})
+    from PIL import Image, ImageDraw
     dbg_dir = os.path.splitext(output_pdf_path)[0] + "_placement_debug"
     os.makedirs(dbg_dir, exist_ok=True)
     for page_entry in placement_map["pages"]:
@@ -199,6 +277,5 @@ def recombine_pdf(
             if "question_number" in it:
                 label += f" #{it['question_number']}"
             draw.text((x+4, max(0, y-14)), label, fill=color)
-        out_img = os.path.join(dbg_dir, f"page_{pid:03d}_placement.png")
-        canvas.save(out_img)
+        save_image(canvas, os.path.join(dbg_dir, f"page_{pid:03d}_placement"), overlay_policy)
     print(f"배치 디버그 이미지 폴더: {dbg_dir}")
\ No newline at end of file
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+PDF Text-Layer Fast Path
+
+Digitally produced exam PDFs carry their text, so question numbers
+("1." - "45." at the start of a line), section headers ("[1~3] 다음 글을
+읽고 ...") and the footer band can be read exactly from the page instead of
+being detected on the rendered image. Coordinates are mapped to image pixels
+(page rotation + render scale), the same space as the YOLO boxes.
+
+-   `extract_page_layer(page, scale, config)`: text lines + text-layer annotations of one page
+-   `merge_text_layer(annotations, layer)`: text-layer boxes replace YOLO boxes of the same label
+    (applied in `annotation_processor.process_page`, so stored raw detections stay YOLO-only)
+-   `attach_text(annotations, lines)`: fills `text_content` of header/passage/question_block
+
+Pages with fewer than `TEXT_LAYER_MIN_CHARS` characters (scans) have no
+layer and keep the YOLO result as is.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.config import Config
+
+Bbox = List[float]
+
+QUESTION_NUMBER_RE = re.compile(r"^\s*(\d{1,2})\s*\.(?!\d)")
+SECTION_HEADER_RE = re.compile(r"^\s*\[\s*(\d{1,2})\s*[~∼～〜\-–]\s*(\d{1,2})\s*\]")
+TEXT_LAYER_LABELS = ("question_number", "header", "footer")
+TEXT_LABELS = ("header", "passage", "question_block")
+
+
+def _union(boxes: Sequence[Sequence[float]]) -> Bbox:
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+def _center_in(bbox: Sequence[float], box: Sequence[float]) -> bool:
+    cx, cy = (bbox[0] + bbox[2]) / 2.0, (bbox[1] + bbox[3]) / 2.0
+    return box[0] <= cx <= box[2] and box[1] <= cy <= box[3]
+
+
+def extract_page_layer(page, scale: float, config: Config) -> Optional[Dict[str, Any]]:
+    """
+    한 페이지의 텍스트 레이어. 텍스트가 없으면(스캔본) None.
+    반환: {"lines": [{"bbox", "text"}], "annotations": [{"label", "bbox", "confidence", "text_content", "source", ...}]}
+    """
+    import fitz  # PyMuPDF
+
+    to_image = page.rotation_matrix * fitz.Matrix(scale, scale)
+    # rawdict 좌표는 회전 전 기준이므로, 줄을 화면(회전 후) 좌표로 옮겨 보이는 페이지의 아래쪽 띠와 비교
+    footer_top = page.rect.height * (1.0 - config.TEXT_LAYER_FOOTER_BAND)
+
+    def image_bbox(b) -> Bbox:
+        r = fitz.Rect(b) * to_image
+        return [r.x0, r.y0, r.x1, r.y1]
+
+    flags = fitz.TEXTFLAGS_RAWDICT & ~fitz.TEXT_PRESERVE_IMAGES
+    blocks = [b for b in page.get_text("rawdict", flags=flags)["blocks"] if b.get("type", 0) == 0]
+
+    lines: List[Dict[str, Any]] = []
+    annotations: List[Dict[str, Any]] = []
+    footer_lines: List[Dict[str, Any]] = []
+    chars_total = 0
+    for block in blocks:
+        block_lines = []
+        for line in block["lines"]:
+            chars = [ch for span in line["spans"] for ch in span["chars"]]
+            text = "".join(ch["c"] for ch in chars)
+            if not text.strip():
+                continue
+            chars_total += len(text.strip())
+            block_lines.append({"bbox": line["bbox"], "text": text.strip(), "chars": chars, "raw": text})
+
+        for i, line in enumerate(block_lines):
+            lines.append({"bbox": image_bbox(line["bbox"]), "text": line["text"]})
+            if (fitz.Rect(line["bbox"]) * page.rotation_matrix).y0 >= footer_top:
+                footer_lines.append(line)
+                continue
+
+            header = SECTION_HEADER_RE.match(line["raw"])
+            if header:
+                rest = block_lines[i:]  # 안내문은 같은 블록의 이어지는 줄까지
+                annotations.append({
+                    "label": "header",
+                    "bbox": image_bbox(_union([l["bbox"] for l in rest])),
+                    "confidence": 1.0,
+                    "text_content": "\n".join(l["text"] for l in rest),
+                    "question_range": [int(header.group(1)), int(header.group(2))],
+                    "source": "text_layer",
+                })
+                continue
+
+            number = QUESTION_NUMBER_RE.match(line["raw"])
+            if number and 1 <= int(number.group(1)) <= config.TEXT_LAYER_MAX_QUESTION_NUMBER:
+                num_chars = [ch for ch in line["chars"][:number.end()] if ch["c"].strip()]
+                annotations.append({
+                    "label": "question_number",
+                    "bbox": image_bbox(_union([ch["bbox"] for ch in num_chars])),
+                    "confidence": 1.0,
+                    "text_content": number.group(1),
+                    "number": int(number.group(1)),
+                    "source": "text_layer",
+                })
+
+    if chars_total < config.TEXT_LAYER_MIN_CHARS:
+        return None
+    if footer_lines:
+        annotations.append({
+            "label": "footer",
+            "bbox": image_bbox(_union([l["bbox"] for l in footer_lines])),
+            "confidence": 1.0,
+            "text_content": " ".join(l["text"] for l in footer_lines),
+            "source": "text_layer",
+        })
+    lines.sort(key=lambda l: (l["bbox"][1], l["bbox"][0]))
+    return {"lines": lines, "annotations": annotations}
+
+
+def merge_text_layer(annotations: List[Dict[str, Any]], layer: Dict[str, Any],
+                     min_passage_conf: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    텍스트 레이어가 찾은 라벨(question_number/header/footer)은 YOLO 결과를 대체하고,
+    텍스트 레이어에 없는 라벨은 YOLO 결과를 그대로 둡니다.
+    지문(passage, 신뢰도 min_passage_conf 이상) 안에서 줄머리에 나온 "1." 같은 번호는 문항 번호로 보지 않습니다.
+    """
+    passages = [a["bbox"] for a in annotations
+                if a["label"] == "passage" and float(a.get("confidence", 0.5)) >= min_passage_conf]
+    found = [a for a in layer["annotations"]
+             if not (a["label"] == "question_number" and any(_center_in(a["bbox"], p) for p in passages))]
+    labels = {a["label"] for a in found}
+    return [a for a in annotations if a["label"] not in labels] + [dict(a) for a in found]
+
+
+def attach_text(annotations: List[Dict[str, Any]], lines: List[Dict[str, Any]]):
+    """header/passage/question_block 어노테이션에 중심이 박스 안에 든 줄들의 텍스트를 채웁니다 (위→아래)."""
+    for a in annotations:
+        if a["label"] not in TEXT_LABELS or a.get("text_content"):
+            continue
+        a["text_content"] = "\n".join(l["text"] for l in lines if _center_in(l["bbox"], a["bbox"]))
+
+
+def layer_summary(layer: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    """디버그 리포트용 요약."""
+    if layer is None:
+        return None
+    counts = {label: 0 for label in TEXT_LAYER_LABELS}
+    for a in layer["annotations"]:
+        counts[a["label"]] += 1
+    return {"lines": len(layer["lines"]), **counts}
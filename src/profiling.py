@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+On-demand Sampling Profiler
+
+`run_pipeline(..., profile=True)` (web: `?profile=1` or the `X-Profile: 1`
+header on /shuffle, /shuffle-history and /jobs) runs the request under
+`SamplingProfiler`: a background thread that reads the pipeline thread's
+Python stack every `PROFILE_SAMPLE_INTERVAL_MS` via `sys._current_frames()`.
+The pipeline itself is not instrumented, so the overhead is one stack walk
+per interval. Work done in other processes (annotation/render workers) is
+not sampled; it shows up as time waiting on the pool.
+
+Named spans (the `run_pipeline` stages, `span("...")` blocks further down)
+become the root frames of the samples taken inside them and a separate
+"spans" timeline. Results are written next to `annotation_debug_report.json`:
+
+-   profile.speedscope.json: open in https://www.speedscope.app
+-   profile.collapsed.txt:   "frame;frame;frame <ms>" lines (flamegraph.pl, speedscope)
+-   profile_summary.json:    spans and the top functions by self/total time
+
+`GET /admin/profiles` lists recent profiles.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+from typing import Any, Dict, List, Optional, Tuple
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+_active = threading.local()  # 이 스레드에서 실행 중인 프로파일러 (span()이 찾음)
+
+PROFILE_FILES = {
+    "speedscope": "profile.speedscope.json",
+    "collapsed": "profile.collapsed.txt",
+    "summary": "profile_summary.json",
+}
+
+
+class SamplingProfiler:
+    """Samples the stack of the thread that called start() until stop()."""
+
+    def __init__(self, name: str, interval_ms: float = 5.0, max_depth: int = 128):
+        self.name = name
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.samples: Dict[Tuple[Tuple[str, ...], Tuple[Frame, ...]], float] = {}  # (spans, stack) -> seconds
+        self.spans: List[Dict[str, Any]] = []  # {"name", "depth", "start", "end"} (seconds from start)
+        self._open: List[Dict[str, Any]] = []
+        self._thread_id: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._t0 = 0.0
+        self.duration = 0.0
+
+    # --- lifecycle ---
+    def start(self) -> "SamplingProfiler":
+        self._thread_id = threading.get_ident()
+        self._t0 = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.name}", daemon=True)
+        self._sampler.start()
+        _active.profiler = self
+        return self
+
+    def stop(self):
+        while self._open:
+            self.close_span()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.duration = time.perf_counter() - self._t0
+        if getattr(_active, "profiler", None) is self:
+            _active.profiler = None
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                last = now
+                continue
+            stack: List[Frame] = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            key = (tuple(s["name"] for s in self._open), tuple(reversed(stack)))
+            # 실제 경과 시간으로 가중 (GIL 때문에 샘플 간격이 늘어날 수 있음)
+            self.samples[key] = self.samples.get(key, 0.0) + (now - last)
+            last = now
+
+    # --- spans ---
+    def open_span(self, name: str):
+        span = {"name": name, "depth": len(self._open), "start": time.perf_counter() - self._t0, "end": None}
+        self._open = self._open + [span]  # 샘플러 스레드가 읽으므로 제자리 수정 대신 교체
+        self.spans.append(span)
+
+    def close_span(self):
+        span = self._open[-1]
+        span["end"] = time.perf_counter() - self._t0
+        self._open = self._open[:-1]
+
+    # --- output ---
+    def _frame_name(self, frame: Frame) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        total = sum(self.samples.values()) or 1e-9
+        self_time: Dict[Frame, float] = {}
+        cumulative: Dict[Frame, float] = {}
+        for (_, stack), seconds in self.samples.items():
+            if stack:
+                self_time[stack[-1]] = self_time.get(stack[-1], 0.0) + seconds
+            for frame in set(stack):
+                cumulative[frame] = cumulative.get(frame, 0.0) + seconds
+
+        def ranked(times: Dict[Frame, float]) -> List[Dict[str, Any]]:
+            rows = sorted(times.items(), key=lambda kv: kv[1], reverse=True)[:top]
+            return [{"frame": self._frame_name(f), "file": f[1], "seconds": round(s, 4), "pct": round(100.0 * s / total, 1)}
+                    for f, s in rows]
+
+        return {
+            "name": self.name,
+            "created_at": time.time(),
+            "duration_s": round(self.duration, 4),
+            "sampled_s": round(total, 4),
+            "samples": len(self.samples),
+            "interval_ms": self.interval * 1000.0,
+            "spans": [{"name": s["name"], "depth": s["depth"], "start_s": round(s["start"], 4),
+                       "duration_s": round((s["end"] or self.duration) - s["start"], 4)} for s in self.spans],
+            "top_self": ranked(self_time),
+            "top_total": ranked(cumulative),
+        }
+
+    def speedscope(self) -> Dict[str, Any]:
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Any, int] = {}
+
+        def frame_id(key: Any, entry: Dict[str, Any]) -> int:
+            if key not in index:
+                index[key] = len(frames)
+                frames.append(entry)
+            return index[key]
+
+        samples, weights = [], []
+        for (spans, stack), seconds in self.samples.items():
+            ids = [frame_id(("span", s), {"name": f"[{s}]"}) for s in spans]
+            ids += [frame_id(f, {"name": f[0], "file": f[1], "line": f[2]}) for f in stack]
+            samples.append(ids)
+            weights.append(round(seconds * 1000.0, 3))
+
+        events = []
+        for s in self.spans:
+            fid = frame_id(("span", s["name"]), {"name": f"[{s['name']}]"})
+            end = s["end"] if s["end"] is not None else self.duration
+            events.append((end * 1000.0, 0, -s["depth"], {"type": "C", "frame": fid, "at": round(end * 1000.0, 3)}))
+            events.append((s["start"] * 1000.0, 1, s["depth"], {"type": "O", "frame": fid, "at": round(s["start"] * 1000.0, 3)}))
+        events.sort(key=lambda e: e[:3])  # 같은 시각이면 닫기(깊은 것부터) → 열기(얕은 것부터)
+
+        end_ms = round(self.duration * 1000.0, 3)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "src.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {"type": "sampled", "name": f"{self.name} (samples)", "unit": "milliseconds",
+                 "startValue": 0, "endValue": end_ms, "samples": samples, "weights": weights},
+                {"type": "evented", "name": f"{self.name} (spans)", "unit": "milliseconds",
+                 "startValue": 0, "endValue": end_ms, "events": [e[3] for e in events]},
+            ],
+        }
+
+    def collapsed(self) -> str:
+        lines = []
+        for (spans, stack), seconds in sorted(self.samples.items(), key=lambda kv: kv[1], reverse=True):
+            names = [f"[{s}]" for s in spans] + [self._frame_name(f) for f in stack]
+            lines.append(f"{';'.join(n.replace(';', ',') for n in names)} {max(1, round(seconds * 1000.0))}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, out_dir: str) -> Dict[str, Any]:
+        """Writes the three profile files to out_dir and returns the summary."""
+        os.makedirs(out_dir, exist_ok=True)
+        summary = self.summary()
+        with open(os.path.join(out_dir, PROFILE_FILES["speedscope"]), "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f)
+        with open(os.path.join(out_dir, PROFILE_FILES["collapsed"]), "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(os.path.join(out_dir, PROFILE_FILES["summary"]), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """Named span on the profiler of the current thread; no-op when the thread is not being profiled."""
+    profiler: Optional[SamplingProfiler] = getattr(_active, "profiler", None)
+    if profiler is None:
+        yield
+        return
+    profiler.open_span(name)
+    try:
+        yield
+    finally:
+        profiler.close_span()
+
+
+def recent_profiles(processed_root: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Summaries of the newest profiles under data/processed/<request_id>/debug/, newest first."""
+    found = []
+    if os.path.isdir(processed_root):
+        for request_id in os.listdir(processed_root):
+            path = os.path.join(processed_root, request_id, "debug", PROFILE_FILES["summary"])
+            if os.path.isfile(path):
+                found.append((os.path.getmtime(path), request_id, path))
+    out = []
+    for _, request_id, path in sorted(found, reverse=True)[:limit]:
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        out.append({"request_id": request_id, "created_at": summary["created_at"], "duration_s": summary["duration_s"],
+                    "spans": [s for s in summary["spans"] if s["depth"] == 0],
+                    "top_self": summary["top_self"][:5]})
+    return out
+
+
+def enter_stage(name: str):
+    """Closes the open spans and opens a top-level span `name` (sequential stages without a with block)."""
+    profiler: Optional[SamplingProfiler] = getattr(_active, "profiler", None)
+    if profiler is None:
+        return
+    while profiler._open:
+        profiler.close_span()
+    profiler.open_span(name)
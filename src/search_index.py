@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Full-text Passage Search
+
+Indexes the `text_content` of passages and question blocks of every
+processed exam in a SQLite FTS5 table (`SEARCH_INDEX_PATH`), so a teacher
+can find "the 정보 이론 passage from 2019" across the whole archive and get
+back the crops it was cut into.
+
+Korean particles attach to nouns (정보이론은, 정보를) and spacing varies
+(정보이론 / 정보 이론), so whole-word tokens miss most queries. Text is
+indexed as character bigrams instead: spaces and punctuation are dropped and
+the remaining characters become overlapping two-character grams ("정보 이론은"
+→ "정보 보이 이론 론은"). A query word becomes the phrase of its grams, which
+matches it anywhere in the text regardless of spacing. Query words are ANDed
+and may also match the exam file name (year, form); a one-character word is
+a prefix query on the grams.
+
+`run_pipeline` re-indexes an exam after its group stage (a few ms;
+`index_exam` replaces that exam's rows), and the index can be rebuilt
+from the crop store catalog:
+
+    python -m src.search_index --rebuild
+    python -m src.search_index --query "정보 이론 2019" --label passage
+"""
+
+import os
+import re
+import time
+import sqlite3
+import functools
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.config import Config
+
+Component = Dict[str, Any]
+LogicalUnit = List[Component]
+
+NGRAM = 2  # 바꾸면 --rebuild 필요
+WORD = re.compile(r"[^\W_]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exams (
+    exam_id TEXT PRIMARY KEY,
+    filename TEXT,
+    components INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS components (
+    id INTEGER PRIMARY KEY,
+    exam_id TEXT NOT NULL,
+    unit_index INTEGER NOT NULL,
+    component_index INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    crop_id TEXT,
+    image_path TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS components_exam ON components(exam_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS component_grams USING fts5(
+    text, source, label, tokenize = 'unicode61 remove_diacritics 0'
+);
+INSERT INTO component_grams (component_grams, rank) VALUES ('rank', 'bm25(1.0, 0.5, 0.0)');
+"""
+
+
+def char_ngrams(text: str, n: int = NGRAM) -> str:
+    """Space-separated character n-grams of the text with spaces and punctuation removed."""
+    chars = "".join(WORD.findall(text.lower()))
+    if len(chars) <= n:
+        return chars
+    return " ".join(chars[i:i + n] for i in range(len(chars) - n + 1))
+
+
+def match_expression(query: str, n: int = NGRAM) -> Optional[str]:
+    """FTS5 MATCH expression for a user query (None when it has no searchable characters)."""
+    terms = []
+    for word in WORD.findall(query.lower()):
+        if len(word) < n:
+            terms.append(f'"{word}"*')
+        else:
+            terms.append(f'"{char_ngrams(word, n)}"')
+    return "{text source} : (" + " AND ".join(terms) + ")" if terms else None
+
+
+def snippet(text: str, query: str, width: int = 60) -> str:
+    """About `width` characters of text around the first query word found in it."""
+    lowered = text.lower()
+    hits = [lowered.find(w) for w in WORD.findall(query.lower())]
+    hits = [h for h in hits if h >= 0]
+    center = min(hits) if hits else 0
+    start = max(0, center - width // 3)
+    end = min(len(text), start + width)
+    body = " ".join(text[start:end].split())
+    return ("…" if start > 0 else "") + body + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    def __init__(self, db_path: str, labels: Sequence[str] = ("passage", "question_block")):
+        self.db_path = db_path
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process (connections must not cross a fork)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # --- writes ---
+    def index_exam(self, exam_id: str, filename: Optional[str], logical_units: List[LogicalUnit]) -> int:
+        """Replaces the indexed components of an exam; returns how many have text."""
+        rows = []
+        for unit_index, unit in enumerate(logical_units):
+            for component_index, c in enumerate(unit):
+                text = (c.get("text_content") or "").strip()
+                if c["label"] in self.labels and text:
+                    rows.append((exam_id, unit_index, component_index, c["label"], c.get("crop_id"),
+                                 c.get("image_path"), text))
+        source = char_ngrams(os.path.splitext(filename or "")[0])
+        with self._connect() as conn:
+            conn.execute("DELETE FROM component_grams WHERE rowid IN (SELECT id FROM components WHERE exam_id = ?)",
+                         (exam_id,))
+            conn.execute("DELETE FROM components WHERE exam_id = ?", (exam_id,))
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT INTO components (exam_id, unit_index, component_index, label, crop_id, image_path, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                conn.execute("INSERT INTO component_grams (rowid, text, source, label) VALUES (?, ?, ?, ?)",
+                             (cursor.lastrowid, char_ngrams(row[-1]), source, row[3]))
+            conn.execute("INSERT OR REPLACE INTO exams (exam_id, filename, components, indexed_at) VALUES (?, ?, ?, ?)",
+                         (exam_id, filename, len(rows), time.time()))
+        return len(rows)
+
+    # --- reads ---
+    def search(self, query: str, limit: int = 20, label: Optional[str] = None,
+               exam_id: Optional[str] = None) -> Dict[str, Any]:
+        """Best-matching components (bm25, text weighted over file name) with their crop references."""
+        if label is not None and label not in self.labels:
+            raise ValueError(f"label must be one of {self.labels}")
+        start = time.perf_counter()
+        expression = match_expression(query)
+        results: List[Dict[str, Any]] = []
+        if expression is not None:
+            # 순위와 LIMIT을 FTS 안에서 먼저 적용하고, 남은 행만 components와 조인
+            if label:
+                expression += f' AND label : "{label}"'
+            params: List[Any] = [expression]
+            where = "component_grams MATCH ?"
+            if exam_id:
+                where += " AND rowid IN (SELECT id FROM components WHERE exam_id = ?)"
+                params.append(exam_id)
+            sql = ("SELECT c.*, e.filename, hits.rank FROM "
+                   f"(SELECT rowid, rank FROM component_grams WHERE {where} ORDER BY rank LIMIT ?) AS hits "
+                   "JOIN components c ON c.id = hits.rowid JOIN exams e ON e.exam_id = c.exam_id ORDER BY hits.rank")
+            params.append(limit)
+            for row in self._connect().execute(sql, params):
+                results.append({"exam_id": row["exam_id"], "filename": row["filename"],
+                                "unit_index": row["unit_index"], "component_index": row["component_index"],
+                                "label": row["label"], "crop_id": row["crop_id"], "image_path": row["image_path"],
+                                "score": round(-row["rank"], 4), "snippet": snippet(row["text"], query)})
+        return {"query": query, "results": results,
+                "took_ms": round((time.perf_counter() - start) * 1000.0, 2)}
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        exams, components = conn.execute("SELECT COUNT(*), COALESCE(SUM(components), 0) FROM exams").fetchone()
+        return {"exams": exams, "components": components, "labels": list(self.labels),
+                "bytes": os.path.getsize(self.db_path)}
+
+
+@functools.lru_cache(maxsize=4)
+def _open_index(db_path: str, labels: Sequence[str]) -> SearchIndex:
+    return SearchIndex(db_path, labels)
+
+
+def get_search_index(config: Config) -> Optional[SearchIndex]:
+    """Process-wide index for the configured path, or None if disabled."""
+    if not config.SEARCH_INDEX_ENABLED:
+        return None
+    return _open_index(config.SEARCH_INDEX_PATH, tuple(config.SEARCH_INDEX_LABELS))
+
+
+def rebuild_from_crop_store(index: SearchIndex, config: Config) -> Dict[str, int]:
+    """Re-indexes every exam whose logical units are in the crop store catalog."""
+    from src.crop_store import get_crop_store
+
+    store = get_crop_store(config)
+    if store is None:
+        raise ValueError("crop store is disabled (CROP_STORE_ENABLED = False); nothing to rebuild from")
+    exams = components = 0
+    for exam in store.exams():
+        components += index.index_exam(exam["exam_id"], exam["filename"], store.load_units(exam["exam_id"]))
+        exams += 1
+    return {"exams": exams, "components": components}
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Full-text passage search over processed exams")
+    parser.add_argument("--rebuild", action="store_true", help="crop store 카탈로그의 모든 시험지를 다시 색인")
+    parser.add_argument("--query", help="검색어 (예: \"정보 이론 2019\")")
+    parser.add_argument("--label", choices=["passage", "question_block"], help="이 레이블만 검색")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    config = Config()
+    index = get_search_index(config) or SearchIndex(config.SEARCH_INDEX_PATH, config.SEARCH_INDEX_LABELS)
+    if args.rebuild:
+        print(json.dumps(rebuild_from_crop_store(index, config), ensure_ascii=False))
+    if args.query:
+        found = index.search(args.query, args.limit, args.label)
+        print(f"{len(found['results'])}건 ({found['took_ms']} ms)")
+        for r in found["results"]:
+            print(f"  [{r['score']:.2f}] {r['filename']} #{r['unit_index']} {r['label']} {r['crop_id'] or r['image_path']}")
+            print(f"      {r['snippet']}")
+    if not (args.rebuild or args.query):
+        print(json.dumps(index.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Per-page Spatial Index
+
+A uniform grid over one page's boxes that answers the two queries used by
+`annotation_processor` when attaching question numbers and figures:
+
+-   `first_containing(pt)`: the lowest-index box containing a point.
+-   `nearest_center(pt)`: the box whose center is closest to a point
+    (ties broken by lowest index, same as a stable sort by distance).
+
+Both only look at the grid cells around the query point, instead of
+scanning every box on the page.
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+Bbox = Tuple[float, float, float, float]
+Point = Tuple[float, float]
+
+
+class GridIndex:
+    def __init__(self, boxes: Sequence[Bbox], cell_size: float):
+        self.boxes = list(boxes)
+        self.cell_size = max(1.0, float(cell_size))
+        self.centers = [((b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0) for b in self.boxes]
+        self._box_cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._center_cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, b in enumerate(self.boxes):
+            c0, r0 = self._cell(b[0], b[1])
+            c1, r1 = self._cell(b[2], b[3])
+            for cx in range(c0, c1 + 1):
+                for cy in range(r0, r1 + 1):
+                    self._box_cells[(cx, cy)].append(i)
+            self._center_cells[self._cell(*self.centers[i])].append(i)
+        if self._center_cells:
+            xs = [k[0] for k in self._center_cells]
+            ys = [k[1] for k in self._center_cells]
+            self._extent = (min(xs), max(xs), min(ys), max(ys))
+        else:
+            self._extent = None
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def first_containing(self, pt: Point) -> Optional[int]:
+        x, y = pt
+        for i in self._box_cells.get(self._cell(x, y), []):  # indices are in ascending order
+            b = self.boxes[i]
+            if b[0] <= x <= b[2] and b[1] <= y <= b[3]:
+                return i
+        return None
+
+    def nearest_center(self, pt: Point, max_dist: float = math.inf) -> Optional[Tuple[int, float]]:
+        """(index, distance) of the nearest center within max_dist, or None."""
+        if self._extent is None:
+            return None
+        x, y = pt
+        qx, qy = self._cell(x, y)
+        min_x, max_x, min_y, max_y = self._extent
+        max_ring = max(abs(qx - min_x), abs(qx - max_x), abs(qy - min_y), abs(qy - max_y))
+        best: Optional[Tuple[float, int]] = None
+        for ring in range(max_ring + 1):
+            # every center outside rings 0..ring-1 is at least (ring-1)*cell_size away
+            lower_bound = max(0, ring - 1) * self.cell_size
+            if lower_bound > max_dist or (best is not None and best[0] < lower_bound):
+                break
+            for cell in self._ring_cells(qx, qy, ring):
+                for i in self._center_cells.get(cell, ()):
+                    cx, cy = self.centers[i]
+                    d = ((cx - x) ** 2 + (cy - y) ** 2) ** 0.5
+                    if best is None or (d, i) < best:
+                        best = (d, i)
+        if best is None or best[0] > max_dist:
+            return None
+        return best[1], best[0]
+
+    @staticmethod
+    def _ring_cells(qx: int, qy: int, ring: int):
+        if ring == 0:
+            yield (qx, qy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (qx + dx, qy - ring)
+            yield (qx + dx, qy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (qx - ring, qy + dy)
+            yield (qx + ring, qy + dy)
@@ -1,46 +1,71 @@
 # -*- coding: utf-8 -*-
 """
-Fine-tunes the LayoutLMv3 model for document layout analysis.
+Training input loop for the layout detector on the Ground Truth pages.
 
-This script is designed to be run as a SageMaker Training Job, but can also be
-run locally for debugging purposes.
+No model step is wired in yet: the script does not train or save a model.
+It builds the training input and iterates it the way a training loop would,
+reporting the images/sec the loader delivers per epoch.
 
 It will perform the following steps:
-1.  Load the pre-processed dataset created by `prepare_dataset.py`.
-2.  Split the dataset into training and validation sets.
-3.  Initialize the LayoutLMv3 model, processor, and tokenizer from Hugging Face.
-4.  Define the training arguments (`TrainingArguments`) and evaluation metrics.
-5.  Set up the `Trainer` instance.
-6.  Run the training and evaluation loop.
-7.  Save the fine-tuned model artifacts to the specified output directory
-    (which will be `/opt/ml/model` in a SageMaker environment).
+1.  Build (once) or reuse the memory-mapped dataset from `output.manifest`
+    (`src/training_dataset.py`): letterboxed uint8 pages plus YOLO box rows.
+2.  Wrap it in a DataLoader with `TRAINING_LOADER_WORKERS` persistent workers;
+    epochs read the memmap only, without decoding any image file.
+3.  Iterate `NUM_EPOCHS` epochs of batches (normalized to float, as a model
+    step would receive them) and print the throughput.
+
+The model forward/backward and saving the artifacts (`/opt/ml/model` in a
+SageMaker Training Job) go at the marked places in `main`.
+
+Usage:
+    python -m src.train --images data/processed/images
 """
 
-import os
-from config import TRAINING_DATA_DIR, MODEL_NAME, NUM_EPOCHS, BATCH_SIZE
+import time
+import argparse
+
+from src.config import Config
+from src.training_dataset import build_dataset, make_loader
 
-# from datasets import load_from_disk
-# from transformers import (LayoutLMv3ForTokenClassification, TrainingArguments, Trainer)
 
 def main():
-    """Main function to run the training job."""
-    print("Starting model training...")
+    """Iterates the training loader for the configured epochs; no model is trained."""
+    parser = argparse.ArgumentParser(description="Iterate the memory-mapped training data loader (no model step yet)")
+    parser.add_argument("--images", help="rendered page directory (default: IMAGE_DIR)")
+    parser.add_argument("--epochs", type=int, help="default: NUM_EPOCHS")
+    parser.add_argument("--batch-size", type=int, help="default: BATCH_SIZE")
+    parser.add_argument("--workers", type=int, help="DataLoader workers (default: TRAINING_LOADER_WORKERS)")
+    args = parser.parse_args()
+
+    config = Config()
+    print("Iterating the training data loader (no model step; nothing is trained or saved)...")
 
     # In a SageMaker environment, data is often copied to /opt/ml/input/data/<channel_name>
     # Here, we assume a local path for simplicity.
-    if not os.path.exists(TRAINING_DATA_DIR) or not os.listdir(TRAINING_DATA_DIR):
-        print(f"Error: Training data not found or directory is empty at {TRAINING_DATA_DIR}")
-        print("Please run `prepare_dataset.py` first.")
+    try:
+        root = build_dataset(config, args.images)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        print("Please render the labeled pages into the image directory first (src/pdf_processor.py).")
         return
 
-    # --- Add model training logic here ---
-    # 1. Load dataset from TRAINING_DATA_DIR.
-    # 2. Initialize model and processor.
-    # 3. Define Trainer and training arguments.
-    # 4. trainer.train()
-    # 5. Save model.
+    workers = config.TRAINING_LOADER_WORKERS if args.workers is None else args.workers
+    loader = make_loader(root, args.batch_size or config.BATCH_SIZE, workers, shuffle=True)
+
+    total_seen, total_elapsed = 0, 0.0
+    for epoch in range(args.epochs or config.NUM_EPOCHS):
+        start, seen = time.perf_counter(), 0
+        for images, targets in loader:
+            images = images.float() / 255.0  # (B, 3, S, S); targets: (M, 6) [batch_idx, class, cx, cy, w, h]
+            seen += len(images)
+            # --- Add model forward/backward here ---
+        elapsed = time.perf_counter() - start
+        total_seen, total_elapsed = total_seen + seen, total_elapsed + elapsed
+        print(f"epoch {epoch + 1}: {seen} images, {seen / max(elapsed, 1e-9):.1f} img/s")
 
-    print("Model training complete.")
+    # --- Save model artifacts here ---
+    print(f"Loader run finished: {total_seen} images, {total_seen / max(total_elapsed, 1e-9):.1f} img/s. "
+          "No model step is wired in, so no model was trained or saved.")
 
 if __name__ == '__main__':
     main()
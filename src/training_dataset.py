@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped Training Dataset
+
+Ground Truth pages are 3509x4963 PNGs; decoding and resizing one costs far
+more than a training step needs, and doing it in every epoch makes training
+I/O-bound. `build_dataset` does that work once:
+
+-   reads the pages labeled in `output.manifest` (`src.evaluate.load_ground_truth`)
+-   letterboxes each page to `TRAINING_IMAGE_SIZE` (aspect kept, gray padding)
+-   writes all pages into one uint8 array `images.npy` (N, S, S, 3) through a
+    memmap, optionally from several processes
+-   writes the boxes as YOLO rows [class, cx, cy, w, h] (normalized to the
+    letterboxed image) in `boxes.npy`, with `offsets.npy` (N+1) marking the
+    rows of each page
+-   records the manifest digest and per-page scale/padding in `meta.json`;
+    a later build with the same inputs is a no-op
+
+`LayoutDataset` opens the arrays with `mmap_mode="r"`, so DataLoader workers
+share the page cache instead of decoding files, and `make_loader` wraps it
+in a torch DataLoader.
+
+Usage:
+    python -m src.training_dataset --images data/processed/images
+    python -m src.training_dataset --images data/processed/images --imgsz 640 --workers 4 --force
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.evaluate import load_ground_truth
+
+PAD_VALUE = 114  # YOLO letterbox 회색
+DATASET_FILES = ("images.npy", "boxes.npy", "offsets.npy", "meta.json")
+
+
+def letterbox_geometry(width: int, height: int, size: int) -> Tuple[float, int, int, int, int]:
+    """(scale, new_w, new_h, pad_x, pad_y) that fit a width x height image into size x size."""
+    scale = min(size / width, size / height)
+    new_w, new_h = max(1, round(width * scale)), max(1, round(height * scale))
+    return scale, new_w, new_h, (size - new_w) // 2, (size - new_h) // 2
+
+
+def load_page(image_path: str, size: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Decodes one page and letterboxes it into a (size, size, 3) uint8 array."""
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        scale, new_w, new_h, pad_x, pad_y = letterbox_geometry(img.width, img.height, size)
+        # draft()가 없는 PNG이므로 reducing_gap으로 큰 페이지의 리샘플링 비용을 줄임
+        resized = img.resize((new_w, new_h), Image.BILINEAR, reducing_gap=2.0)
+        orig_size = (img.width, img.height)
+    out = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = np.asarray(resized)
+    return out, {"orig_size": orig_size, "scale": scale, "new_size": (new_w, new_h), "pad": (pad_x, pad_y)}
+
+
+def yolo_boxes(page: Dict[str, Any], geometry: Dict[str, Any], size: int, config: Config) -> np.ndarray:
+    """Manifest boxes of a page → (k, 5) float32 [class, cx, cy, w, h] in letterboxed, normalized coordinates."""
+    gt_w, gt_h = page["gt_size"]
+    new_w, new_h = geometry["new_size"]
+    pad_x, pad_y = geometry["pad"]
+    rows = []
+    for ann in page["annotations"]:
+        if ann["label"] not in config.LABEL2ID:
+            continue
+        x0, y0, x1, y1 = ann["bbox"]
+        # manifest 픽셀 → 원본 대비 비율 → letterbox 픽셀 (렌더 DPI가 달라도 같은 결과)
+        lx0, lx1 = pad_x + x0 / gt_w * new_w, pad_x + x1 / gt_w * new_w
+        ly0, ly1 = pad_y + y0 / gt_h * new_h, pad_y + y1 / gt_h * new_h
+        rows.append((config.LABEL2ID[ann["label"]], (lx0 + lx1) / 2 / size, (ly0 + ly1) / 2 / size,
+                     (lx1 - lx0) / size, (ly1 - ly0) / size))
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def _fill_slots(images_path: str, slots: List[Tuple[int, str]], size: int) -> List[Tuple[int, Dict[str, Any]]]:
+    """Worker: decodes the given pages straight into their rows of the shared memmap."""
+    images = np.load(images_path, mmap_mode="r+")
+    out = []
+    for index, image_path in slots:
+        images[index], geometry = load_page(image_path, size)
+        out.append((index, geometry))
+    images.flush()
+    del images
+    return out
+
+
+def _manifest_digest(manifest_path: str) -> str:
+    with open(manifest_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _read_meta(out_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_dataset(config: Config, image_dir: Optional[str] = None, out_dir: Optional[str] = None,
+                  size: Optional[int] = None, workers: Optional[int] = None, force: bool = False,
+                  manifest_path: Optional[str] = None) -> str:
+    """
+    Builds (or reuses) the memory-mapped dataset and returns its directory.
+    The build is skipped when meta.json records the same manifest, image size
+    and page list and all arrays are present.
+    """
+    image_dir = image_dir or config.IMAGE_DIR
+    out_dir = out_dir or config.TRAINING_DATASET_DIR
+    size = size or config.TRAINING_IMAGE_SIZE
+    workers = config.TRAINING_BUILD_WORKERS if workers is None else workers
+    manifest_path = manifest_path or config.GROUND_TRUTH_MANIFEST_PATH
+
+    pages = load_ground_truth(manifest_path, image_dir, config)
+    if not pages:
+        raise FileNotFoundError(f"no labeled page images from {manifest_path} found in {image_dir}")
+    key = {"manifest_sha256": _manifest_digest(manifest_path), "image_size": size,
+           "images": [os.path.abspath(p["image_path"]) for p in pages], "classes": list(config.CLASSES)}
+
+    meta = _read_meta(out_dir)
+    if (not force and meta is not None and all(meta.get(k) == v for k, v in key.items())
+            and all(os.path.exists(os.path.join(out_dir, name)) for name in DATASET_FILES)):
+        print(f"[dataset] 최신 상태, 재사용: {out_dir} ({len(pages)}장, {size}px)")
+        return out_dir
+
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    # 완성되기 전의 배열을 읽지 않도록 임시 파일에 쓰고 마지막에 교체
+    images_tmp = os.path.join(out_dir, f"images.{os.getpid()}.tmp.npy")
+    images = np.lib.format.open_memmap(images_tmp, mode="w+", dtype=np.uint8, shape=(len(pages), size, size, 3))
+    del images  # 헤더와 파일 크기만 잡아 두고 각 프로세스가 r+로 채움
+
+    slots = [(i, p["image_path"]) for i, p in enumerate(pages)]
+    geometries: Dict[int, Dict[str, Any]] = {}
+    if workers > 1 and len(slots) > 1:
+        chunks = [slots[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for done in pool.map(_fill_slots, [images_tmp] * len(chunks), chunks, [size] * len(chunks)):
+                geometries.update(done)
+    else:
+        geometries.update(_fill_slots(images_tmp, slots, size))
+
+    boxes = [yolo_boxes(page, geometries[i], size, config) for i, page in enumerate(pages)]
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in boxes])
+    np.save(os.path.join(out_dir, "boxes.npy"), np.concatenate(boxes) if boxes else np.zeros((0, 5), np.float32))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    os.replace(images_tmp, os.path.join(out_dir, "images.npy"))
+
+    elapsed = time.perf_counter() - start
+    meta = dict(key, count=len(pages), boxes=int(offsets[-1]), built_at=time.time(), build_seconds=round(elapsed, 2),
+                pages=[{"image": os.path.basename(p["image_path"]), "orig_size": geometries[i]["orig_size"],
+                        "scale": geometries[i]["scale"], "pad": geometries[i]["pad"]} for i, p in enumerate(pages)])
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"[dataset] {len(pages)}장 / 박스 {offsets[-1]}개 → {out_dir} ({elapsed:.1f}s, {len(pages) / elapsed:.1f} img/s)")
+    return out_dir
+
+
+class LayoutDataset:
+    """
+    Map-style dataset over a built directory: item i → (image (S, S, 3) uint8, boxes (k, 5) float32).
+    The arrays are opened lazily per process, so the object can be pickled to DataLoader workers.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.meta = _read_meta(root)
+        if self.meta is None:
+            raise FileNotFoundError(f"no dataset at {root}; run build_dataset() first")
+        self.offsets = np.load(os.path.join(root, "offsets.npy"))
+        self.boxes = np.load(os.path.join(root, "boxes.npy"))
+        self._images = None
+        self._pid = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def images(self) -> np.ndarray:
+        if self._images is None or self._pid != os.getpid():
+            self._images = np.load(os.path.join(self.root, "images.npy"), mmap_mode="r")
+            self._pid = os.getpid()
+        return self._images
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_images"] = state["_pid"] = None
+        return state
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return np.array(self.images[index]), self.boxes[start:end]
+
+
+def collate(batch: List[Tuple[np.ndarray, np.ndarray]]):
+    """(images (B, 3, S, S) uint8 tensor, targets (M, 6) float tensor [batch_idx, class, cx, cy, w, h])."""
+    import torch
+
+    images = torch.from_numpy(np.stack([image for image, _ in batch])).permute(0, 3, 1, 2).contiguous()
+    targets = [np.hstack([np.full((len(boxes), 1), i, np.float32), boxes]) for i, (_, boxes) in enumerate(batch)]
+    return images, torch.from_numpy(np.concatenate(targets) if targets else np.zeros((0, 6), np.float32))
+
+
+def make_loader(root: str, batch_size: int, workers: int = 0, shuffle: bool = True, seed: Optional[int] = None):
+    """torch DataLoader over `LayoutDataset(root)`; workers stay alive across epochs."""
+    import torch
+    from torch.utils.data import DataLoader
+
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    return DataLoader(LayoutDataset(root), batch_size=batch_size, shuffle=shuffle, num_workers=workers,
+                      collate_fn=collate, pin_memory=torch.cuda.is_available(), generator=generator,
+                      persistent_workers=workers > 0, prefetch_factor=4 if workers > 0 else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped training dataset from output.manifest")
+    parser.add_argument("--images", help="rendered page directory (default: IMAGE_DIR)")
+    parser.add_argument("--manifest", help="Ground Truth manifest (default: GROUND_TRUTH_MANIFEST_PATH)")
+    parser.add_argument("--out", help="output directory (default: TRAINING_DATASET_DIR)")
+    parser.add_argument("--imgsz", type=int, help="letterbox size (default: TRAINING_IMAGE_SIZE)")
+    parser.add_argument("--workers", type=int, help="build processes (default: TRAINING_BUILD_WORKERS)")
+    parser.add_argument("--force", action="store_true", help="rebuild even when the dataset is up to date")
+    args = parser.parse_args()
+
+    config = Config()
+    root = build_dataset(config, args.images, args.out, args.imgsz, args.workers, args.force, args.manifest)
+    dataset = LayoutDataset(root)
+    print(json.dumps({"root": root, "count": len(dataset), "boxes": len(dataset.boxes),
+                      "image_size": dataset.meta["image_size"]}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
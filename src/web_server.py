@@ -1,80 +1,428 @@
 import os
+import json
+import time
 import shutil
 import uuid
-from fastapi import FastAPI, UploadFile, File, Request, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+from fastapi import FastAPI, UploadFile, File, Form, Request, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 
-from src.main import run_pipeline
-from src.config import Config
+from src.main import run_pipeline, warm_up
+from src.config import get_pipeline_context
+from src.worker_pool import PipelineWorkerPool
+from src.detection_store import get_detection_store, retune
+from src.profiling import PROFILE_FILES, recent_profiles
+from src.file_catalog import get_file_catalog, KINDS
+from src.search_index import get_search_index
+from src.crop_store import get_crop_store
+from src.cpu_pool import start_cpu_pool, shutdown_cpu_pool
 
-app = FastAPI()
-config = Config()
+context = get_pipeline_context()
+worker_pool: Optional[PipelineWorkerPool] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warms up heavy backends so the worker accepts connections before torch is imported.
+    In SERVE_MODE "process" the warm-up always blocks: the detector must be loaded
+    before the pipeline workers are forked so that they share its memory.
+    """
+    global worker_pool
+    for kind, directory in (("upload", history_dir), ("result", results_dir)):
+        changes = await run_in_threadpool(catalog.sync, kind, directory)
+        if any(changes.values()):
+            print(f"[catalog] {kind}: {changes}")
+    if context.SERVE_MODE == "process":
+        if context.WARM_UP_ON_STARTUP != "off":
+            await run_in_threadpool(warm_up, context)
+        worker_pool = PipelineWorkerPool(context, context.SERVE_WORKERS, context.SERVE_MAX_IN_FLIGHT_PER_WORKER,
+                                         context.SERVE_MAX_QUEUED, context.SERVE_START_METHOD)
+        await worker_pool.start()
+    else:
+        # 요청 스레드에서 fork하지 않도록, 후처리/렌더링용 공유 프로세스 풀을 스레드가 늘어나기 전에 시작
+        if context.ANNOTATION_WORKERS > 1 or context.RECOMBINE_CFG["render_workers"] > 1:
+            await run_in_threadpool(start_cpu_pool, context.CPU_POOL_WORKERS)
+        if context.WARM_UP_ON_STARTUP == "blocking":
+            await run_in_threadpool(warm_up, context)
+        elif context.WARM_UP_ON_STARTUP == "background":
+            threading.Thread(target=warm_up, args=(context,), daemon=True).start()
+    try:
+        yield
+    finally:
+        if worker_pool is not None:
+            worker_pool.shutdown()
+            worker_pool = None
+        shutdown_cpu_pool()
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
+templates.env.filters["datetime"] = lambda ts: time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
 
 # --- Directories ---
-results_dir = os.path.join(config.PROJECT_ROOT, "results")
-history_dir = os.path.join(config.PROJECT_ROOT, "history")
+results_dir = context.RESULTS_DIR
+history_dir = context.HISTORY_DIR
 os.makedirs(results_dir, exist_ok=True)
 os.makedirs(history_dir, exist_ok=True)
+catalog = get_file_catalog(context)
 
 # --- Static Files ---
 app.mount("/results", StaticFiles(directory=results_dir), name="results")
 
 @app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    """Renders the main page with history and results."""
-    history_files = os.listdir(history_dir)
-    result_files = os.listdir(results_dir)
-    return templates.TemplateResponse("index.html", {"request": request, "history_files": history_files, "result_files": result_files})
+async def root(request: Request, hp: int = 1, hs: str = "created_at", ho: str = "desc",
+               rp: int = 1, rs: str = "created_at", ro: str = "desc"):
+    """Renders the main page with one sorted page of the upload history and of the results (from the catalog)."""
+    history = catalog.listing("upload", hp, context.CATALOG_PAGE_SIZE, hs, ho)
+    results = catalog.listing("result", rp, context.CATALOG_PAGE_SIZE, rs, ro)
+    params = {"hp": history["page"], "hs": history["sort"], "ho": history["order"],
+              "rp": results["page"], "rs": results["sort"], "ro": results["order"]}
+
+    def page_url(**changes) -> str:
+        return "/?" + urlencode({**params, **changes})
+
+    return templates.TemplateResponse(request, "index.html", {"history": history, "results": results,
+                                                              "page_url": page_url})
+
+@app.get("/thumbnails/{kind}/{filename}")
+async def thumbnail(kind: str, filename: str):
+    """First-page thumbnail of an upload or result, rendered on first request and cached."""
+    if kind not in KINDS or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="File not found.")
+    pdf_path = os.path.join(history_dir if kind == "upload" else results_dir, filename)
+    path = await run_in_threadpool(catalog.thumbnail, kind, filename, pdf_path) if os.path.isfile(pdf_path) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found.")
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": "public, max-age=86400"})
+
+def _check_capacity():
+    """503 instead of queueing without bound when every pipeline worker is busy."""
+    if worker_pool is not None and worker_pool.is_saturated():
+        raise HTTPException(status_code=503, detail="Server busy, retry later.", headers={"Retry-After": "5"})
+
+def _wants_profile(request: Request) -> bool:
+    """Opt-in sampling profiler for one request: ?profile=1 or the X-Profile: 1 header."""
+    flag = request.query_params.get("profile") or request.headers.get("x-profile") or ""
+    return context.PROFILING_ENABLED and flag.lower() in ("1", "true", "yes")
 
 @app.post("/shuffle")
-async def shuffle_pdf(request: Request, file: UploadFile = File(...)):
+async def shuffle_pdf(request: Request, file: UploadFile = File(...), seed: Optional[int] = Form(None)):
     """Handles PDF upload, shuffling, and redirects to the main page."""
+    _check_capacity()
     history_path = os.path.join(history_dir, file.filename)
     with open(history_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    await run_in_threadpool(catalog.record, "upload", history_path)
 
-    await shuffle_from_path(request, history_path)
+    await shuffle_from_path(request, history_path, seed=seed, profile=_wants_profile(request))
     return RedirectResponse(url="/", status_code=303)
 
 @app.post("/shuffle-history/{filename}")
-async def shuffle_history_pdf(request: Request, filename: str):
+async def shuffle_history_pdf(request: Request, filename: str, seed: Optional[int] = Form(None)):
     """Handles shuffling from a file in the history and redirects to the main page."""
     history_path = os.path.join(history_dir, filename)
     if not os.path.exists(history_path):
         raise HTTPException(status_code=404, detail="File not found in history.")
 
-    await shuffle_from_path(request, history_path)
+    _check_capacity()
+    await shuffle_from_path(request, history_path, seed=seed, profile=_wants_profile(request))
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/view-result/{filename}")
 async def view_result(request: Request, filename: str):
     """Displays the result PDF in a viewer."""
     pdf_url = request.url_for("results", path=filename)
-    return templates.TemplateResponse("result.html", {"request": request, "pdf_url": pdf_url})
+    return templates.TemplateResponse(request, "result.html", {"pdf_url": pdf_url})
 
-async def shuffle_from_path(request: Request, file_path: str):
-    """Common shuffling logic."""
-    request_id = str(uuid.uuid4())
-    upload_dir = os.path.join(config.PROJECT_ROOT, "uploads", request_id)
-    os.makedirs(upload_dir, exist_ok=True)
+# --- Background Jobs (progress streaming) ---
+class Job:
+    """
+    Pipeline run whose progress events are kept in memory and streamed to
+    clients over server-sent events. Events are published from the worker
+    thread and appended on the event loop.
+    """
 
-    saved_path = os.path.join(upload_dir, os.path.basename(file_path))
-    shutil.copy(file_path, saved_path)
+    def __init__(self, job_id: str, filename: str, loop: asyncio.AbstractEventLoop):
+        self.job_id = job_id
+        self.filename = filename
+        self.status = "queued"
+        self.result_filename: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.first_event_id = 0  # 재시도로 지운 이전 시도의 이벤트 수 (SSE id는 계속 증가)
+        self.started = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self.history_path: Optional[str] = None
+        self.seed: Optional[int] = None
+        self.request_id: Optional[str] = None  # 파이프라인 작업 공간 (재시도 시 체크포인트에서 이어서 실행)
+        self.profile = False
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
 
+    def restart(self):
+        """Drops the failed attempt's events and resets the clock before a retry."""
+        self.first_event_id += len(self.events)
+        self.events = []
+        self.started = time.monotonic()
+        self.status = "queued"
+        self.result_filename = None
+
+    def publish(self, event: Dict[str, Any]):
+        """Thread-safe; callable from the pipeline worker thread."""
+        event = dict(event, elapsed=round(time.monotonic() - self.started, 3))
+        self._loop.call_soon_threadsafe(self._append, event)
+
+    def _append(self, event: Dict[str, Any]):
+        if event.get("event") in ("done", "error"):
+            self.status = event["event"]
+        elif self.status == "queued":
+            self.status = "running"
+        self.events.append(event)
+        self._changed.set()
+
+    async def stream(self, cursor: int = 0):
+        """`cursor` is an event id; ids from an earlier attempt start at the current attempt's first event."""
+        while True:
+            index = max(0, cursor - self.first_event_id)
+            if index < len(self.events):
+                event = self.events[index]
+                cursor = self.first_event_id + index
+                yield f"id: {cursor}\nevent: {event.get('event', 'message')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                cursor += 1
+            elif self.finished:
+                return
+            else:
+                self._changed.clear()
+                await self._changed.wait()
+
+jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+def _register_job(job: Job):
+    jobs[job.job_id] = job
+    while len(jobs) > context.JOB_HISTORY_LIMIT:
+        oldest_id, oldest = next(iter(jobs.items()))
+        if not oldest.finished:
+            break
+        jobs.pop(oldest_id)
+        if oldest.status == "error" and oldest.request_id:
+            shutil.rmtree(os.path.join(context.UPLOADS_DIR, oldest.request_id), ignore_errors=True)
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+async def _run_job(request: Request, job: Job, history_path: str, seed: Optional[int] = None):
+    job.history_path, job.seed = history_path, seed
+    job.publish({"event": "accepted", "filename": job.filename})
+    result_filename = await shuffle_from_path(request, history_path, job, seed, job.request_id, job.profile)
+    if result_filename:
+        job.result_filename = result_filename
+        job.publish({"event": "done", "result_url": f"/jobs/{job.job_id}/result",
+                     "view_url": f"/view-result/{result_filename}"})
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, file: UploadFile = File(...), seed: Optional[int] = Form(None)):
+    """Starts a shuffle job in the background and returns its event/result URLs immediately."""
+    _check_capacity()
+    history_path = os.path.join(history_dir, file.filename)
+    with open(history_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    await run_in_threadpool(catalog.record, "upload", history_path)
+
+    job = Job(str(uuid.uuid4()), file.filename, asyncio.get_running_loop())
+    job.profile = _wants_profile(request)
+    _register_job(job)
+    job.task = asyncio.create_task(_run_job(request, job, history_path, seed))
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "events_url": f"/jobs/{job.job_id}/events",
+        "result_url": f"/jobs/{job.job_id}/result",
+    })
+
+@app.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_job(request: Request, job_id: str, seed: Optional[int] = Form(None)):
+    """
+    Re-runs a failed job in its workspace: stages whose checkpoint is still valid are skipped.
+    Without a seed the job's seed is kept; a new seed only redoes shuffling and recombination.
+    """
+    job = _get_job(job_id)
+    if job.status != "error" or job.request_id is None:
+        raise HTTPException(status_code=409, detail="Only failed jobs can be retried.")
+    _check_capacity()
+    job.restart()
+    job.task = asyncio.create_task(_run_job(request, job, job.history_path, job.seed if seed is None else seed))
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "events_url": f"/jobs/{job.job_id}/events",
+        "result_url": f"/jobs/{job.job_id}/result",
+    })
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """Server-sent events: stage progress, per-page detection/rendering, then done/error."""
+    job = _get_job(job_id)
+    last_id = request.headers.get("last-event-id")
+    cursor = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+    return StreamingResponse(job.stream(cursor), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """Downloads the result PDF as soon as the job has finished."""
+    job = _get_job(job_id)
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail="Job failed.")
+    if not job.result_filename:
+        raise HTTPException(status_code=409, detail="Job is still running.")
+    return FileResponse(os.path.join(results_dir, job.result_filename), media_type="application/pdf",
+                        filename=job.result_filename)
+
+@app.get("/workers")
+async def worker_stats():
+    """Serving mode and, in process mode, per-worker in-flight/completed counts."""
+    if worker_pool is None:
+        return {"mode": "thread"}
+    return worker_pool.stats()
+
+@app.get("/detections")
+async def stored_detections():
+    """Exams whose raw detections are stored for threshold re-tuning."""
+    store = get_detection_store(context)
+    return {"exams": store.exams() if store is not None else []}
+
+@app.post("/detections/{exam_id}/retune")
+async def retune_detections(exam_id: str, request: Request):
+    """Re-runs post-processing of a stored exam with the threshold overrides in the JSON body (no detection)."""
+    store = get_detection_store(context)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Detection store is disabled.")
     try:
-        output_pdf_path = await run_in_threadpool(run_pipeline, saved_path, request_id)
+        overrides = await request.json()
+    except ValueError:  # JSONDecodeError, 잘못된 인코딩
+        raise HTTPException(status_code=400, detail="Body must be valid JSON.")
+    if not isinstance(overrides, dict):
+        raise HTTPException(status_code=400, detail="Body must be a JSON object of threshold overrides.")
+    try:
+        return await run_in_threadpool(retune, store, exam_id, overrides, context)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No stored detections for this exam.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/search")
+async def search_passages(q: str, limit: Optional[int] = None, label: Optional[str] = None,
+                          exam_id: Optional[str] = None):
+    """Passages / question blocks whose text contains every query word, with crop references (`crop_url`)."""
+    index = get_search_index(context)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Search index is disabled.")
+    if label is not None and label not in context.SEARCH_INDEX_LABELS:
+        raise HTTPException(status_code=400, detail=f"label must be one of {', '.join(context.SEARCH_INDEX_LABELS)}.")
+    limit = max(1, min(limit or context.SEARCH_RESULT_LIMIT, 200))
+    found = await run_in_threadpool(index.search, q, limit, label, exam_id)
+    for result in found["results"]:
+        result["crop_url"] = f"/crops/{result['crop_id']}" if result["crop_id"] else None
+        del result["image_path"]
+    return found
 
-        result_filename = f"{request_id}_{os.path.basename(output_pdf_path)}"
-        result_path = os.path.join(results_dir, result_filename)
-        shutil.move(output_pdf_path, result_path)
+@app.get("/crops/{crop_id}")
+async def crop_image(crop_id: str):
+    """A stored component crop by its content hash."""
+    store = get_crop_store(context)
+    path = store.path(crop_id) if store is not None else None
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Crop not found.")
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
+@app.get("/admin/profiles")
+async def list_profiles(limit: int = 20):
+    """Most recent request profiles (stage spans and top functions by self time), newest first."""
+    return {"profiles": recent_profiles(os.path.join(context.DATA_DIR, "processed"), max(1, min(limit, 200)))}
+
+@app.get("/admin/profiles/{request_id}")
+async def get_profile(request_id: str, format: str = "speedscope"):
+    """Downloads one profile: speedscope (default), collapsed or summary."""
+    if format not in PROFILE_FILES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PROFILE_FILES)}.")
+    if os.path.basename(request_id) != request_id or request_id.startswith("."):
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    path = os.path.join(context.DATA_DIR, "processed", request_id, "debug", PROFILE_FILES[format])
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, filename=f"{request_id}.{PROFILE_FILES[format]}")
+
+async def shuffle_from_path(request: Request, file_path: str, job: Optional[Job] = None,
+                            seed: Optional[int] = None, request_id: Optional[str] = None,
+                            profile: bool = False) -> Optional[str]:
+    """
+    Common shuffling logic. Returns the result file name, or None on failure (same seed → same order).
+    A failed run is retried PIPELINE_RETRIES times in the same request workspace, so stages with a valid
+    checkpoint are not redone. After a final failure a job keeps its workspace for POST /jobs/{id}/retry.
+    """
+    request_id = request_id or str(uuid.uuid4())
+    upload_dir = os.path.join(context.UPLOADS_DIR, request_id)
+    saved_path = os.path.join(upload_dir, os.path.basename(file_path))
+    try:
+        os.makedirs(upload_dir, exist_ok=True)
+        shutil.copy(file_path, saved_path)
     except Exception as e:
-        print(f"Error processing file: {e}")
-        # In a real app, you might want to handle this more gracefully
-        # For now, we'll just print the error and not re-raise
-    finally:
-        shutil.rmtree(upload_dir)
\ No newline at end of file
+        # 여기서 실패해도 job은 error로 끝나야 SSE 클라이언트가 기다리지 않음
+        print(f"Error preparing upload: {e}")
+        if job:
+            job.publish({"event": "error", "detail": str(e)})
+        if job is None or job.request_id is None:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        return None
+    if job:
+        job.request_id = request_id
+
+    used = {"seed": seed}
+
+    def on_progress(event: Dict[str, Any]):
+        if event.get("event") == "shuffled":
+            used["seed"] = event["seed"]
+        if job:
+            job.publish(event)
+
+    started = time.monotonic()
+    result_filename = None
+    attempts = 1 + context.PIPELINE_RETRIES
+    for attempt in range(1, attempts + 1):
+        try:
+            if worker_pool is not None:
+                output_pdf_path = await worker_pool.run(saved_path, request_id, on_progress, seed, profile)
+            else:
+                output_pdf_path = await run_in_threadpool(run_pipeline, saved_path, request_id, context, on_progress,
+                                                          seed, profile)
+
+            result_filename = f"{request_id}_{os.path.basename(output_pdf_path)}"
+            result_path = os.path.join(results_dir, result_filename)
+            shutil.move(output_pdf_path, result_path)
+            await run_in_threadpool(catalog.record, "result", result_path, os.path.basename(file_path),
+                                    used["seed"], round(time.monotonic() - started, 2))
+            break
+        except Exception as e:
+            print(f"Error processing file (attempt {attempt}/{attempts}): {e}")
+            result_filename = None
+            if attempt < attempts:
+                if job:
+                    job.publish({"event": "retrying", "attempt": attempt + 1, "detail": str(e)})
+                continue
+            if job:
+                job.publish({"event": "error", "detail": str(e)})
+
+    if result_filename or job is None:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+    return result_filename
\ No newline at end of file
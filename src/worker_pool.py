@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline Worker Pool (SERVE_MODE = "process")
+
+Runs `run_pipeline` in a fixed set of worker processes fed by the web front
+end, so CPU-bound stages (grouping, layout, rendering) scale with cores
+instead of being serialized by the GIL of the web process.
+
+-   The parent warms up (imports + detector load) before the workers are
+    forked, so N workers share one copy of the model weights copy-on-write.
+    With the "spawn" start method every worker loads its own copy.
+-   Each worker is a single-process executor, so it runs one request at a
+    time. A request is assigned to the least loaded worker that holds fewer
+    than `SERVE_MAX_IN_FLIGHT_PER_WORKER` requests, otherwise it waits for a
+    free slot. With a value above 1 the extra assigned requests wait in that
+    worker's executor queue (saving the hand-off, not adding parallelism);
+    `stats()` reports them as "queued", separately from the one "running".
+-   Progress events from `run_pipeline` travel back over one shared queue and
+    are delivered to the request's `on_progress` callback in order.
+"""
+
+import os
+import sys
+import asyncio
+import threading
+import multiprocessing
+from dataclasses import replace
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from src.config import PipelineContext, get_pipeline_context
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+# --- worker process side ---
+_worker_context: Optional[PipelineContext] = None
+_worker_events = None
+
+
+def _init_worker(events, context: Optional[PipelineContext], torch_threads: int):
+    global _worker_context, _worker_events
+    _worker_events = events
+    context = context or get_pipeline_context()
+    # 요청 단위로 이미 병렬이므로 워커 안에서는 후처리/렌더링 프로세스를 따로 띄우지 않습니다.
+    _worker_context = replace(context, ANNOTATION_WORKERS=1,
+                              RECOMBINE_CFG=MappingProxyType(dict(context.RECOMBINE_CFG, render_workers=1)))
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(torch_threads)
+
+
+def _worker_ready(warm: bool) -> int:
+    if warm:
+        from src.main import warm_up
+        warm_up(_worker_context)
+    return os.getpid()
+
+
+def _run_in_worker(input_pdf_path: str, request_id: str, job_key: str, seed: Optional[int] = None,
+                   profile: bool = False) -> str:
+    from src.main import run_pipeline
+
+    def on_progress(event: Dict[str, Any]):
+        _worker_events.put((job_key, event))
+
+    try:
+        return run_pipeline(input_pdf_path, request_id, _worker_context, on_progress, seed, profile)
+    finally:
+        _worker_events.put((job_key, None))  # 이 요청의 마지막 이벤트
+
+
+# --- web process side ---
+class PoolBusyError(RuntimeError):
+    """All worker slots and the wait queue are full."""
+
+
+class PipelineWorkerPool:
+    def __init__(self, context: PipelineContext, workers: int, max_in_flight_per_worker: int = 1,
+                 max_queued: int = 32, start_method: str = "fork"):
+        self.context = context
+        self.workers = max(1, int(workers))
+        self.max_in_flight = max(1, int(max_in_flight_per_worker))
+        self.max_queued = max(0, int(max_queued))
+        methods = multiprocessing.get_all_start_methods()
+        self.start_method = start_method if start_method in methods else "spawn"
+        self._mp = multiprocessing.get_context(self.start_method)
+        self._executors: List[ProcessPoolExecutor] = []
+        self._pids: List[Optional[int]] = []
+        self._in_flight: List[int] = []
+        self._completed: List[int] = []
+        self._waiting = 0
+        self._slot_freed: Optional[asyncio.Condition] = None
+        self._subscribers: Dict[str, Callable[[Optional[Dict[str, Any]]], None]] = {}
+        self._events = None
+        self._listener: Optional[threading.Thread] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.workers * self.max_in_flight
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        context = self.context if self.start_method == "fork" else None  # spawn: 자식이 기본 설정으로 만듦
+        return ProcessPoolExecutor(max_workers=1, mp_context=self._mp, initializer=_init_worker,
+                                   initargs=(self._events, context, torch_threads))
+
+    async def start(self):
+        """Forks the workers now (after the parent's warm-up) instead of on the first request."""
+        self._events = self._mp.Queue()
+        self._slot_freed = asyncio.Condition()
+        self._executors = [self._new_executor() for _ in range(self.workers)]
+        self._in_flight = [0] * self.workers
+        self._completed = [0] * self.workers
+        warm_in_child = self.start_method != "fork"
+        futures = [asyncio.wrap_future(ex.submit(_worker_ready, warm_in_child)) for ex in self._executors]
+        self._pids = list(await asyncio.gather(*futures))
+        self._listener = threading.Thread(target=self._dispatch_events, daemon=True)
+        self._listener.start()
+        print(f"[worker_pool] {self.workers}개 워커 시작 ({self.start_method}, 워커당 최대 {self.max_in_flight}건)")
+
+    def _dispatch_events(self):
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            job_key, event = item
+            callback = self._subscribers.get(job_key)
+            if callback:
+                callback(event)
+
+    def is_saturated(self) -> bool:
+        """True when a new request could neither run nor wait (callers answer 503)."""
+        return sum(self._in_flight) + self._waiting >= self.capacity + self.max_queued
+
+    def _free_worker(self) -> Optional[int]:
+        candidates = [i for i in range(self.workers) if self._in_flight[i] < self.max_in_flight]
+        return min(candidates, key=lambda i: self._in_flight[i]) if candidates else None
+
+    async def run(self, input_pdf_path: str, request_id: str, on_progress: Optional[ProgressCallback] = None,
+                  seed: Optional[int] = None, profile: bool = False) -> str:
+        if self.is_saturated():
+            raise PoolBusyError("pipeline workers are busy")
+        loop = asyncio.get_running_loop()
+        async with self._slot_freed:
+            self._waiting += 1
+            try:
+                await self._slot_freed.wait_for(lambda: self._free_worker() is not None)
+            finally:
+                self._waiting -= 1
+            worker = self._free_worker()
+            self._in_flight[worker] += 1
+
+        drained = asyncio.Event()
+
+        def deliver(event: Optional[Dict[str, Any]]):
+            if event is None:
+                loop.call_soon_threadsafe(drained.set)
+            elif on_progress:
+                on_progress(event)
+
+        self._subscribers[request_id] = deliver
+        try:
+            future = self._executors[worker].submit(_run_in_worker, input_pdf_path, request_id, request_id, seed, profile)
+            try:
+                result = await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                self._replace_worker(worker)
+                raise
+            try:
+                await asyncio.wait_for(drained.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
+            self._completed[worker] += 1
+            return result
+        finally:
+            self._subscribers.pop(request_id, None)
+            async with self._slot_freed:
+                self._in_flight[worker] -= 1
+                self._slot_freed.notify_all()
+
+    def _replace_worker(self, worker: int):
+        print(f"[worker_pool] 워커 {worker} (pid {self._pids[worker]}) 비정상 종료, 다시 시작합니다.")
+        self._executors[worker].shutdown(wait=False, cancel_futures=True)
+        self._executors[worker] = self._new_executor()
+        self._pids[worker] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "process",
+            "start_method": self.start_method,
+            # 워커 프로세스는 한 번에 한 건만 실행하고 나머지는 그 워커의 큐에서 대기
+            "workers": [{"pid": self._pids[i], "running": min(1, self._in_flight[i]),
+                         "queued": max(0, self._in_flight[i] - 1), "completed": self._completed[i]}
+                        for i in range(self.workers)],
+            "max_in_flight_per_worker": self.max_in_flight,
+            "waiting": self._waiting,
+            "max_queued": self.max_queued,
+        }
+
+    def shutdown(self):
+        for ex in self._executors:
+            ex.shutdown(wait=True, cancel_futures=True)
+        if self._events is not None:
+            self._events.put(None)
+        if self._listener is not None:
+            self._listener.join(timeout=5)